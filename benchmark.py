@@ -0,0 +1,271 @@
+"""times the main Recipes operations on made up catalogues of different sizes and writes the results to a json file, so
+the numbers from two versions of the program can be compared. e.g.
+
+    python benchmark.py --sizes 1000 10000 100000 --storage json lazy sqlite --output before.json
+    python benchmark.py --sizes 1000 10000 100000 --storage json lazy sqlite --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+from compact import CompactCatalogue
+from recipes_class import Recipes
+from storage import JsonStore, make_store, migrate
+
+ADJECTIVES = ["Spicy", "Creamy", "Smoky", "Crispy", "Easy", "Slow Cooked", "Roast", "Quick", "Sticky", "Zesty",
+              "Herby", "Cheesy", "Garlic", "Lemon", "Honey", "Chilli", "Baked", "Grilled", "Rustic", "Classic"]
+DISHES = ["Chickpea Curry", "Potatoes", "Pasta Bake", "Noodle Soup", "Risotto", "Flatbreads", "Tacos", "Salad",
+          "Stew", "Pancakes", "Protein Bars", "Frittata", "Dhal", "Burgers", "Stir Fry", "Traybake", "Pie", "Chowder",
+          "Brownies", "Porridge"]
+INGREDIENTS = ["oats", "chia seeds", "milk", "dates", "chickpeas", "protein powder", "sweetener", "brazil nuts",
+               "potatoes", "garlic", "rosemary", "olive oil", "butter", "bicarbonate of soda", "salt", "pepper",
+               "onion", "tomatoes", "spinach", "rice", "lentils", "coconut milk", "ginger", "cumin", "paprika",
+               "flour", "eggs", "sugar", "lemon", "honey", "soy sauce", "noodles", "carrots", "celery", "feta",
+               "parmesan", "basil", "coriander", "chilli flakes", "black beans", "sweet potato", "mushrooms",
+               "peppers", "courgette", "yoghurt", "cinnamon", "vanilla", "cocoa powder", "peanut butter", "tofu"]
+QUANTITIES = ["100g", "40g", "80g", "1 can", "1/2 tsp", "1 tsp", "2 tbsp", "3 large", "3 cloves", "1 stalk", "50",
+              "250ml", "1 pinch", "2", "4", "1 cup", "200g", "1/4 cup"]
+TAGS = ["snack", "dinner", "lunch", "breakfast", "vegan", "vegetarian", "quick", "batch cook", "dessert", "side",
+        "high protein", "gluten free", "spicy", "comfort food", "summer", "winter", "party", "kids", "budget", "easy"]
+STEPS = ["Chop the {0} and put it to one side.", "Heat the {0} in a large pan.", "Stir in the {0} and {1}.",
+         "Simmer for {2} minutes, stirring occasionally.", "Whizz the {0} in the blender.",
+         "Press it into a lined baking tin and cook for {2} mins at gas 5.", "Season with {0} and serve.",
+         "Leave to cool for {2} minutes before cutting.", "Mix the {0} with the {1} until smooth."]
+
+
+def generate_recipe(rng: random.Random, authors: list):
+    ingredients = {ingredient: rng.choice(QUANTITIES) for ingredient in rng.sample(INGREDIENTS, rng.randint(3, 12))}
+    names = list(ingredients)
+    instructions = [rng.choice(STEPS).format(rng.choice(names), rng.choice(names), rng.randint(2, 60))
+                    for _ in range(rng.randint(3, 10))]
+    return {
+        'ingredients': ingredients,
+        'instructions': instructions,
+        'tags': rng.sample(TAGS, rng.randint(1, 4)),
+        'author': rng.choice(authors),
+        'rating': rng.randint(1, 5),
+    }
+
+
+def generate_catalogue(size: int, seed: int = 0):
+    """returns a dictionary of size made up recipes in the same format as recipes.json. the same size and seed always
+    give exactly the same recipes"""
+    rng = random.Random(seed)
+    authors = [f"Author {n}" for n in range(max(10, size // 100))]
+    recipes = {}
+    for n in range(size):
+        # the number on the end keeps the names unique
+        recipes[f"{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} {n}"] = generate_recipe(rng, authors)
+    return recipes
+
+
+def measure(function, repeat: int):
+    """runs the function repeat times and then once more with tracemalloc on (which slows it down, so that run isn't
+    timed). returns the best and mean times in seconds, the peak memory allocated in bytes, and how much memory is
+    still being used by whatever the function returned (e.g. the loaded recipes)"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        result = function()
+        retained, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    return {'best_s': min(times), 'mean_s': sum(times) / len(times), 'peak_bytes': peak, 'retained_bytes': retained}
+
+
+def remove_cache(path: str):
+    try:
+        os.remove(path + '.cache')
+    except FileNotFoundError:
+        pass
+
+
+def start_up(directory: str, storage: str, query: str, repeat: int, warm: bool):
+    """times running recipe_manager.py's search command from scratch in its own process, the way it's really used.
+    a cold start has no pre-parsed cache (only the json store has one, so the other stores start the same either way),
+    a warm start has the one the previous run left behind. returns the best and mean times in seconds"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recipe_manager.py')
+    environ = dict(os.environ, RECIPES_STORAGE=storage)
+    environ.pop('RECIPES_METRICS', None)
+    path = os.path.join(directory, 'recipes.json')
+    if warm:
+        subprocess.run([sys.executable, script, 'search', query], cwd=directory, env=environ, check=True,
+                       stdout=subprocess.DEVNULL)
+    times = []
+    for _ in range(repeat):
+        if not warm:
+            remove_cache(path)
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script, 'search', query], cwd=directory, env=environ, check=True,
+                       stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return {'best_s': min(times), 'mean_s': sum(times) / len(times)}
+
+
+def benchmark_catalogue(size: int, storage: str, repeat: int, operations: int, seed: int):
+    """writes a catalogue of the given size in the given storage mode to a temporary directory and times each
+    operation on it"""
+    catalogue = generate_catalogue(size, seed)
+    rng = random.Random(seed + 1)
+    names = list(catalogue)
+    queries = [rng.choice(INGREDIENTS)[:rng.randint(3, 8)] for _ in range(operations)]
+    lookups = [rng.choice(names).upper() for _ in range(operations)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'recipes.json')
+        with open(json_path, 'w') as recipes_file:
+            json.dump(catalogue, recipes_file)
+        del catalogue
+        path = {'sqlite': os.path.join(directory, 'recipes.db'),
+                'binary': os.path.join(directory, 'recipes.rcp')}.get(storage, json_path)
+        if path != json_path:
+            migrate(JsonStore(json_path), make_store(storage, path))
+
+        results = {'size': size, 'storage': storage, 'file_bytes': os.path.getsize(path)}
+        stores = []
+
+        def load():
+            # loading is timed without the json store's cache, warm_start below times it with one
+            remove_cache(path)
+            store = make_store(storage, path)
+            stores.append(store)
+            return Recipes(store)
+
+        results['load'] = measure(load, repeat)
+        recipes = load()
+
+        def search():
+            for query in queries:
+                recipes.search(query)
+
+        def find_valid_name():
+            # find_valid_name asks for input, so the names are fed in instead of typed
+            with mock.patch('builtins.input', side_effect=lookups):
+                for _ in lookups:
+                    recipes.find_valid_name()
+
+        def edit_cycle():
+            # rename a recipe, change its tags, rename it back and save, like a short session in edit_recipe
+            name = rng.choice(names)
+            recipes.rename(name, name + ' (edited)')
+            recipes.update(name + ' (edited)', {'tags': ['edited']})
+            recipes.rename(name + ' (edited)', name)
+            recipes.save_recipes()
+
+        def save():
+            recipes.touch(rng.choice(names))
+            recipes.save_recipes()
+
+        results['search'] = measure(search, repeat)
+        results['search']['per_query_s'] = results['search']['mean_s'] / operations
+        results['find_valid_name'] = measure(find_valid_name, repeat)
+        results['find_valid_name']['per_lookup_s'] = results['find_valid_name']['mean_s'] / operations
+        results['edit_cycle'] = measure(edit_cycle, repeat)
+        results['save_recipes'] = measure(save, repeat)
+
+        for store in stores:
+            store.close()
+
+        results['cold_start'] = start_up(directory, storage, queries[0], repeat, warm=False)
+        results['warm_start'] = start_up(directory, storage, queries[0], repeat, warm=True)
+    return results
+
+
+def catalogue_memory(size: int, seed: int):
+    """compares the memory used by just the recipes (no search indexes) as plain dictionaries and as a
+    CompactCatalogue"""
+    text = json.dumps(generate_catalogue(size, seed))
+    results = {'size': size}
+    for model, build in (('dict', lambda: json.loads(text)), ('compact', lambda: CompactCatalogue(json.loads(text)))):
+        tracemalloc.start()
+        try:
+            recipes = build()
+            results[f'{model}_bytes'] = tracemalloc.get_traced_memory()[0]
+            del recipes
+        finally:
+            tracemalloc.stop()
+    results['saving'] = 1 - results['compact_bytes'] / results['dict_bytes']
+    return results
+
+
+def describe_environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'commit': commit,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(results: list, baseline_path: str):
+    """prints how each mean time changed compared with an older results file, >1 means slower than before"""
+    with open(baseline_path, 'r') as baseline_file:
+        baseline = {(r['size'], r['storage']): r for r in json.load(baseline_file)['results']}
+    for result in results:
+        old = baseline.get((result['size'], result['storage']))
+        if old is None:
+            continue
+        for operation, numbers in result.items():
+            if isinstance(numbers, dict) and operation in old and old[operation]['mean_s'] > 0:
+                ratio = numbers['mean_s'] / old[operation]['mean_s']
+                print(f"{result['storage']:<8}{result['size']:>9}  {operation:<16}{ratio:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Recipes on made up catalogues.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="catalogue sizes to test (anything from 1000 to 1000000)")
+    parser.add_argument('--storage', nargs='+', default=['json'], choices=['json', 'journal', 'lazy', 'compact', 'binary',
+                                                                         'sqlite'])
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs of each operation")
+    parser.add_argument('--operations', type=int, default=100, help="searches and name lookups per run")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="an older results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        for storage in args.storage:
+            result = benchmark_catalogue(size, storage, args.repeat, args.operations, args.seed)
+            print(f"{storage:<8}{size:>9}  load {result['load']['mean_s']:.3f}s  "
+                  f"search {result['search']['per_query_s'] * 1000:.3f}ms/query  "
+                  f"save {result['save_recipes']['mean_s']:.3f}s  "
+                  f"start cold {result['cold_start']['mean_s']:.3f}s warm {result['warm_start']['mean_s']:.3f}s  "
+                  f"peak load memory {result['load']['peak_bytes'] / 2 ** 20:.1f}MiB  "
+                  f"loaded recipes {result['load']['retained_bytes'] / 2 ** 20:.1f}MiB")
+            results.append(result)
+
+    memory = []
+    if 'compact' in args.storage:
+        for size in args.sizes:
+            memory.append(catalogue_memory(size, args.seed))
+            print(f"{size:>9} recipes: dictionaries {memory[-1]['dict_bytes'] / 2 ** 20:.1f}MiB, "
+                  f"compact {memory[-1]['compact_bytes'] / 2 ** 20:.1f}MiB ({memory[-1]['saving']:.0%} smaller)")
+
+    with open(args.output, 'w') as output_file:
+        json.dump({'environment': describe_environment(), 'seed': args.seed, 'results': results,
+                   'catalogue_memory': memory}, output_file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
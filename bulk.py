@@ -0,0 +1,288 @@
+"""imports and exports recipes in bulk. dumps are read a chunk of records at a time, and the records are checked and
+tidied up in a pool of processes while the next chunks are being read. only the merge into Recipes happens in the main
+process, and everything is saved once at the end. three formats are understood:
+
+    json    the same format as recipes.json, {"name": {recipe}, ...}
+    jsonl   one recipe per line, {"name": ..., "recipe": {...}} or {"name": ..., "tags": [...], ...}
+    csv     a header row with name, ingredients, instructions, tags, author and rating columns. ingredients are
+            written 'oats: 100g; milk: 250ml', instructions one per line in the cell and tags 'snack, vegan'
+"""
+import csv
+import io
+import json
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from recipes_class import RECIPE_FIELDS, valid_rating
+from storage import iter_offsets
+
+FORMATS = ('json', 'jsonl', 'csv')
+# what to do with a recipe whose name is already used (ignoring capitals, the same as find_valid_name)
+ON_CONFLICT = ('rename', 'skip', 'replace', 'error')
+CSV_COLUMNS = ('name',) + RECIPE_FIELDS
+
+
+def guess_format(path: str):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension == 'ndjson':
+        return 'jsonl'
+    if extension not in FORMATS:
+        raise ValueError(f"Can't tell the format of {path}, please give one of {', '.join(FORMATS)}")
+    return extension
+
+
+def read_records(path: str, file_format: str, chunk_size: int = 1000):
+    """yields lists of up to chunk_size (where, name, raw) records, where raw is the undecoded recipe. nothing is
+    decoded here apart from the csv rows, that's left to the worker processes"""
+    chunk = []
+    if file_format == 'json':
+        with open(path, 'rb') as dump_file:
+            if os.fstat(dump_file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(dump_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # the same scan the lazy store uses, it finds each recipe's bytes without decoding anything
+                for n, (name, start, end) in enumerate(iter_offsets(data), start=1):
+                    chunk.append((f"recipe {n}", name, data[start:end]))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+    elif file_format == 'jsonl':
+        with open(path, 'r', encoding='utf-8') as dump_file:
+            for n, line in enumerate(dump_file, start=1):
+                if line.strip():
+                    chunk.append((f"line {n}", None, line))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+    elif file_format == 'csv':
+        with open(path, 'r', newline='', encoding='utf-8') as dump_file:
+            reader = csv.DictReader(dump_file)
+            for row in reader:
+                chunk.append((f"line {reader.line_num}", row.pop('name', None), row))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    else:
+        raise ValueError(f"Unknown format: {file_format}")
+    if chunk:
+        yield chunk
+
+
+def parse_csv_row(row: dict):
+    """turns the text cells of a csv row back into a recipe. empty cells are left out"""
+    if None in row:
+        raise ValueError("row has more cells than the header")
+    recipe = {}
+    for field, cell in row.items():
+        if cell is None or not cell.strip():
+            continue
+        cell = cell.strip()
+        if cell[0] in '{["':
+            # anything the simple format can't hold is written as json, see csv_cell
+            recipe[field] = json.loads(cell)
+        elif field == 'ingredients':
+            recipe[field] = {}
+            for item in cell.split(';'):
+                ingredient, _, quantity = item.partition(':')
+                if ingredient.strip():
+                    recipe[field][ingredient.strip()] = quantity.strip()
+        elif field == 'instructions':
+            recipe[field] = [line.strip() for line in cell.splitlines() if line.strip()]
+        elif field == 'tags':
+            recipe[field] = [tag.strip() for tag in cell.split(',') if tag.strip()]
+        else:
+            recipe[field] = cell
+    return recipe
+
+
+def normalise(name, recipe):
+    """checks one record with the same rules as the menus and returns it as (name, recipe) with every detail in the
+    type the rest of the program expects. raises ValueError if it can't be used"""
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("Recipe names can't be empty.")
+    if not isinstance(recipe, dict):
+        raise ValueError("the recipe isn't a json object")
+    unknown = set(recipe) - set(RECIPE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown recipe details: {', '.join(sorted(unknown))}")
+
+    ingredients = recipe.get('ingredients', {})
+    if isinstance(ingredients, list):
+        # a plain list of ingredients without quantities
+        ingredients = {ingredient: '' for ingredient in ingredients}
+    if not isinstance(ingredients, dict):
+        raise ValueError("ingredients should be an object of ingredient -> quantity")
+    instructions = recipe.get('instructions', [])
+    if isinstance(instructions, str):
+        instructions = [line.strip() for line in instructions.splitlines() if line.strip()]
+    tags = recipe.get('tags', [])
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+    if not isinstance(instructions, list) or not isinstance(tags, list):
+        raise ValueError("instructions and tags should be lists")
+
+    normalised = {
+        'ingredients': {str(ingredient).strip(): str(quantity).strip() for ingredient, quantity in ingredients.items()},
+        'instructions': [str(step) for step in instructions],
+        'tags': [str(tag).strip() for tag in tags],
+        'author': str(recipe.get('author', '')).strip(),
+    }
+    if 'rating' in recipe:
+        rating = recipe['rating']
+        # dumps often have ratings like "4" or 4.0, they're fine as long as they're a whole number
+        try:
+            if isinstance(rating, (str, float)) and float(rating) == int(float(rating)):
+                rating = int(float(rating))
+        except ValueError:
+            pass
+        if not valid_rating(rating):
+            raise ValueError(f"Invalid rating {recipe['rating']!r}, please use a number from 1 to 5.")
+        normalised['rating'] = rating
+    return name.strip(), normalised
+
+
+def normalise_chunk(chunk: list):
+    """runs in a worker process. returns (where, name, recipe, error) for every record in the chunk, with recipe None
+    and the reason in error for the ones that can't be imported"""
+    results = []
+    for where, name, raw in chunk:
+        try:
+            if isinstance(raw, dict):
+                recipe = parse_csv_row(raw)
+            else:
+                recipe = json.loads(raw)
+                if name is None:
+                    # a jsonl line has the name inside it, either next to the recipe or next to its details
+                    if not isinstance(recipe, dict):
+                        raise ValueError("the line isn't a json object")
+                    name = recipe.pop('name', None)
+                    recipe = recipe['recipe'] if 'recipe' in recipe else recipe
+            results.append((where, *normalise(name, recipe), None))
+        except (ValueError, TypeError, KeyError) as error:
+            results.append((where, name, None, str(error)))
+    return results
+
+
+def map_chunks(function, chunks, workers: int = None):
+    """yields function(chunk) for each chunk in order. with more than one worker the chunks are spread over a process
+    pool, with only a few waiting at a time so a huge file isn't all read into memory at once"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            yield function(chunk)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        waiting = deque()
+        for chunk in chunks:
+            waiting.append(pool.submit(function, chunk))
+            if len(waiting) >= workers * 2:
+                yield waiting.popleft().result()
+        while waiting:
+            yield waiting.popleft().result()
+
+
+def normalise_all(chunks, workers: int = None):
+    """yields the results of normalise_chunk for each chunk in order, see map_chunks"""
+    return map_chunks(normalise_chunk, chunks, workers)
+
+
+def free_name(recipes, name: str, counters: dict = None):
+    """adds (2), (3)... to a name until it doesn't match any recipe, ignoring capitals. counters remembers the next
+    number to try for each name, so a dump with lots of recipes with the same name doesn't start again from (2) for
+    every one of them"""
+    key = name.lower()
+    n = counters.get(key, 2) if counters is not None else 2
+    while recipes.resolve_name(f"{name} ({n})") is not None:
+        n += 1
+    if counters is not None:
+        counters[key] = n + 1
+    return f"{name} ({n})"
+
+
+def import_recipes(recipes, path: str, file_format: str = None, on_conflict: str = 'rename', workers: int = None,
+                   chunk_size: int = 1000):
+    """merges every recipe in a dump into recipes without saving, so the caller saves once (or not at all if there
+    were errors). returns a report dictionary with the counts and a list of (where, name, error) for the records that
+    couldn't be imported"""
+    if on_conflict not in ON_CONFLICT:
+        raise ValueError(f"Unknown conflict option: {on_conflict}")
+    file_format = file_format or guess_format(path)
+    report = {'added': 0, 'renamed': 0, 'replaced': 0, 'skipped': 0, 'errors': []}
+    counters = {}
+
+    for results in normalise_all(read_records(path, file_format, chunk_size), workers):
+        for where, name, recipe, error in results:
+            if error is not None:
+                report['errors'].append((where, name, error))
+                continue
+            existing = recipes.resolve_name(name)
+            if existing is None:
+                recipes.add(name, recipe)
+                report['added'] += 1
+            elif on_conflict == 'rename':
+                recipes.add(free_name(recipes, name, counters), recipe)
+                report['renamed'] += 1
+            elif on_conflict == 'replace':
+                recipes.update(existing, recipe)
+                report['replaced'] += 1
+            elif on_conflict == 'skip':
+                report['skipped'] += 1
+            else:
+                report['errors'].append((where, name, f"There is already a recipe called {existing}."))
+    return report
+
+
+def plain(recipe):
+    """the compact store's recipes aren't dictionaries, json needs the plain version"""
+    return recipe.to_dict() if hasattr(recipe, 'to_dict') else recipe
+
+
+def csv_cell(field: str, value):
+    """the text for one csv cell, in the simple format when it can be read back exactly and as json otherwise"""
+    text = None
+    if field == 'ingredients':
+        if not any(set(':;\n') & set(ingredient + quantity) for ingredient, quantity in value.items()):
+            text = '; '.join(f"{ingredient}: {quantity}" for ingredient, quantity in value.items())
+    elif field == 'instructions':
+        if all(step.strip() and '\n' not in step and step.strip() == step for step in value):
+            text = '\n'.join(value)
+    elif field == 'tags':
+        if all(tag.strip() and ',' not in tag and tag.strip() == tag for tag in value):
+            text = ', '.join(value)
+    else:
+        text = str(value)
+    # parse_csv_row strips the spaces off cells and reads ones starting with a bracket or a quote as json, so text
+    # like that (e.g. the instruction '[Step] mix') has to be written as json too
+    if text is None or text[:1] in '{["' or text != text.strip():
+        return json.dumps(value)
+    return text
+
+
+def export_recipes(recipes, file_format: str):
+    """yields the recipes as text in the given format a piece at a time, so the whole export never has to be in memory
+    at once"""
+    if file_format == 'json':
+        yield '{'
+        for n, (name, recipe) in enumerate(recipes.items()):
+            yield (', ' if n else '') + json.dumps(name) + ': ' + json.dumps(plain(recipe))
+        yield '}'
+    elif file_format == 'jsonl':
+        for name, recipe in recipes.items():
+            yield json.dumps({'name': name, 'recipe': plain(recipe)}) + '\n'
+    elif file_format == 'csv':
+        # csv.writer needs something to write to, so each row is written into a small buffer and taken back out
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        for name, recipe in recipes.items():
+            recipe = plain(recipe)
+            writer.writerow([name] + [csv_cell(field, recipe[field]) if field in recipe else ''
+                                      for field in RECIPE_FIELDS])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        raise ValueError(f"Unknown format: {file_format}")
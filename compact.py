@@ -0,0 +1,256 @@
+from array import array
+from collections.abc import MutableMapping, MutableSequence
+
+# the order the details come out in, the same order add_recipe puts them in
+FIELDS = ('ingredients', 'instructions', 'tags', 'author', 'rating')
+# ratings are kept in a signed byte array, anything that doesn't fit (or isn't a whole number) goes in a dictionary
+NO_RATING = -128
+
+
+class StringTable:
+    """gives every different string a number, so each ingredient, tag, quantity and author is only stored once no
+    matter how many recipes use it"""
+    __slots__ = ('strings', 'ids')
+
+    def __init__(self):
+        self.strings: list = []
+        self.ids: dict = {}
+
+    def id_of(self, string: str):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self.ids[string] = string_id
+        return string_id
+
+    def __getitem__(self, string_id: int):
+        return self.strings[string_id]
+
+
+class TagsView(MutableSequence):
+    """looks like the list of tags, but reads and writes the tag numbers stored in the recipe"""
+    __slots__ = ('recipe',)
+
+    def __init__(self, recipe):
+        self.recipe = recipe
+
+    def __getitem__(self, index):
+        tags = self.recipe.catalogue.tags
+        if isinstance(index, slice):
+            return [tags[tag_id] for tag_id in self.recipe.tag_ids[index]]
+        return tags[self.recipe.tag_ids[index]]
+
+    def __setitem__(self, index, tag):
+        self.recipe.tag_ids[index] = self.recipe.catalogue.tags.id_of(tag)
+
+    def __delitem__(self, index):
+        del self.recipe.tag_ids[index]
+
+    def __len__(self):
+        return len(self.recipe.tag_ids)
+
+    def insert(self, index, tag):
+        self.recipe.tag_ids.insert(index, self.recipe.catalogue.tags.id_of(tag))
+
+    def __eq__(self, other):
+        return list(self) == list(other) if isinstance(other, (list, TagsView)) else NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class IngredientsView(MutableMapping):
+    """looks like the ingredients dictionary, but reads and writes the ingredient and quantity numbers stored in the
+    recipe. recipes only have a handful of ingredients, so finding one by looping over them is fine"""
+    __slots__ = ('recipe',)
+
+    def __init__(self, recipe):
+        self.recipe = recipe
+
+    def position(self, ingredient: str):
+        ingredient_id = self.recipe.catalogue.ingredients.ids.get(ingredient)
+        for n, stored_id in enumerate(self.recipe.ingredient_ids):
+            if stored_id == ingredient_id:
+                return n
+        raise KeyError(ingredient)
+
+    def __getitem__(self, ingredient: str):
+        return self.recipe.catalogue.quantities[self.recipe.quantity_ids[self.position(ingredient)]]
+
+    def __setitem__(self, ingredient: str, quantity: str):
+        quantity_id = self.recipe.catalogue.quantities.id_of(quantity)
+        try:
+            self.recipe.quantity_ids[self.position(ingredient)] = quantity_id
+        except KeyError:
+            self.recipe.ingredient_ids.append(self.recipe.catalogue.ingredients.id_of(ingredient))
+            self.recipe.quantity_ids.append(quantity_id)
+
+    def __delitem__(self, ingredient: str):
+        n = self.position(ingredient)
+        self.recipe.ingredient_ids.pop(n)
+        self.recipe.quantity_ids.pop(n)
+
+    def __iter__(self):
+        ingredients = self.recipe.catalogue.ingredients
+        return (ingredients[ingredient_id] for ingredient_id in list(self.recipe.ingredient_ids))
+
+    def __len__(self):
+        return len(self.recipe.ingredient_ids)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class CompactRecipe(MutableMapping):
+    """one recipe, with __slots__ instead of a dictionary and numbers instead of repeated strings. the author and
+    rating live in arrays in the catalogue, at this recipe's slot. it can be used just like the recipe dictionaries,
+    e.g. recipe['tags'].append('dinner') or del recipe['ingredients']['butter']"""
+    __slots__ = ('catalogue', 'slot', 'ingredient_ids', 'quantity_ids', 'tag_ids', 'instructions', 'present', 'extra')
+
+    def __init__(self, catalogue, slot: int):
+        self.catalogue = catalogue
+        self.slot = slot
+        self.ingredient_ids = array('i')
+        self.quantity_ids = array('i')
+        self.tag_ids = array('i')
+        self.instructions = None
+        # one bit per detail in FIELDS, so recipes that are missing a detail are written back the same way
+        self.present = 0
+        # any details that aren't in FIELDS are kept as they are, so they aren't lost when the file is saved
+        self.extra = None
+
+    def __getitem__(self, field: str):
+        if field not in FIELDS:
+            if self.extra is None:
+                raise KeyError(field)
+            return self.extra[field]
+        if not self.present & (1 << FIELDS.index(field)):
+            raise KeyError(field)
+        if field == 'ingredients':
+            return IngredientsView(self)
+        if field == 'tags':
+            return TagsView(self)
+        if field == 'instructions':
+            return self.instructions
+        if field == 'author':
+            return self.catalogue.authors[self.catalogue.author_ids[self.slot]]
+        rating = self.catalogue.ratings[self.slot]
+        return self.catalogue.other_ratings[self.slot] if rating == NO_RATING else rating
+
+    def __setitem__(self, field: str, value):
+        if field not in FIELDS:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[field] = value
+            return
+        catalogue = self.catalogue
+        if field == 'ingredients':
+            items = list(value.items())
+            self.ingredient_ids = array('i', (catalogue.ingredients.id_of(k) for k, v in items))
+            self.quantity_ids = array('i', (catalogue.quantities.id_of(v) for k, v in items))
+        elif field == 'tags':
+            self.tag_ids = array('i', (catalogue.tags.id_of(tag) for tag in value))
+        elif field == 'instructions':
+            self.instructions = list(value)
+        elif field == 'author':
+            catalogue.author_ids[self.slot] = catalogue.authors.id_of(value)
+        else:
+            catalogue.other_ratings.pop(self.slot, None)
+            if isinstance(value, int) and not isinstance(value, bool) and NO_RATING < value < 128:
+                catalogue.ratings[self.slot] = value
+            else:
+                catalogue.ratings[self.slot] = NO_RATING
+                catalogue.other_ratings[self.slot] = value
+        self.present |= 1 << FIELDS.index(field)
+
+    def __delitem__(self, field: str):
+        self[field]
+        if field in FIELDS:
+            self.present &= ~(1 << FIELDS.index(field))
+        else:
+            del self.extra[field]
+
+    def __iter__(self):
+        for n, field in enumerate(FIELDS):
+            if self.present & (1 << n):
+                yield field
+        if self.extra:
+            yield from list(self.extra)
+
+    def __len__(self):
+        return bin(self.present).count('1') + len(self.extra or ())
+
+    def to_dict(self):
+        """the recipe as the plain dictionary that goes in recipes.json"""
+        recipe = {}
+        for field in self:
+            value = self[field]
+            if field == 'ingredients':
+                value = dict(value.items())
+            elif field == 'tags':
+                value = list(value)
+            recipe[field] = value
+        return recipe
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class CompactCatalogue(MutableMapping):
+    """a dictionary of recipe name -> CompactRecipe that shares one string table for each kind of detail and keeps
+    the authors and ratings of all recipes in two arrays"""
+
+    def __init__(self, recipes=()):
+        self.ingredients = StringTable()
+        self.quantities = StringTable()
+        self.tags = StringTable()
+        self.authors = StringTable()
+        self.author_ids = array('i')
+        self.ratings = array('b')
+        self.other_ratings: dict = {}
+        self.recipes: dict = {}
+        # slots of deleted recipes, reused by the next new ones so the arrays don't keep growing
+        self.free_slots: list = []
+
+        for name, recipe in (recipes.items() if hasattr(recipes, 'items') else recipes):
+            self[name] = recipe
+
+    def new_slot(self):
+        if self.free_slots:
+            return self.free_slots.pop()
+        self.author_ids.append(0)
+        self.ratings.append(NO_RATING)
+        return len(self.ratings) - 1
+
+    def __getitem__(self, name: str):
+        return self.recipes[name]
+
+    def __setitem__(self, name: str, recipe):
+        if self.recipes.get(name) is recipe:
+            return
+        if name in self.recipes:
+            self.free(self.recipes[name])
+        compact = CompactRecipe(self, self.new_slot())
+        # the same recipe can be put under a new name (that's how edit_name works), so it's always copied into a new
+        # slot and the old name can be deleted without affecting it
+        for field, value in recipe.items():
+            compact[field] = value
+        self.recipes[name] = compact
+
+    def free(self, recipe: CompactRecipe):
+        self.other_ratings.pop(recipe.slot, None)
+        self.ratings[recipe.slot] = NO_RATING
+        self.free_slots.append(recipe.slot)
+
+    def __delitem__(self, name: str):
+        self.free(self.recipes.pop(name))
+
+    def __contains__(self, name):
+        return name in self.recipes
+
+    def __iter__(self):
+        return iter(self.recipes)
+
+    def __len__(self):
+        return len(self.recipes)
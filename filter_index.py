@@ -0,0 +1,114 @@
+import operator
+import re
+import shlex
+
+# field:value predicates, with a '-' in front to exclude recipes instead
+FIELD_FILTER = re.compile(r"^(-?)(tag|ingredient|author):(.+)$", re.IGNORECASE)
+RATING_FILTER = re.compile(r"^rating(>=|<=|>|<|=)(\d+)$", re.IGNORECASE)
+COMPARISONS = {'>=': operator.ge, '<=': operator.le, '>': operator.gt, '<': operator.lt, '=': operator.eq}
+
+
+def is_filter_query(query: str):
+    """true if any word of the query is a filter like tag:dinner or rating>=4 rather than plain search text"""
+    return any(FIELD_FILTER.match(word) or RATING_FILTER.match(word) for word in query.split())
+
+
+class FilterIndex:
+    """secondary indexes from each tag, ingredient, author and rating to the set of recipes that have it, so filters
+    like 'rating>=4 tag:dinner -ingredient:butter author:Ross' are answered by set intersections and differences
+    instead of looking inside every recipe. tags, ingredients and authors are matched ignoring capitals"""
+
+    def __init__(self, recipes):
+        self.by_field = {'tag': {}, 'ingredient': {}, 'author': {}}
+        self.by_rating: dict = {}
+        # recipe name -> what it was indexed under, needed to take it back out again
+        self.entries: dict = {}
+        # recipe name -> position, so results come out in the same order as the recipes dictionary
+        self.order: dict = {}
+        self.next_position = 0
+
+        for name, recipe in recipes.items():
+            self.add(name, recipe)
+
+    def add(self, name: str, recipe: dict, position: int = None):
+        if position is None:
+            position = self.next_position
+            self.next_position += 1
+        self.order[name] = position
+
+        entries = {
+            'tag': {tag.lower() for tag in recipe.get('tags', [])},
+            'ingredient': {ingredient.lower() for ingredient in recipe.get('ingredients', {})},
+            'author': {str(recipe.get('author', '')).lower()},
+        }
+        for field, values in entries.items():
+            for value in values:
+                self.by_field[field].setdefault(value, set()).add(name)
+        rating = recipe.get('rating')
+        self.by_rating.setdefault(rating, set()).add(name)
+        self.entries[name] = (entries, rating)
+
+    def remove(self, name: str):
+        if name not in self.entries:
+            return None
+        entries, rating = self.entries.pop(name)
+        for field, values in entries.items():
+            for value in values:
+                names = self.by_field[field][value]
+                names.discard(name)
+                if not names:
+                    del self.by_field[field][value]
+        self.by_rating[rating].discard(name)
+        if not self.by_rating[rating]:
+            del self.by_rating[rating]
+        return self.order.pop(name)
+
+    def update(self, name: str, recipe: dict):
+        position = self.remove(name)
+        self.add(name, recipe, position)
+
+    def rating_matches(self, comparison: str, value: int):
+        """the union of the rating buckets that pass the comparison, there are only ever a handful of buckets"""
+        compare = COMPARISONS[comparison]
+        matches = set()
+        for rating, names in self.by_rating.items():
+            if isinstance(rating, int) and compare(rating, value):
+                matches |= names
+        return matches
+
+    def parse(self, query: str):
+        """splits a query into the sets of recipes that must match, the sets that must not match, and any plain words
+        left over. quotes can be used for values with spaces, e.g. tag:"main course". raises ValueError if the quotes
+        don't match up"""
+        required = []
+        excluded = []
+        words = []
+        for word in shlex.split(query):
+            field_filter = FIELD_FILTER.match(word)
+            rating_filter = RATING_FILTER.match(word)
+            if field_filter:
+                negate, field, value = field_filter.groups()
+                names = self.by_field[field.lower()].get(value.lower(), set())
+                (excluded if negate else required).append(names)
+            elif rating_filter:
+                comparison, value = rating_filter.groups()
+                required.append(self.rating_matches(comparison, int(value)))
+            else:
+                words.append(word)
+        return required, excluded, words
+
+    def filter(self, required: list, excluded: list):
+        """intersects the required sets (smallest first) and takes away the excluded ones, returning the names in
+        recipe order"""
+        if required:
+            required = sorted(required, key=len)
+            matches = set(required[0])
+            for names in required[1:]:
+                matches &= names
+                if not matches:
+                    break
+        else:
+            matches = set(self.entries)
+        for names in excluded:
+            matches -= names
+        return sorted(matches, key=self.order.__getitem__)
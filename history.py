@@ -0,0 +1,211 @@
+"""undo and redo for changes to the recipes. every change is recorded as a small delta describing just what changed,
+rather than a copy of the recipe, e.g. ['insert', 'Roast Potatoes', 'tags', 2, 'dinner']. the deltas are
+
+    ['add', name, recipe or None]           a new recipe (the recipe is only needed to redo it after an undo)
+    ['delete', name, recipe]                a deleted recipe, with everything needed to put it back
+    ['rename', old name, new name]
+    ['set', name, field, old, new]          a whole detail replaced, None for a detail that wasn't there
+    ['ingredient', name, ingredient, old quantity, new quantity, position]
+                                            None for an ingredient that wasn't there, position is where it is (or was)
+                                            in the ingredients
+    ['insert', name, field, index, value]   an item added to the tags or instructions
+    ['remove', name, field, index, value]   an item taken out of the tags or instructions
+
+the deltas for one action (e.g. one update with several details) make up a step, and undo and redo work a step at a
+time. saved steps are also appended to a history file next to the recipes, so a recipe can be put back the way it was
+at an earlier time even after the program has been restarted. recipes.json is the checkpoint the history leads up to,
+and older steps are compacted away once there are too many, so the file doesn't grow forever"""
+import json
+import time
+from collections import deque
+
+from storage import atomic_file
+
+
+class History:
+    def __init__(self, path: str = None, limit: int = 100, keep: int = 1000):
+        # the history file, or None to only keep history in memory
+        self.path = path
+        # the most steps that can be undone, and the most kept in the history file
+        self.keep = keep
+        self.undo_steps = deque(maxlen=limit)
+        self.redo_steps = []
+        # steps that haven't been written to the history file yet, they're written when the recipes are saved so the
+        # file never has changes in it that weren't saved
+        self.pending = []
+        self.serial = 0
+        self.file_steps = None
+
+    def step(self, deltas: list):
+        self.serial += 1
+        return {'serial': self.serial, 'time': time.time(), 'deltas': deltas}
+
+    def record(self, deltas: list):
+        """records a new change, which can be undone and means anything that was undone can't be redone any more"""
+        step = self.step(deltas)
+        self.undo_steps.append(step)
+        self.redo_steps.clear()
+        self.pending.append(step)
+
+    def record_undo(self, deltas: list):
+        """records the deltas an undo applied, which undo them again if they're redone"""
+        step = self.step(deltas)
+        self.redo_steps.append(step)
+        self.pending.append(step)
+
+    def record_redo(self, deltas: list):
+        step = self.step(deltas)
+        self.undo_steps.append(step)
+        self.pending.append(step)
+
+    def mark(self):
+        """the point to go back to with forget_after"""
+        return self.serial
+
+    def forget_after(self, mark: int):
+        """forgets every step since mark, used when those changes have been thrown away some other way"""
+        while self.undo_steps and self.undo_steps[-1]['serial'] > mark:
+            self.undo_steps.pop()
+        self.redo_steps = [step for step in self.redo_steps if step['serial'] <= mark]
+        self.pending = [step for step in self.pending if step['serial'] <= mark]
+
+    def forget_undo(self):
+        """forgets what can be undone and redone, but not what's waiting to be written to the history file. used when
+        the recipes have been changed some other way and the steps can't be undone any more"""
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+
+    def clear(self):
+        """forgets everything that hasn't been saved, used when the recipes in memory have been replaced with the
+        ones on disk and the recorded steps don't lead to them any more"""
+        self.forget_undo()
+        self.pending.clear()
+
+    def read_file(self):
+        if self.file_steps is None:
+            self.file_steps = []
+            if self.path is not None:
+                try:
+                    with open(self.path, 'r') as history_file:
+                        for line in history_file:
+                            try:
+                                self.file_steps.append(json.loads(line))
+                            except json.decoder.JSONDecodeError:
+                                # a line that was only half written when the program stopped
+                                break
+                except FileNotFoundError:
+                    pass
+        return self.file_steps
+
+    def flush(self):
+        """appends the steps made since the last save to the history file, and once there are twice as many in it as
+        are kept, rewrites it with just the newest ones"""
+        if self.path is None or not self.pending:
+            self.pending.clear()
+            return
+        steps = self.read_file()
+        lines = ''.join(json.dumps({'time': step['time'], 'deltas': step['deltas']}) + '\n' for step in self.pending)
+        steps.extend({'time': step['time'], 'deltas': step['deltas']} for step in self.pending)
+        self.pending.clear()
+        if len(steps) > 2 * self.keep:
+            del steps[:-self.keep]
+            with atomic_file(self.path) as history_file:
+                history_file.writelines(json.dumps(step) + '\n' for step in steps)
+        else:
+            with open(self.path, 'a') as history_file:
+                history_file.write(lines)
+
+    def newest_first(self):
+        """every step there is a record of, saved or not, newest first"""
+        yield from reversed(self.pending)
+        yield from reversed(self.read_file())
+
+
+def plain_copy(value):
+    """a copy of a detail that shares nothing with the recipe it came from, as plain lists and dictionaries (the
+    compact store's details are views onto the catalogue)"""
+    if isinstance(value, str) or not hasattr(value, '__iter__'):
+        return value
+    if hasattr(value, 'items'):
+        return {key: plain_copy(item) for key, item in value.items()}
+    return [plain_copy(item) for item in value]
+
+
+def invert(delta: list):
+    """the delta that undoes delta. an 'add' has to have its recipe filled in first"""
+    op = delta[0]
+    if op == 'add':
+        return ['delete', delta[1], delta[2]]
+    if op == 'delete':
+        return ['add', delta[1], delta[2]]
+    if op == 'rename':
+        return ['rename', delta[2], delta[1]]
+    if op == 'set':
+        return ['set', delta[1], delta[2], delta[4], delta[3]]
+    if op == 'ingredient':
+        return ['ingredient', delta[1], delta[2], delta[4], delta[3], delta[5]]
+    if op == 'insert':
+        return ['remove', *delta[1:]]
+    if op == 'remove':
+        return ['insert', *delta[1:]]
+    raise ValueError(f"Unknown delta: {op!r}")
+
+
+def apply_to_recipe(recipe, delta: list):
+    """applies a 'set', 'ingredient', 'insert' or 'remove' delta to a recipe. raises ValueError if the recipe isn't
+    the way the delta expects, which means it's been changed some other way since"""
+    op = delta[0]
+    if op == 'set':
+        field, old, new = delta[2:]
+        if plain_copy(recipe.get(field)) != old:
+            raise ValueError(f"The {field} isn't the same any more")
+        if new is None:
+            recipe.pop(field, None)
+        else:
+            recipe[field] = plain_copy(new)
+    elif op == 'ingredient':
+        ingredient, old, new, position = delta[2:]
+        ingredients = recipe['ingredients']
+        if ingredients.get(ingredient) != old:
+            raise ValueError(f"{ingredient} isn't {old!r} any more")
+        if new is None:
+            del ingredients[ingredient]
+        elif old is None and position < len(ingredients):
+            # an ingredient that's put back goes back where it was, not on the end
+            items = list(ingredients.items())
+            items.insert(position, (ingredient, new))
+            recipe['ingredients'] = dict(items)
+        else:
+            ingredients[ingredient] = new
+    elif op == 'insert':
+        field, index, value = delta[2:]
+        if index > len(recipe[field]):
+            raise ValueError(f"The {field} don't have {index} items any more")
+        recipe[field].insert(index, value)
+    elif op == 'remove':
+        field, index, value = delta[2:]
+        if index >= len(recipe[field]) or recipe[field][index] != value:
+            raise ValueError(f"{value!r} isn't at position {index + 1} of the {field} any more")
+        del recipe[field][index]
+    else:
+        raise ValueError(f"Unknown delta: {op!r}")
+
+
+def describe(delta: list):
+    """a short description of a delta for the menus"""
+    op = delta[0]
+    if op == 'add':
+        return f"added {delta[1]}"
+    if op == 'delete':
+        return f"deleted {delta[1]}"
+    if op == 'rename':
+        return f"renamed {delta[1]} to {delta[2]}"
+    if op == 'set':
+        return f"changed the {delta[2]} of {delta[1]}"
+    if op == 'ingredient':
+        if delta[4] is None:
+            return f"removed {delta[2]} from {delta[1]}"
+        return f"set {delta[2]} to {delta[4]} in {delta[1]}"
+    if op == 'insert':
+        return f"added {delta[4]!r} to the {delta[2]} of {delta[1]}"
+    return f"removed {delta[4]!r} from the {delta[2]} of {delta[1]}"
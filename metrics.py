@@ -0,0 +1,209 @@
+"""optional timing and counting of what the program spends its time on. nothing in here runs unless it's switched on
+with the RECIPES_METRICS environment variable (set to the file the numbers are written to), because the Recipes
+methods are only wrapped when it is, so with it off there's no extra cost at all. e.g.
+
+    RECIPES_METRICS=metrics.json python recipe_manager.py
+    python recipe_manager.py stats metrics.json
+"""
+import atexit
+import functools
+import json
+import math
+import os
+import time
+
+# the Recipes methods that are timed. the menu ones (search_recipes, find_valid_name and the edit methods) include the
+# time spent waiting for someone to type, the others are just the program
+TIMED_METHODS = (
+    '__init__', 'save_recipes', 'refresh', 'search', 'ranked_search', 'filter', 'resolve_name', 'add', 'update',
+    'rename', 'delete', 'apply_changes', 'shopping_list', 'rendered_recipe', 'undo', 'redo', 'recipe_at', 'restore',
+    'search_recipes', 'ranked_search_recipes', 'view_recipes', 'display_recipe', 'find_valid_name', 'add_recipe',
+    'delete_recipe', 'edit_recipe', 'edit_name', 'edit_tags', 'add_tag', 'delete_tag', 'edit_ingredients',
+    'add_ingredient', 'delete_ingredient', 'edit_quantity', 'edit_instructions', 'add_instruction',
+    'delete_instruction', 'edit_rating',
+)
+# the store attributes that can hold the name of a file it writes to
+STORE_FILES = ('path', 'journal_path', 'versions_path')
+
+
+class Histogram:
+    """counts how many values fell between each power of 2, which is plenty to see where the time goes without keeping
+    every single value. scale turns a value into the unit the buckets count in, e.g. 1e6 for seconds in microseconds"""
+
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+        self.buckets: dict = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        bucket = 2 ** max(0, math.ceil(math.log2(max(value * self.scale, 1))))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction: float):
+        """the upper edge of the bucket the percentile falls in"""
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= fraction * self.count:
+                return bucket / self.scale
+        return 0.0
+
+    def to_dict(self):
+        return {'count': self.count, 'total': self.total, 'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.percentile(0.5), 'p95': self.percentile(0.95), 'max': self.max,
+                'buckets': {str(bucket): n for bucket, n in sorted(self.buckets.items())}}
+
+
+class Metrics:
+    def __init__(self, path: str = None):
+        self.path = path
+        self.timings: dict = {}
+        self.counters: dict = {}
+        self.gauges: dict = {}
+        self.save_bytes = Histogram()
+        # the Recipes objects being watched, their sizes are read when the numbers are written out, or just before
+        # their store is closed (ids in closed), since a closed sqlite store can't be read any more
+        self.watched = []
+        self.closed = set()
+        self.started = time.time()
+
+    def time(self, name: str, seconds: float):
+        histogram = self.timings.get(name)
+        if histogram is None:
+            histogram = self.timings[name] = Histogram(scale=1e6)
+        histogram.add(seconds)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, name: str, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.time(name, time.perf_counter() - start)
+        return wrapper
+
+    def instrument(self, cls):
+        """wraps the methods in TIMED_METHODS so every call is counted and timed. __init__ also starts watching the new
+        object's store"""
+        for name in TIMED_METHODS:
+            if name in vars(cls):
+                setattr(cls, name, self.timed(f"{cls.__name__}.{name}", vars(cls)[name]))
+        init = cls.__init__
+
+        @functools.wraps(init)
+        def watched_init(recipes, *args, **kwargs):
+            init(recipes, *args, **kwargs)
+            self.watch(recipes)
+        cls.__init__ = watched_init
+
+    def watch(self, recipes):
+        """times the store's saves and works out how many bytes each one wrote"""
+        self.watched.append(recipes)
+        store = recipes.store
+        save = store.save
+        paths = [getattr(store, attribute) for attribute in STORE_FILES if isinstance(getattr(store, attribute, None), str)]
+
+        def measured_save(*args, **kwargs):
+            before = {path: file_stat(path) for path in paths}
+            start = time.perf_counter()
+            try:
+                return save(*args, **kwargs)
+            finally:
+                self.time(f"{type(store).__name__}.save", time.perf_counter() - start)
+                written = sum(bytes_written(before[path], file_stat(path)) for path in paths)
+                self.save_bytes.add(written)
+                self.count('bytes_saved', written)
+                self.count('saves')
+        store.save = measured_save
+
+        close = store.close
+
+        def measured_close(*args, **kwargs):
+            if id(recipes) not in self.closed:
+                self.read_gauges()
+                self.closed.add(id(recipes))
+            return close(*args, **kwargs)
+        store.close = measured_close
+
+    def read_gauges(self):
+        for n, recipes in enumerate(self.watched):
+            if id(recipes) in self.closed:
+                continue
+            prefix = f"recipes.{n}." if len(self.watched) > 1 else 'recipes.'
+            self.gauges[prefix + 'count'] = len(recipes.recipes)
+            self.gauges[prefix + 'unsaved'] = len(recipes.changed)
+            self.gauges[prefix + 'rendered_cached'] = len(recipes.rendered.entries)
+            path = getattr(recipes.store, 'path', None)
+            if path and os.path.exists(path):
+                self.gauges[prefix + 'file_bytes'] = os.path.getsize(path)
+
+    def to_dict(self):
+        self.read_gauges()
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'seconds': time.time() - self.started,
+            # seconds, with buckets in microseconds
+            'timings': {name: histogram.to_dict() for name, histogram in sorted(self.timings.items())},
+            'bytes_per_save': self.save_bytes.to_dict(),
+            'counters': self.counters,
+            'gauges': self.gauges,
+        }
+
+    def dump(self, path: str = None):
+        # only imported here so the stats command doesn't have to load the storage module
+        from storage import atomic_file
+        with atomic_file(path or self.path) as metrics_file:
+            json.dump(self.to_dict(), metrics_file, indent=2)
+
+
+def file_stat(path: str):
+    try:
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_size
+    except FileNotFoundError:
+        return None
+
+
+def bytes_written(before, after):
+    """a file that was replaced (a different inode) was written in full, one that's the same file only grew by the
+    difference"""
+    if after is None:
+        return 0
+    if before is None or before[0] != after[0]:
+        return after[1]
+    return max(0, after[1] - before[1])
+
+
+def enable(cls, path: str):
+    """switches metrics on for every cls object created from now on, and writes them to path when the program exits"""
+    metrics = Metrics(path)
+    metrics.instrument(cls)
+    atexit.register(metrics.dump)
+    return metrics
+
+
+def format_report(data: dict):
+    """the text the stats command prints for a dumped metrics file"""
+    lines = [f"Recorded from {data['started']} for {data['seconds']:.0f}s\n",
+             f"{'operation':<40}{'calls':>8}{'mean ms':>10}{'p95 ms':>10}{'max ms':>10}{'total s':>10}"]
+    timings = sorted(data['timings'].items(), key=lambda item: item[1]['total'], reverse=True)
+    for name, timing in timings:
+        lines.append(f"{name:<40}{timing['count']:>8}{timing['mean'] * 1000:>10.2f}{timing['p95'] * 1000:>10.2f}"
+                     f"{timing['max'] * 1000:>10.2f}{timing['total']:>10.3f}")
+    saves = data['bytes_per_save']
+    if saves['count']:
+        lines.append(f"\n{saves['count']} saves wrote {saves['total']:.0f} bytes, {saves['mean']:.0f} on average "
+                     f"and {saves['max']:.0f} at most")
+    if data['gauges']:
+        lines.append("")
+        lines.extend(f"{name:<40}{value:>12}" for name, value in sorted(data['gauges'].items()))
+    return '\n'.join(lines)
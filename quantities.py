@@ -0,0 +1,168 @@
+"""turns the free text ingredient quantities ('100g', '1/2 tsp', '3 large') into numbers and units, so recipes can be
+scaled and shopping lists can add up the same ingredient across lots of recipes. weights are kept in grams and volumes
+in millilitres, everything else keeps its own unit ('can', 'clove') or none at all for plain counts"""
+import math
+import re
+from collections import namedtuple
+from fractions import Fraction
+from functools import lru_cache
+
+try:
+    import numpy
+except ImportError:
+    # numpy makes big shopping lists faster, but everything works without it
+    numpy = None
+
+# amount is None when the text couldn't be understood, then text is all there is. size is a size word that was left
+# out of the unit ('large' in '3 large'), so scaling can put it back
+Quantity = namedtuple('Quantity', 'amount unit text size', defaults=('',))
+
+# unit -> (the unit it's stored in, how many of those one of it is)
+UNITS = {
+    'g': ('g', 1), 'gram': ('g', 1), 'grams': ('g', 1), 'gr': ('g', 1),
+    'kg': ('g', 1000), 'kilo': ('g', 1000), 'kilos': ('g', 1000), 'kilogram': ('g', 1000), 'kilograms': ('g', 1000),
+    'oz': ('g', 28.35), 'ounce': ('g', 28.35), 'ounces': ('g', 28.35),
+    'lb': ('g', 453.6), 'lbs': ('g', 453.6), 'pound': ('g', 453.6), 'pounds': ('g', 453.6),
+    'ml': ('ml', 1), 'millilitre': ('ml', 1), 'millilitres': ('ml', 1), 'milliliter': ('ml', 1), 'milliliters': ('ml', 1),
+    'l': ('ml', 1000), 'litre': ('ml', 1000), 'litres': ('ml', 1000), 'liter': ('ml', 1000), 'liters': ('ml', 1000),
+    'tsp': ('ml', 5), 'teaspoon': ('ml', 5), 'teaspoons': ('ml', 5),
+    'tbsp': ('ml', 15), 'tablespoon': ('ml', 15), 'tablespoons': ('ml', 15),
+    'cup': ('ml', 250), 'cups': ('ml', 250),
+}
+# words that describe the size of something rather than measure it, '3 large' is just 3 (eggs)
+SIZES = {'small', 'medium', 'large', 'big', 'whole'}
+# the biggest number the ingredients can be scaled by, anything bigger is almost certainly a typo
+MAX_FACTOR = 1000
+UNICODE_FRACTIONS = {'½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4', '⅛': '1/8'}
+
+# '1', '2.5', '1/2' or '1 1/2', then whatever is left is the unit. the unit has to start with a letter, so things like
+# '2-3 cloves' and '1 (400g) can' aren't mistaken for an amount and a unit, they're left as they are
+QUANTITY = re.compile(r"^\s*(?:(\d+)\s+(?=\d+/))?(\d+(?:\.\d+)?)(?:/(\d+))?\s*((?:[^\W\d_].*?)?)\s*$")
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(text: str):
+    """returns the Quantity for a quantity string. the same few quantities turn up in almost every recipe, so the
+    answers are cached"""
+    cleaned = text.strip().lower()
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        cleaned = cleaned.replace(symbol, f" {fraction}")
+    match = QUANTITY.match(cleaned)
+    if match is None:
+        return Quantity(None, '', text)
+    whole, number, denominator, unit = match.groups()
+    if denominator is not None and float(denominator) == 0:
+        return Quantity(None, '', text)
+    amount = float(number) / float(denominator) if denominator else float(number)
+    amount += float(whole or 0)
+    if not math.isfinite(amount):
+        return Quantity(None, '', text)
+
+    unit = unit.rstrip('.')
+    if unit in UNITS:
+        unit, size = UNITS[unit]
+        amount *= size
+    elif unit in SIZES:
+        return Quantity(amount, '', text, unit)
+    elif unit:
+        # '3 cloves' and '1 clove' should add up, so simple plurals lose their s
+        if unit.endswith(('ches', 'shes', 'sses')):
+            unit = unit[:-2]
+        elif unit.endswith('s') and not unit.endswith('ss') and len(unit) > 3:
+            unit = unit[:-1]
+    return Quantity(amount, unit, text)
+
+
+def valid_factor(factor: float):
+    """what ingredients can be scaled by, or a recipe made that many times: more than 0 and up to MAX_FACTOR"""
+    return math.isfinite(factor) and 0 < factor <= MAX_FACTOR
+
+
+def format_amount(amount: float):
+    """whole numbers and simple fractions as they'd be written in a recipe, anything else to 2 decimal places"""
+    if not math.isfinite(amount) or abs(amount) >= 1e6:
+        # too big to be worth writing out in full (or not a number at all), e.g. 1.2e+07
+        return f"{amount:.3g}"
+    fraction = Fraction(amount).limit_denominator(8)
+    if abs(float(fraction) - amount) < 1e-6:
+        whole, part = divmod(fraction, 1)
+        if not part:
+            return str(whole)
+        return f"{whole} {part}" if whole else str(part)
+    return f"{amount:.2f}".rstrip('0').rstrip('.')
+
+
+def format_quantity(amount: float, unit: str):
+    """the opposite of parse_quantity, picking a sensible unit for the size of the amount"""
+    if unit == 'g' and amount >= 1000:
+        return f"{round(amount / 1000, 2):g}kg"
+    if unit == 'g':
+        return f"{format_amount(round(amount, 1))}g"
+    if unit == 'ml':
+        # small volumes read better as spoons
+        if amount < 15:
+            return f"{format_amount(amount / 5)} tsp"
+        if amount < 60:
+            return f"{format_amount(amount / 15)} tbsp"
+        if amount >= 1000:
+            return f"{round(amount / 1000, 2):g}l"
+        return f"{format_amount(round(amount))}ml"
+    if not unit:
+        return format_amount(amount)
+    if amount > 1 and len(unit) > 2:
+        unit += 'es' if unit.endswith(('ch', 'sh', 'ss')) else 's'
+    return f"{format_amount(amount)} {unit}"
+
+
+def scale_ingredients(ingredients, factor: float):
+    """returns a new ingredients dictionary with every quantity multiplied by factor. quantities that couldn't be
+    understood are left as they are. raises ValueError for a factor that isn't valid_factor"""
+    if not valid_factor(factor):
+        raise ValueError(f"Can't scale by {factor}, please use a number more than 0 and up to {MAX_FACTOR}.")
+    scaled = {}
+    for ingredient, text in ingredients.items():
+        quantity = parse_quantity(text)
+        if quantity.amount is None:
+            scaled[ingredient] = text
+        else:
+            scaled[ingredient] = format_quantity(quantity.amount * factor, quantity.unit)
+            if quantity.size:
+                scaled[ingredient] += ' ' + quantity.size
+    return scaled
+
+
+def shopping_list(recipes, selection: dict):
+    """adds up the ingredients of the selected recipes. selection is {recipe name: how many times to make it}.
+    returns (totals, unknown): totals is a list of (ingredient, amount, unit) sorted by ingredient, and unknown is a
+    list of (ingredient, quantity text, recipe name) for the quantities that couldn't be added up.
+
+    every (ingredient, unit) pair gets a column and every recipe a row of a table of amounts, so the whole list is
+    one multiplication of the table by the number of times each recipe is made. with numpy that's done in one go"""
+    columns: dict = {}
+    rows = []
+    unknown = []
+    for name in selection:
+        row = {}
+        for ingredient, text in recipes[name].get('ingredients', {}).items():
+            quantity = parse_quantity(text)
+            if quantity.amount is None:
+                unknown.append((ingredient, text, name))
+                continue
+            column = columns.setdefault((ingredient.strip().lower(), quantity.unit), len(columns))
+            row[column] = row.get(column, 0.0) + quantity.amount
+        rows.append(row)
+    factors = list(selection.values())
+
+    if numpy is not None and rows:
+        table = numpy.zeros((len(rows), len(columns)))
+        for n, row in enumerate(rows):
+            table[n, list(row)] = list(row.values())
+        amounts = (numpy.asarray(factors, dtype=float) @ table).tolist()
+    else:
+        amounts = [0.0] * len(columns)
+        for factor, row in zip(factors, rows):
+            for column, amount in row.items():
+                amounts[column] += amount * factor
+
+    totals = sorted((ingredient, amounts[column], unit) for (ingredient, unit), column in columns.items())
+    return totals, unknown
@@ -0,0 +1,147 @@
+import heapq
+import math
+import re
+
+# how much a word counts for depending on where it is in the recipe, a word in the title says more about the recipe
+# than the same word somewhere in the instructions
+FIELD_WEIGHTS = {'title': 3.0, 'tags': 2.0, 'ingredients': 2.0, 'instructions': 1.0}
+
+WORD = re.compile(r"\w+")
+
+
+def words(text: str):
+    return WORD.findall(text.lower())
+
+
+def word_trigrams(word: str):
+    """the trigrams of a word with its start and end marked, so 'egg' gives '$eg', 'egg' and 'gg$'"""
+    padded = f"${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int):
+    """the number of single letter insertions, deletions and substitutions to turn a into b. it gives up and returns
+    limit + 1 as soon as the answer is definitely more than limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, letter_a in enumerate(a, start=1):
+        current = [i]
+        for j, letter_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (letter_a != letter_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class RankedIndex:
+    """scores recipes against a query with BM25 over the title, tags, ingredients and instructions, and also matches
+    words that are a letter or two different from the query words, so small typos still find the recipe"""
+
+    # the usual BM25 settings, k1 controls how quickly repeating a word stops helping and b how much long recipes
+    # are penalised
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, recipes):
+        # word -> {recipe name: weighted count of that word in the recipe}
+        self.postings: dict = {}
+        # recipe name -> {word: weighted count}, needed to take a recipe back out of the postings
+        self.doc_words: dict = {}
+        self.doc_lengths: dict = {}
+        self.total_length = 0.0
+        # trigram -> set of words in the postings, used to find words with similar spellings
+        self.trigrams: dict = {}
+
+        for name, recipe in recipes.items():
+            self.add(name, recipe)
+
+    def add(self, name: str, recipe: dict):
+        fields = {
+            'title': name,
+            'tags': ' '.join(recipe.get('tags', [])),
+            'ingredients': ' '.join(recipe.get('ingredients', {})),
+            'instructions': ' '.join(recipe.get('instructions', [])),
+        }
+        counts = {}
+        for field, text in fields.items():
+            for word in words(text):
+                counts[word] = counts.get(word, 0.0) + FIELD_WEIGHTS[field]
+
+        self.doc_words[name] = counts
+        length = sum(counts.values())
+        self.doc_lengths[name] = length
+        self.total_length += length
+        for word, count in counts.items():
+            if word not in self.postings:
+                self.postings[word] = {}
+                for gram in word_trigrams(word):
+                    self.trigrams.setdefault(gram, set()).add(word)
+            self.postings[word][name] = count
+
+    def remove(self, name: str):
+        counts = self.doc_words.pop(name, None)
+        if counts is None:
+            return
+        self.total_length -= self.doc_lengths.pop(name)
+        for word in counts:
+            del self.postings[word][name]
+            if not self.postings[word]:
+                del self.postings[word]
+                for gram in word_trigrams(word):
+                    self.trigrams[gram].discard(word)
+                    if not self.trigrams[gram]:
+                        del self.trigrams[gram]
+
+    def update(self, name: str, recipe: dict):
+        self.remove(name)
+        self.add(name, recipe)
+
+    def similar_words(self, word: str):
+        """returns {indexed word: weight} for the word itself and any indexed words within 1 typo (or 2 typos for
+        words of 8 letters or more). short words have to match exactly, otherwise everything matches everything"""
+        if len(word) < 4:
+            return {word: 1.0} if word in self.postings else {}
+        max_typos = 1 if len(word) < 8 else 2
+
+        # each typo can break at most 3 of the word's trigrams, so a word that shares fewer than that can't be close
+        grams = word_trigrams(word)
+        shared = {}
+        for gram in grams:
+            for candidate in self.trigrams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        needed = len(grams) - 3 * max_typos
+
+        matches = {}
+        for candidate, count in shared.items():
+            if count >= needed:
+                typos = edit_distance(word, candidate, max_typos)
+                if typos <= max_typos:
+                    matches[candidate] = 1.0 / (1 + typos)
+        return matches
+
+    def search(self, query: str, k: int = 10):
+        """returns up to k (recipe name, score) pairs, best first"""
+        if not self.doc_words:
+            return []
+        total_docs = len(self.doc_words)
+        average_length = self.total_length / total_docs
+
+        scores = {}
+        for query_word in set(words(query)):
+            # a recipe only gets credit once per query word, from whichever spelling of it matched best
+            best = {}
+            for word, weight in self.similar_words(query_word).items():
+                postings = self.postings[word]
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for name, count in postings.items():
+                    length_norm = 1 - self.B + self.B * self.doc_lengths[name] / average_length
+                    score = weight * idf * count * (self.K1 + 1) / (count + self.K1 * length_norm)
+                    if score > best.get(name, 0.0):
+                        best[name] = score
+            for name, score in best.items():
+                scores[name] = scores.get(name, 0.0) + score
+
+        # a heap keeps only the best k instead of sorting every recipe that matched
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
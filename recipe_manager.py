@@ -1,11 +1,72 @@
-from recipes_class import Recipes, clear_console
+import argparse
+import json
+import os
+import sys
 
-# initialise Recipes object
-recipes = Recipes()
+# the recipes and everything that works with them are only imported and loaded when a command needs them (see
+# AppContext), so commands like stats and migrate, and anything that imports this module, start straight away
+
+
+class AppContext:
+    """what the menus and commands work on, made the first time it's used rather than when the program starts"""
+
+    def __init__(self, environ=os.environ):
+        self.environ = environ
+        self._recipes = None
+        self.metrics = None
+
+    @property
+    def recipes(self):
+        if self._recipes is None:
+            self._recipes = self.load()
+        return self._recipes
+
+    def load(self):
+        """the RECIPES_STORAGE environment variable picks how recipes are saved ('json', 'journal', 'lazy', 'compact',
+        'shared', 'binary' or 'sqlite'), and RECIPES_SAVE_DELAY is the least number of seconds between saves from the
+        menus. saved changes are also recorded next to the recipes in a .history file, for undo and restoring old
+        versions. with RECIPES_USER set, the recipes are that user's catalogue in RECIPES_USERS_DIR (users by default),
+        see the tenants module"""
+        from recipes_class import Recipes
+        from storage import make_store
+
+        # RECIPES_METRICS switches on timing of the Recipes methods, the numbers are written to that file when the
+        # program exits. it has to happen before the Recipes object is made so loading is timed too
+        if self.environ.get('RECIPES_METRICS'):
+            from metrics import enable
+            self.metrics = enable(Recipes, self.environ['RECIPES_METRICS'])
+
+        storage = self.environ.get('RECIPES_STORAGE', 'json')
+        save_delay = float(self.environ.get('RECIPES_SAVE_DELAY', 0))
+        if self.environ.get('RECIPES_USER'):
+            from tenants import CatalogueManager, TenantRecipes
+            try:
+                limit = self.environ.get('RECIPES_USER_LIMIT')
+                if limit and not limit.isdigit():
+                    raise ValueError(f"RECIPES_USER_LIMIT should be a number of bytes, not {limit!r}")
+                limit = int(limit) if limit else None
+                manager = CatalogueManager(self.environ.get('RECIPES_USERS_DIR', 'users'), storage)
+                path = manager.path_for(self.environ['RECIPES_USER'])
+            except ValueError as error:
+                sys.exit(f"Can't use RECIPES_USER={self.environ['RECIPES_USER']}: {error}")
+            return TenantRecipes(make_store(storage, path), limit, save_delay=save_delay,
+                                 history_path=path + '.history')
+        store = make_store(storage)
+        return Recipes(store, save_delay, store.path + '.history')
+
+    def close(self):
+        if self._recipes is not None:
+            self._recipes.store.close()
+
+
+context = AppContext()
 
 # define the main menu
 def main() -> None:
+    from recipes_class import clear_console
+    recipes = context.recipes
     while True:
+        recipes.save_if_due()
         clear_console()
         print("\nRecipe Manager\n")
         print("1. Add a recipe")
@@ -14,8 +75,11 @@ def main() -> None:
         print("4. View all recipes")
         print("5. Search recipes")
         print("6. Display a Recipe")
-        print("7. Exit")
-        choice = input("\nEnter your choice (1-7):\n")
+        print("7. Best match search")
+        print("8. Shopping list")
+        print("9. Undo, redo and history")
+        print("10. Exit")
+        choice = input("\nEnter your choice (1-10):\n")
         if choice == "1":
             recipes.add_recipe()
         elif choice == "2":
@@ -29,10 +93,219 @@ def main() -> None:
         elif choice == "6":
             recipes.display_recipe()
         elif choice == "7":
+            recipes.ranked_search_recipes()
+        elif choice == "8":
+            recipes.make_shopping_list()
+        elif choice == "9":
+            recipes.history_menu()
+        elif choice == "10":
+            recipes.flush()
+            context.close()
             break
         else:
             print("\nInvalid choice. Try again.")
 
-# run the main menu
+def migrate_command(args) -> None:
+    """copies all the recipes from one file to another, the file extensions decide the format (.db for sqlite,
+    .rcp for a binary snapshot)"""
+    from storage import migrate, store_for_path
+    count = migrate(store_for_path(args.source), store_for_path(args.target))
+    print(f"{count} recipes copied from {args.source} to {args.target}")
+
+def run_changes(path: str, make_change) -> None:
+    """applies a change for every line of a json lines file and saves once at the end. if any line fails, nothing is
+    saved at all"""
+    from storage import ConflictError
+    recipes = context.recipes
+    count = 0
+    line_number = 0
+    try:
+        with open(path, 'r') as jsonl_file:
+            for line_number, line in enumerate(jsonl_file, start=1):
+                if line.strip():
+                    count += recipes.apply_changes([make_change(json.loads(line))])
+    except (KeyError, ValueError) as error:
+        # json.JSONDecodeError is a ValueError too, so a broken line also stops everything
+        context.close()
+        sys.exit(f"{path} line {line_number}: {error!r}, nothing was saved")
+    try:
+        recipes.save_recipes()
+    except ConflictError as conflict:
+        context.close()
+        sys.exit(f"{conflict}, nothing was saved")
+    context.close()
+    print(f"{count} changes applied from {path}")
+
+def apply_command(args) -> None:
+    """each line of the file is one change, see Recipes.apply_changes"""
+    run_changes(args.file, lambda change: change)
+
+def import_command(args) -> None:
+    """adds every recipe in a json, json lines or csv dump, see the bulk module for the formats"""
+    from bulk import import_recipes
+    from storage import ConflictError
+    recipes = context.recipes
+    try:
+        report = import_recipes(recipes, args.file, args.format, args.on_conflict, args.workers, args.chunk_size)
+    except (OSError, ValueError) as error:
+        context.close()
+        sys.exit(f"{args.file}: {error}, nothing was saved")
+    for where, name, error in report['errors'][:20]:
+        print(f"{args.file} {where} ({name}): {error}")
+    if len(report['errors']) > 20:
+        print(f"... and {len(report['errors']) - 20} more")
+    if report['errors'] and args.strict:
+        context.close()
+        sys.exit(f"{len(report['errors'])} recipes couldn't be imported, nothing was saved")
+    try:
+        recipes.save_recipes()
+    except ConflictError as conflict:
+        context.close()
+        sys.exit(f"{conflict}, nothing was saved")
+    context.close()
+    print(f"{report['added']} recipes added, {report['renamed']} added under a new name, {report['replaced']} "
+          f"replaced, {report['skipped']} skipped and {len(report['errors'])} couldn't be imported")
+
+def export_command(args) -> None:
+    from bulk import export_recipes, guess_format
+    from storage import atomic_file
+    recipes = context.recipes
+    file_format = args.format or ('json' if args.file == '-' else guess_format(args.file))
+    if args.file == '-':
+        sys.stdout.writelines(export_recipes(recipes.recipes, file_format))
+    else:
+        with atomic_file(args.file) as export_file:
+            export_file.writelines(export_recipes(recipes.recipes, file_format))
+    context.close()
+
+def check_command(args) -> None:
+    """checks a recipes.json file for missing details, bad ratings, duplicate names and empty entries, and repairs them
+    with --fix, see the validate module"""
+    from validate import check_file, format_report
+    try:
+        report = check_file(args.file, args.fix, args.output, args.workers, args.chunk_size)
+    except (OSError, ValueError) as error:
+        sys.exit(f"{args.file}: {error}")
+    print(format_report(report, args.file))
+    if report['with_problems'] and not args.fix:
+        sys.exit(f"{report['with_problems']} recipes have problems, run with --fix to repair them")
+
+def search_command(args) -> None:
+    for name in context.recipes.search(args.query):
+        print(name)
+
+def users_command(args) -> None:
+    """searches or summarises every user's catalogue at once, see the tenants module"""
+    from tenants import CatalogueManager
+    try:
+        manager = CatalogueManager(args.directory, os.environ.get('RECIPES_STORAGE', 'json'), public=args.public,
+                                   workers=args.workers)
+    except (OSError, ValueError) as error:
+        sys.exit(f"{args.directory}: {error}")
+    try:
+        if args.action == 'search':
+            for user, names in manager.search_all(args.query or '').items():
+                print(f"{user}: {', '.join(names)}")
+        elif args.action == 'best':
+            for user, name, score in manager.best_matches(args.query or '', args.k):
+                print(f"{score:.2f}  {name} ({user})")
+        else:
+            summary = manager.summary()
+            for user, count in summary['recipes'].items():
+                rating = summary['average_rating'][user]
+                print(f"{user}: {count} recipes, " + (f"average rating {rating:.1f}" if rating else "not rated"))
+            print("Most used tags: " + ', '.join(f"{tag} ({count})" for tag, count in summary['top_tags']))
+    finally:
+        manager.close()
+
+def serve_command(args) -> None:
+    # the service module is only needed for this command
+    import asyncio
+    from service import serve
+    try:
+        asyncio.run(serve(context.recipes, args.host, args.port, args.save_delay))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        context.close()
+
+def stats_command(args) -> None:
+    """prints a metrics file written by a run with RECIPES_METRICS set"""
+    from metrics import format_report
+    try:
+        with open(args.file, 'r') as metrics_file:
+            print(format_report(json.load(metrics_file)))
+    except (OSError, ValueError) as error:
+        sys.exit(f"Couldn't read {args.file}: {error}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recipe Manager. Run without a command to use the menus.")
+    commands = parser.add_subparsers(dest='command')
+
+    migrate_parser = commands.add_parser('migrate', help="copy every recipe from one file into another")
+    migrate_parser.add_argument('source', help="file to copy from, e.g. recipes.json")
+    migrate_parser.add_argument('target', help="file to copy to, e.g. recipes.db")
+    migrate_parser.set_defaults(run=migrate_command)
+
+    apply_parser = commands.add_parser('apply', help="apply add/update/rename/delete changes from a json lines file")
+    apply_parser.add_argument('file')
+    apply_parser.set_defaults(run=apply_command)
+
+    import_parser = commands.add_parser('import', help="add every recipe in a json, json lines or csv file")
+    import_parser.add_argument('file')
+    import_parser.add_argument('--format', choices=['json', 'jsonl', 'csv'], help="worked out from the file name if not given")
+    import_parser.add_argument('--on-conflict', choices=['rename', 'skip', 'replace', 'error'], default='rename',
+                               help="what to do when a recipe with the same name already exists")
+    import_parser.add_argument('--workers', type=int, help="processes checking recipes, defaults to one per cpu")
+    import_parser.add_argument('--chunk-size', type=int, default=1000, help="recipes sent to a process at a time")
+    import_parser.add_argument('--strict', action='store_true',
+                               help="don't save anything if any recipe can't be imported")
+    import_parser.set_defaults(run=import_command)
+
+    export_parser = commands.add_parser('export', help="write every recipe to a json, json lines or csv file")
+    export_parser.add_argument('file', help="file to write, or - for the screen")
+    export_parser.add_argument('--format', choices=['json', 'jsonl', 'csv'], help="worked out from the file name if not given")
+    export_parser.set_defaults(run=export_command)
+
+    check_parser = commands.add_parser('check', help="check a recipes file for problems and optionally repair them")
+    check_parser.add_argument('file', nargs='?', default='recipes.json')
+    check_parser.add_argument('--fix', action='store_true', help="repair the problems that were found")
+    check_parser.add_argument('--output', help="write the repaired recipes here instead of over the file")
+    check_parser.add_argument('--workers', type=int, default=1, help="processes checking recipes, for huge files")
+    check_parser.add_argument('--chunk-size', type=int, default=1000, help="recipes sent to a process at a time")
+    check_parser.set_defaults(run=check_command)
+
+    search_parser = commands.add_parser('search', help="print the names of recipes matching a search")
+    search_parser.add_argument('query')
+    search_parser.set_defaults(run=search_command)
+
+    users_parser = commands.add_parser('users', help="search or summarise every user's recipes")
+    users_parser.add_argument('action', choices=['search', 'best', 'summary'])
+    users_parser.add_argument('query', nargs='?', help="what to search for")
+    users_parser.add_argument('--directory', default=os.environ.get('RECIPES_USERS_DIR', 'users'),
+                              help="where the users' recipe files are")
+    users_parser.add_argument('--public', help="a recipes file every user can read, included in the results")
+    users_parser.add_argument('-k', type=int, default=10, help="how many best matches to show")
+    users_parser.add_argument('--workers', type=int, default=4, help="threads searching catalogues at once")
+    users_parser.set_defaults(run=users_command)
+
+    serve_parser = commands.add_parser('serve', help="serve the recipes over a local HTTP/JSON api")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--save-delay', type=float, default=0.2,
+                              help="seconds to wait for more changes before saving")
+    serve_parser.set_defaults(run=serve_command)
+
+    stats_parser = commands.add_parser('stats', help="show the timings recorded by a run with RECIPES_METRICS set")
+    stats_parser.add_argument('file', nargs='?', default=os.environ.get('RECIPES_METRICS', 'metrics.json'))
+    stats_parser.set_defaults(run=stats_command)
+
+    return parser.parse_args(argv)
+
+# run the main menu, or a command if one was given
 if __name__ == "__main__":
-    main()
+    arguments = parse_args()
+    if arguments.command is None:
+        main()
+    else:
+        arguments.run(arguments)
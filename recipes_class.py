@@ -1,34 +1,98 @@
-import json
+import time
+
+from history import History, apply_to_recipe, describe, invert, plain_copy
+from render import RenderCache, ingredient_lines, instruction_lines, options, render_page, render_recipe, show
+from storage import ConflictError, JsonStore
+
+# the filter, ranked search, similar recipe and quantity modules are imported by the methods that use them, so starting
+# the program doesn't wait for them (quantities imports numpy if it's installed)
+
+# every recipe has these details, see the readme
+RECIPE_FIELDS = ('ingredients', 'instructions', 'tags', 'author', 'rating')
 
 def clear_console():
     """this function uses ANSI escape codes to clear previous responses from the console"""
     print("\033[H\033[J", end="")
 
+def valid_rating(rating):
+    """ratings are whole numbers from 1 to 5"""
+    return isinstance(rating, int) and not isinstance(rating, bool) and 1 <= rating <= 5
+
+def copy_recipe(recipe):
+    """a separate plain copy of a recipe. the compact store's recipes can't be deep copied, and their to_dict shares
+    the instructions list, so they're copied detail by detail"""
+    return plain_copy(recipe)
+
 class Recipes:
-    def __init__(self):
-        # using a try except block means it will work even if there is no file or the file doesn't load
-        try:
-            # using a with statement to open the file safely, ensuring it will be closed properly, even if there is a problem
-            with open('./recipes.json', 'r') as recipes_file:
-                self.recipes: dict = json.load(recipes_file)
-        except (FileNotFoundError, json.decoder.JSONDecodeError):
-            self.recipes: dict = {}
+    def __init__(self, store=None, save_delay: float = 0.0, history_path: str = None):
+        # the store decides how recipes are read from and written to disk, by default it's the whole recipes.json file
+        self.store = store if store is not None else JsonStore()
+        self.recipes: dict = self.store.load()
+
+        # names of recipes that have been added, edited, renamed or deleted since the last save. it's a dictionary
+        # with empty values rather than a set so new recipes are written in the same order they were added
+        self.changed: dict = {}
+
+        # building the search index once here means searches don't have to loop over every recipe. the store
+        # provides it, because a database store can search without loading every recipe into memory
+        self.index = self.store.make_index(self.recipes)
+
+        # lower case name -> actual dictionary key, so case-insensitive lookups don't need to loop over every name.
+        # if two names only differ by capitalisation, the later one wins, the same as the old find_valid_name loop
+        self.names: dict = {name.lower(): name for name in self.recipes}
+
+        # the ranked search, filter and similar recipe indexes are only built the first time they're needed
+        self.ranked = None
+        self.filters = None
+        self.similarity = None
+
+        # recipe name -> how many times it has changed while the program has been running (missing means 0), so
+        # rendered text can tell if it's out of date
+        self.versions: dict = {}
+        self.rendered = RenderCache()
+        # how many names view_recipes shows at a time
+        self.page_size = 20
+
+        # the menus save at most once every save_delay seconds, anything changed in between waits for the next save
+        # (see save_soon). 0 saves after every change like before
+        self.save_delay = save_delay
+        self.last_save = 0.0
+        self.save_pending = False
+
+        # every change is recorded as a delta so it can be undone and redone, and saved changes are added to the
+        # history file (if there is one) so recipes can be put back the way they were at an earlier time
+        self.history = History(history_path)
+
+    def resolve_name(self, query: str):
+        """returns the dictionary key that matches the query ignoring capitalisation, or None if there isn't one. this
+        doesn't ask for any input so it can be used from scripts as well as the menus"""
+        return self.names.get(query.lower())
+
+    def forget_name(self, name: str):
+        """removes a deleted or renamed recipe from the names lookup"""
+        lower = name.lower()
+        if self.names.get(lower) == name:
+            del self.names[lower]
+            # this only loops if another recipe has the same name with different capitals, which should be rare
+            for other in self.recipes:
+                if other.lower() == lower:
+                    self.names[lower] = other
 
     def find_valid_name(self):
         """this function takes an input and checks whether it appears in the keys of the recipes dictionary (using the
         lower method to ignore capitalisation. If a case-insensitive match is found, the input string is replaced by the
         matching key to ensure an exact match, so it can be used for dictionary lookups."""
+        # the recipe might have been changed or added by another program since the last menu
+        self.refresh()
         while True:
             name = input("Enter a recipe name ('back' to go back):\n")
 
-            # because i need to iterate over all names separately rather than a concatenated string of names, the
-            # quickest way to make this comparison case-insensitive is to make a new list with the keys in lower case
-            lower_recipes = [name.lower() for name in self.recipes]
-            if name.lower() in lower_recipes:
+            # the names lookup is kept up to date as recipes are added, renamed and deleted, so this is a single
+            # dictionary lookup instead of making a new list of lower case keys every time
+            match = self.resolve_name(name)
+            if match is not None:
                 # this ensures that the 'name' variable exactly matches the dictionary key
-                for r in self.recipes:
-                    if name.lower() == r.lower():
-                        name = r
+                name = match
                 break
             elif name.lower() == "back": # needed a way to escape if there aren't any recipes to choose
                 break
@@ -55,10 +119,414 @@ class Recipes:
                 print("Invalid choice, please try again.")
                 continue
 
+    def reindex(self, name: str):
+        """brings the search indexes up to date with a recipe that has been added, changed or removed"""
+        self.versions[name] = self.versions.get(name, 0) + 1
+        self.rendered.discard(name)
+        indexes = [index for index in (self.index, self.ranked, self.filters, self.similarity) if index is not None]
+        if name in self.recipes:
+            for index in indexes:
+                index.update(name, self.recipes[name])
+        else:
+            for index in indexes:
+                index.remove(name)
+
+    def touch(self, name: str):
+        """called whenever a recipe is added, changed or removed, so the search index stays up to date and the store
+        knows which recipes need writing at the next save"""
+        self.reindex(name)
+        self.changed[name] = None
+
+    def refresh(self):
+        """picks up changes that other programs have saved to a shared store since this one last looked. recipes with
+        unsaved changes here are left alone, saving them will raise a ConflictError instead"""
+        for name in self.store.poll(self.recipes, self.changed):
+            self.reindex(name)
+            if name in self.recipes:
+                self.names[name.lower()] = name
+            else:
+                self.forget_name(name)
+
     def save_recipes(self):
-        """this method is automatically called at the end of any other method that changes the recipes dictionary"""
-        with open('recipes.json', 'w') as recipes_file:
-            json.dump(self.recipes, recipes_file)
+        """this method is automatically called at the end of any other method that changes the recipes dictionary.
+        with the shared store, if another program has saved any of the same recipes first, nothing is saved, the
+        unsaved changes are replaced with what's on disk and ConflictError is raised"""
+        if not self.changed:
+            # nothing to write, so the file isn't rewritten, but other programs' changes are still picked up
+            self.refresh()
+            return
+        try:
+            self.store.save(self.recipes, self.changed)
+        except ConflictError:
+            # the recorded steps lead to the unsaved changes, which have just been thrown away
+            self.history.clear()
+            reverted = list(self.changed)
+            self.store.revert(self.recipes, reverted)
+            self.changed.clear()
+            for name in reverted:
+                self.reindex(name)
+                self.forget_name(name)
+                if name in self.recipes:
+                    self.names[name.lower()] = name
+            raise
+        self.changed.clear()
+        self.history.flush()
+        self.last_save = time.monotonic()
+        self.save_pending = False
+        # the shared store catches up with other programs before it writes, so the indexes might need updating
+        self.refresh()
+
+    def save_from_menu(self):
+        """saves for the menu methods, explaining what happened if someone else changed the same recipes first.
+        returns True if the recipes were saved"""
+        try:
+            self.save_recipes()
+            return True
+        except ConflictError as conflict:
+            print(f"\nSomeone else changed {', '.join(conflict.names)} while you were working on it, so your changes "
+                  f"weren't saved and the latest version has been loaded instead.")
+            input("\nPress enter to continue.")
+            return False
+
+    def save_soon(self):
+        """used by the menus after a change. saves straight away if the last save was at least save_delay seconds ago,
+        otherwise the changes wait for save_if_due or flush, so lots of quick changes share one save. returns False
+        if a save happened and failed with a conflict"""
+        if time.monotonic() - self.last_save < self.save_delay:
+            self.save_pending = True
+            return True
+        return self.save_from_menu()
+
+    def save_if_due(self):
+        """called between menus, saves any changes that have been waiting for save_delay seconds"""
+        if self.save_pending and time.monotonic() - self.last_save >= self.save_delay:
+            self.save_from_menu()
+
+    def flush(self):
+        """saves anything that's still waiting, called before the program exits"""
+        if self.save_pending:
+            self.save_from_menu()
+
+    def begin_edit(self, name: str):
+        """starts an edit session for one recipe. the edit menus change the recipe in place, so a plain copy of it is
+        kept to put back if the edits are thrown away. returns the session to pass to rollback_edit"""
+        return {'name': name, 'recipe': copy_recipe(self.recipes[name]), 'changed': set(self.changed),
+                'mark': self.history.mark()}
+
+    def rollback_edit(self, session: dict, name: str):
+        """puts the recipe (now called name) back the way it was when the session started, without saving. names that
+        were only marked as changed by the session are unmarked, so the next save doesn't write them"""
+        original = session['name']
+        if name == original and original not in session['changed'] and original not in self.changed:
+            # nothing was changed during the session
+            return
+        if name != original:
+            self.rename(name, original)
+        self.recipes[original] = session['recipe']
+        self.reindex(original)
+        for changed in list(self.changed):
+            if changed not in session['changed']:
+                del self.changed[changed]
+        # the session's changes are gone, so there's nothing to undo for them
+        self.history.forget_after(session['mark'])
+
+    # the methods below don't ask for input, print anything or save, so scripts can make lots of changes and then call
+    # save_recipes once at the end. they raise KeyError for a recipe that doesn't exist and ValueError for bad data
+
+    def check_recipe(self, recipe: dict):
+        """raises ValueError if a recipe (or part of one, for update) has unknown details, a detail of the wrong type
+        (e.g. tags that aren't a list of text) or a bad rating. it's checked before anything is changed, so a bad
+        recipe or patch leaves the recipes as they were"""
+        # validate imports this module, so it can't be imported at the top
+        from validate import check_detail
+        if not isinstance(recipe, dict):
+            raise ValueError(f"A recipe has to be a dictionary of details, not a {type(recipe).__name__}.")
+        unknown = set(recipe) - set(RECIPE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown recipe details: {', '.join(sorted(unknown))}")
+        if 'rating' in recipe and not valid_rating(recipe['rating']):
+            raise ValueError(f"Invalid rating {recipe['rating']!r}, please use a number from 1 to 5.")
+        for field, value in recipe.items():
+            problem, _ = check_detail(field, value)
+            if problem is not None:
+                raise ValueError(f"Invalid {field}: {problem}.")
+
+    def search(self, query: str):
+        """returns the names of recipes with the query in their title, ingredients or tags (ignoring capitals)"""
+        return self.index.search(query)
+
+    def ranked_search(self, query: str, k: int = 10):
+        """returns up to k (name, score) pairs for the recipes that best match the words in the query, best first.
+        words with a small typo still match, but count for less"""
+        if self.ranked is None:
+            from ranked_search import RankedIndex
+            self.ranked = RankedIndex(self.recipes)
+        return self.ranked.search(query, k)
+
+    def filter(self, query: str):
+        """returns the names of recipes matching a filter query such as 'rating>=4 tag:dinner -ingredient:butter
+        author:Ross'. any plain words in the query are searched for like search does. raises ValueError if the query
+        has unmatched quotes"""
+        if self.filters is None:
+            from filter_index import FilterIndex
+            self.filters = FilterIndex(self.recipes)
+        required, excluded, words = self.filters.parse(query)
+        for word in words:
+            required.append(set(self.search(word)))
+        return self.filters.filter(required, excluded)
+
+    def similar(self, name: str, k: int = 5):
+        """returns up to k (name, similarity) pairs for the recipes with the most ingredients and tags in common with
+        name, most similar first. rare ingredients and tags count for more than common ones"""
+        if self.similarity is None:
+            from similar import SimilarityIndex
+            self.similarity = SimilarityIndex(self.recipes)
+        return self.similarity.similar(name, k)
+
+    def rendered_recipe(self, name: str):
+        """the text display_recipe shows, only formatted again if the recipe has changed since it was last shown"""
+        version = self.versions.get(name, 0)
+        text = self.rendered.get(name, version)
+        if text is None:
+            text = render_recipe(name, self.recipes[name])
+            self.rendered.put(name, version, text)
+        return text
+
+    def scaled_ingredients(self, name: str, factor: float):
+        """returns the recipe's ingredients with every quantity multiplied by factor, e.g. 2 for twice as much"""
+        from quantities import scale_ingredients
+        return scale_ingredients(self.recipes[name].get('ingredients', {}), factor)
+
+    def shopping_list(self, selection: dict):
+        """adds up the ingredients of several recipes, selection is {recipe name: how many times it's being made}. see
+        quantities.shopping_list for what's returned"""
+        from quantities import shopping_list
+        return shopping_list(self.recipes, selection)
+
+    def apply_delta(self, delta: list):
+        """makes the change a delta describes (see the history module), without recording it"""
+        op, name = delta[0], delta[1]
+        if op == 'add':
+            if name in self.recipes:
+                raise ValueError(f"There is already a recipe called {name}.")
+            self.recipes[name] = copy_recipe(delta[2])
+            self.names[name.lower()] = name
+        elif op == 'delete':
+            del self.recipes[name]
+            self.forget_name(name)
+        elif op == 'rename':
+            new_name = delta[2]
+            if new_name in self.recipes:
+                raise ValueError(f"There is already a recipe called {new_name}.")
+            self.recipes[new_name] = self.recipes[name]
+            del self.recipes[name]
+            self.touch(name)
+            self.touch(new_name)
+            self.forget_name(name)
+            self.names[new_name.lower()] = new_name
+            return
+        else:
+            apply_to_recipe(self.recipes[name], delta)
+        self.touch(name)
+
+    def change(self, *deltas: list):
+        """makes the changes and records them as one step that can be undone. if one of them can't be made, the ones
+        before it are undone again, so either all of them happen or none do"""
+        applied = []
+        try:
+            for delta in deltas:
+                self.apply_delta(delta)
+                applied.append(delta)
+        except (KeyError, IndexError, ValueError):
+            self.undo_deltas(applied)
+            raise
+        # a new recipe doesn't need copying into the history, undo copies it when it deletes it
+        self.history.record([['add', delta[1], None] if delta[0] == 'add' else delta for delta in deltas])
+
+    def undo_deltas(self, deltas: list):
+        """applies the opposite of each delta, last one first, and returns the deltas that were applied"""
+        inverses = []
+        try:
+            for delta in reversed(deltas):
+                if delta[0] == 'add':
+                    delta = ['add', delta[1], copy_recipe(self.recipes[delta[1]])]
+                inverse = invert(delta)
+                self.apply_delta(inverse)
+                inverses.append(inverse)
+        except (KeyError, IndexError, ValueError):
+            # half a step is worse than none, so the ones that worked are put back first
+            self.undo_deltas(inverses)
+            raise
+        return [['add', delta[1], None] if delta[0] == 'add' else delta for delta in inverses]
+
+    def undo(self):
+        """undoes the most recent change that hasn't been undone yet and returns its deltas, or None if there's nothing
+        to undo. raises ValueError if the recipes have been changed some other way (e.g. by another program) so it
+        can't be undone, which also forgets everything else that could have been undone"""
+        if not self.history.undo_steps:
+            return None
+        step = self.history.undo_steps.pop()
+        try:
+            self.history.record_undo(self.undo_deltas(step['deltas']))
+        except (KeyError, IndexError, ValueError) as error:
+            self.history.forget_undo()
+            raise ValueError(f"The recipes have changed since, so that can't be undone ({error}).") from error
+        return step['deltas']
+
+    def redo(self):
+        """redoes the most recent undo and returns the deltas it applied again, otherwise the same as undo"""
+        if not self.history.redo_steps:
+            return None
+        step = self.history.redo_steps.pop()
+        try:
+            deltas = self.undo_deltas(step['deltas'])
+        except (KeyError, IndexError, ValueError) as error:
+            self.history.forget_undo()
+            raise ValueError(f"The recipes have changed since, so that can't be redone ({error}).") from error
+        self.history.record_redo(deltas)
+        return deltas
+
+    def recipe_at(self, name: str, when: float):
+        """returns the recipe called name the way it was at the time when (a time.time()), following it back through
+        any renames, or None if it didn't exist then. the changes since are undone on a copy, newest first, so nothing
+        further back than the history file goes can be found. raises ValueError if the history doesn't match"""
+        recipe = copy_recipe(self.recipes[name]) if name in self.recipes else None
+        for step in self.history.newest_first():
+            if step['time'] <= when:
+                break
+            for delta in reversed(step['deltas']):
+                op = delta[0]
+                if op == 'rename':
+                    if delta[2] == name:
+                        name = delta[1]
+                elif delta[1] != name:
+                    continue
+                elif op == 'add':
+                    recipe = None
+                elif op == 'delete':
+                    recipe = copy_recipe(delta[2])
+                elif recipe is not None:
+                    apply_to_recipe(recipe, invert(delta))
+        return recipe
+
+    def recipe_versions(self, name: str):
+        """the times the recipe called name was changed, newest first, as far back as the history goes"""
+        times = []
+        for step in self.history.newest_first():
+            changed = False
+            for delta in reversed(step['deltas']):
+                if delta[0] == 'rename' and delta[2] == name:
+                    name = delta[1]
+                    changed = True
+                elif delta[1] == name:
+                    changed = True
+            if changed:
+                times.append(step['time'])
+        return times
+
+    def restore(self, name: str, when: float):
+        """puts the recipe called name back the way it was at the time when, as a change that can be undone. a
+        recipe that has been deleted since is added back. raises ValueError if it didn't exist then"""
+        recipe = self.recipe_at(name, when)
+        if recipe is None:
+            raise ValueError(f"There wasn't a recipe called {name} then.")
+        if name not in self.recipes:
+            self.change(['add', name, recipe])
+            return
+        current = self.recipes[name]
+        deltas = [['set', name, field, plain_copy(current.get(field)), recipe.get(field)]
+                  for field in dict.fromkeys([*current, *recipe]) if plain_copy(current.get(field)) != recipe.get(field)]
+        if deltas:
+            self.change(*deltas)
+
+    def add(self, name: str, recipe: dict):
+        """adds a new recipe. any missing details are filled in as empty, apart from the rating"""
+        if not name:
+            raise ValueError("Recipe names can't be empty.")
+        if name in self.recipes:
+            raise ValueError(f"There is already a recipe called {name}.")
+        self.check_recipe(recipe)
+        new_recipe = {'ingredients': {}, 'instructions': [], 'tags': [], 'author': ''}
+        new_recipe.update(recipe)
+        self.change(['add', name, new_recipe])
+
+    def update(self, name: str, patch: dict, new_name: str = None):
+        """replaces the details in the patch and leaves the others as they were, e.g. {'rating': 4, 'tags': []}. with
+        new_name the recipe is renamed in the same step, so either the rename and the details all change or none do"""
+        recipe = self.recipes[name]
+        self.check_recipe(patch)
+        deltas = []
+        if new_name is not None and new_name != name:
+            if not new_name:
+                raise ValueError("Recipe names can't be empty.")
+            if new_name in self.recipes:
+                raise ValueError(f"There is already a recipe called {new_name}.")
+            deltas.append(['rename', name, new_name])
+            name = new_name
+        deltas += [['set', name, field, plain_copy(recipe.get(field)), plain_copy(value)]
+                   for field, value in patch.items()]
+        if deltas:
+            self.change(*deltas)
+
+    def rename(self, name: str, new_name: str):
+        if not new_name:
+            raise ValueError("Recipe names can't be empty.")
+        if new_name in self.recipes:
+            raise ValueError(f"There is already a recipe called {new_name}.")
+        if name not in self.recipes:
+            raise KeyError(name)
+        self.change(['rename', name, new_name])
+
+    def delete(self, name: str):
+        self.change(['delete', name, copy_recipe(self.recipes[name])])
+
+    def set_ingredient(self, name: str, ingredient: str, quantity: str = None):
+        """adds an ingredient or changes its quantity, or removes it if quantity is None. raises KeyError for removing
+        an ingredient the recipe doesn't have"""
+        ingredients = self.recipes[name]['ingredients']
+        if ingredient in ingredients:
+            position = list(ingredients).index(ingredient)
+        elif quantity is None:
+            raise KeyError(ingredient)
+        else:
+            position = len(ingredients)
+        self.change(['ingredient', name, ingredient, ingredients.get(ingredient), quantity, position])
+
+    def insert_item(self, name: str, field: str, index: int, value: str):
+        """adds a tag or instruction at index (counting from 0), anywhere past the end adds it on the end"""
+        index = max(0, min(index, len(self.recipes[name][field])))
+        self.change(['insert', name, field, index, value])
+
+    def remove_item(self, name: str, field: str, index: int):
+        """removes the tag or instruction at index (counting from 0), raises IndexError if there isn't one"""
+        items = self.recipes[name][field]
+        if not 0 <= index < len(items):
+            raise IndexError(index)
+        self.change(['remove', name, field, index, items[index]])
+
+    def apply_changes(self, changes):
+        """applies a sequence of change dictionaries, each one with an 'op' and the arguments for that method:
+            {"op": "add", "name": ..., "recipe": {...}}
+            {"op": "update", "name": ..., "patch": {...}}
+            {"op": "rename", "name": ..., "new_name": ...}
+            {"op": "delete", "name": ...}
+        nothing is saved, so if one of them raises an error the caller can just not save. returns how many were
+        applied"""
+        count = 0
+        for change in changes:
+            op = change.get('op')
+            if op == 'add':
+                self.add(change['name'], change['recipe'])
+            elif op == 'update':
+                self.update(change['name'], change['patch'])
+            elif op == 'rename':
+                self.rename(change['name'], change['new_name'])
+            elif op == 'delete':
+                self.delete(change['name'])
+            else:
+                raise ValueError(f"Unknown change type: {op!r}")
+            count += 1
+        return count
 
     def add_recipe(self):
         # initialise dictionary object to store recipe data
@@ -97,10 +565,15 @@ class Recipes:
         # input rating
         new_recipe = self.add_rating(new_recipe)
 
-        # add recipe to recipes dictionary
-        name = input("Enter a recipe name:\n")
-        self.recipes[name] = new_recipe
-        self.save_recipes()
+        # add recipe to recipes dictionary, asking again if the name is empty or already used
+        while True:
+            name = input("Enter a recipe name:\n")
+            try:
+                self.add(name, new_recipe)
+                break
+            except ValueError as error:
+                print(f"\n{error}\n")
+        self.save_soon()
 
     def add_rating(self, recipe: dict):
         """this method is called during the add_recipe method, not from an options menu"""
@@ -109,7 +582,7 @@ class Recipes:
             try:
                 rating = int(input("Enter a rating (1-5):\n"))
                 # validate input in correct range
-                if rating > 5 or rating < 1:
+                if not valid_rating(rating):
                     print("Invalid rating entered, please use a number from 1 to 5.")
                     continue
                 recipe['rating'] = rating
@@ -131,44 +604,57 @@ class Recipes:
         # verify user's intention
         answer = input("Are you sure you want to delete this recipe? (y/n): ")
         if answer in ["y", "Y", "yes", "YES", "Yes"]:
-            del self.recipes[name]
-            self.save_recipes()
-            print(f"{name} removed")
+            self.delete(name)
+            if self.save_soon():
+                print(f"{name} removed")
         else:
             input("Recipe not deleted, press enter to return to main menu.")
 
     def view_recipes(self):
         """this method prints the name of every recipe in the system"""
-        clear_console()
-        print("\nView All Recipes")
-        print("\nRecipe Titles:")
-
-        # iterate through recipes dictionary and print each key
-        for recipe in self.recipes.keys():
-            print(f"- {recipe}")
-
-        self.move_to_display_menu()
+        self.refresh()
+        # just the names are copied, so the pages can go forwards and backwards
+        names = list(self.recipes.keys())
+        pages = max(1, -(-len(names) // self.page_size))
+        page = 0
+        while True:
+            # the page is shown a screen at a time rather than one print per recipe
+            show("\nView All Recipes\n\nRecipe Titles:\n", render_page(names, page, self.page_size),
+                 "\nPlease choose an option:\n1. Display a recipe\n2. Return to main menu.\n"
+                 "n. Next page\np. Previous page\n")
+            choice = input("\nEnter your choice (1, 2, n or p):\n").lower()
+            if choice == "1":
+                self.display_recipe()
+            elif choice == "2":
+                return
+            elif choice == "n":
+                page = min(page + 1, pages - 1)
+            elif choice == "p":
+                page = max(page - 1, 0)
+            else:
+                print("Invalid choice, please try again.")
 
     def search_recipes(self):
         """takes a user's search query and prints a list of any recipes that have that search term in the title,
         ingredients or tags"""
         clear_console()
+        self.refresh()
 
         # get a search query
-        query = input("\nSearch for a recipe name, category, or ingredient:\n")
+        query = input("\nSearch for a recipe name, category, or ingredient "
+                      "(or filter, e.g. rating>=4 tag:dinner -ingredient:butter author:Ross):\n")
 
-        # initialise list for search results
-        filtered_recipes = []
-
-        # join all strings in ingredients and tags lists to make them quicker to search
-        # use the .lower string method in the comparisons to make them case-insensitive
-        for title, recipe in self.recipes.items():
-            if query.lower() in title.lower():
-                filtered_recipes.append(title)
-            elif query.lower() in ' '.join(recipe['ingredients']).lower():
-                filtered_recipes.append(title)
-            elif query.lower() in ' '.join(recipe['tags']).lower():
-                filtered_recipes.append(title)
+        from filter_index import is_filter_query
+        if is_filter_query(query):
+            try:
+                filtered_recipes = self.filter(query)
+            except ValueError as error:
+                print(f"\nInvalid filter: {error}")
+                filtered_recipes = []
+        else:
+            # the index only checks the recipes that share all the query's n-grams, the comparison is still
+            # case-insensitive and gives the same results as looking through every title, ingredient and tag
+            filtered_recipes = self.search(query)
 
         # print the list items if there are any
         if not filtered_recipes:
@@ -181,6 +667,28 @@ class Recipes:
         # show option to display a recipe
         self.move_to_display_menu()
 
+    def ranked_search_recipes(self):
+        """like search_recipes, but looks for each word separately (in the instructions too) and only shows the best
+        matches, in order"""
+        clear_console()
+        self.refresh()
+
+        # get a search query
+        query = input("\nSearch for recipes, best matches are shown first:\n")
+
+        results = self.ranked_search(query)
+
+        # print the list items if there are any
+        if not results:
+            print("No recipes found")
+        else:
+            print("\nBest matching recipes:")
+            for recipe, score in results:
+                print(f"- {recipe} ({score:.1f})")
+
+        # show option to display a recipe
+        self.move_to_display_menu()
+
     def edit_recipe(self):
         """takes user input and calls the relevant editing function"""
 
@@ -189,6 +697,8 @@ class Recipes:
         if name == "back":
             return
 
+        # changes are made to the recipe straight away, the session remembers how it was so option 7 can undo them
+        session = self.begin_edit(name)
         while True:
             clear_console()
             print(f"Editing Recipe: {name}")
@@ -212,11 +722,12 @@ class Recipes:
             elif choice == '4':
                 self.edit_instructions(name)
             elif choice == '5':
-                self.recipes[name] = self.add_rating(self.recipes[name])
+                self.update(name, {'rating': self.add_rating({})['rating']})
             elif choice == '6':
-                self.save_recipes()
+                self.save_soon()
                 break
             elif choice == "7":
+                self.rollback_edit(session, name)
                 break
             else:
                 print("\nInvalid choice")
@@ -233,10 +744,12 @@ class Recipes:
             if new_name in self.recipes:
                 print("\nPlease use a name that hasn't been used already")
                 continue
+            if not new_name:
+                print("\nRecipe names can't be empty.")
+                continue
 
             # replace recipe name
-            self.recipes[new_name] = self.recipes[name]
-            del self.recipes[name]
+            self.rename(name, new_name)
 
             # confirm name change
             print(f"\n{name} succesfuly changed to {new_name}")
@@ -273,25 +786,25 @@ class Recipes:
     def add_tag(self, name: str):
         """appends new tag to the list of tags"""
 
-        print(f"Existing tags: {self.recipes[name]["tags"]}")
-        self.recipes[name]["tags"].append(input("Enter new tag: "))
+        print(f"Existing tags: {self.recipes[name]['tags']}")
+        self.insert_item(name, 'tags', len(self.recipes[name]['tags']), input("Enter new tag: "))
         print(f"Updated tags: {self.recipes[name]['tags']}")
         input("\nPress enter to return to Edit Tags menu.")
 
     def delete_tag(self, name: str):
         """removes a specified tag from the list"""
 
-        print(f"Existing tags: {self.recipes[name]["tags"]}")
+        print(f"Existing tags: {self.recipes[name]['tags']}")
 
         # keep asking for input until valid tag is entered
         while True:
             unwanted = input("Enter tag to remove: ")
-            if unwanted in self.recipes[name]["tags"]:
+            if unwanted in self.recipes[name]['tags']:
                 break
             print("Invalid tag entered, please try again.")
 
         # remove tag
-        self.recipes[name]["tags"].remove(unwanted)
+        self.remove_item(name, 'tags', self.recipes[name]['tags'].index(unwanted))
         print(f"Updated tags: {self.recipes[name]['tags']}")
 
         input("\nPress enter to return to Edit Tags menu.")
@@ -327,23 +840,15 @@ class Recipes:
     def add_ingredient(self, name: str):
         title = "existing ingredients:"
         while True:
-            clear_console()
-
-            # display current ingredients
-            print(f"{name} {title}")
-            for k, v in self.recipes[name]['ingredients'].items():
-                print(f"{v:<10}{k}")
-
-            # display options
-            print("\nPlease choose an option:")
-            print("1. Add new ingredient")
-            print("2. Go back")
+            # display current ingredients and options as one screen
+            show(f"{name} {title}\n", ingredient_lines(self.recipes[name]['ingredients']),
+                 options("Add new ingredient", "Go back"))
 
             choice = input("\nEnter your choice (1-2):\n")
             if choice == "1":
                 new_ingredient = input("Enter a new ingredient: ")
                 new_quantity = input("Enter a quantity: ")
-                self.recipes[name]['ingredients'][new_ingredient] = new_quantity
+                self.set_ingredient(name, new_ingredient, new_quantity)
                 title = "updated ingredients:"
                 continue
             elif choice == "2":
@@ -356,16 +861,9 @@ class Recipes:
         """deletes an item from the ingredients dictionary"""
         title = "existing ingredients:"
         while True:
-            # display existing ingredients
-            clear_console()
-            print(f"{name} {title}")
-            for k, v in self.recipes[name]['ingredients'].items():
-                print(f"{v:<10}{k}")
-
-            # display options
-            print("\nPlease choose an option:")
-            print("1. Remove an ingredient")
-            print("2. Go back")
+            # display existing ingredients and options as one screen
+            show(f"{name} {title}\n", ingredient_lines(self.recipes[name]['ingredients']),
+                 options("Remove an ingredient", "Go back"))
 
             # make choice
             choice = input("\nEnter your choice (1-2):\n")
@@ -374,7 +872,7 @@ class Recipes:
                 while True:
                     ingredient = input("Enter the ingredient to remove: ")
                     try:
-                        del self.recipes[name]['ingredients'][ingredient]
+                        self.set_ingredient(name, ingredient)
                         title = "updated ingredients:"
                         break
                     except KeyError:
@@ -392,16 +890,9 @@ class Recipes:
         """updates the quantity of existing ingredients"""
         title = "existing ingredients:" # this will change to 'updated ingredients' once updated
         while True:
-            # display current ingredients
-            clear_console()
-            print(f"{name} {title}")
-            for k, v in self.recipes[name]['ingredients'].items():
-                print(f"{v:<10}{k}")
-
-            # display options
-            print("\nPlease choose an option:")
-            print("1. Edit an ingredient quantity")
-            print("2. Go back")
+            # display current ingredients and options as one screen
+            show(f"{name} {title}\n", ingredient_lines(self.recipes[name]['ingredients']),
+                 options("Edit an ingredient quantity", "Go back"))
 
             # make choice
             choice = input("\nEnter your choice (1-2):\n")
@@ -411,7 +902,7 @@ class Recipes:
                     ingredient = input("Enter the ingredient to edit: ")
                     try:
                         new_quantity = input("Enter a new quantity: ")
-                        self.recipes[name]['ingredients'][ingredient] = new_quantity
+                        self.set_ingredient(name, ingredient, new_quantity)
                         title = "updated ingredients:"
                         break
                     except KeyError:
@@ -452,23 +943,16 @@ class Recipes:
         """adds a new instruction at a specified position in the list"""
         title = "existing instructions:"
         while True:
-            # display current instructions
-            clear_console()
-            print(f"{name} {title}")
-            for n, inst in enumerate(self.recipes[name]['instructions']):
-                print(f"{n+1}. {inst}")
-
-            # display options
-            print("\nPlease choose an option:")
-            print("1. Add new instruction")
-            print("2. Go back")
+            # display current instructions and options as one screen
+            show(f"{name} {title}\n", instruction_lines(self.recipes[name]['instructions']),
+                 options("Add new instruction", "Go back"))
 
             # make choice
             choice = input("\nEnter your choice (1-2):\n")
             if choice == "1":
                 new_inst = input("Enter new instruction: ")
                 new_index = int(input("Enter position to insert new instruction: "))
-                self.recipes[name]['instructions'].insert(new_index-1, new_inst)
+                self.insert_item(name, 'instructions', new_index-1, new_inst)
                 title = "updated instructions:"
                 continue
             elif choice == "2":
@@ -481,16 +965,9 @@ class Recipes:
         """deletes existing instruction from specified position in the list"""
         title = "existing instructions:" # when updated, this will change to 'updated instructions'
         while True:
-            # display existing instructions
-            clear_console()
-            print(f"{name} {title}\n")
-            for n, inst in enumerate(self.recipes[name]['instructions']):
-                print(f"{n+1}. {inst}")
-
-            # display options
-            print("\nPlease choose an option:")
-            print("1. Delete an instruction")
-            print("2. Go back")
+            # display existing instructions and options as one screen
+            show(f"{name} {title}\n\n", instruction_lines(self.recipes[name]['instructions']),
+                 options("Delete an instruction", "Go back"))
 
             # make choice
             choice = input("\nEnter your choice (1-2):\n")
@@ -501,7 +978,7 @@ class Recipes:
                 while True:
                     index = int(input(f"Enter position of unwanted instruction (1-{max_num}): "))
                     try:
-                        self.recipes[name]['instructions'].pop(index-1)
+                        self.remove_item(name, 'instructions', index-1)
                         title = "updated instructions:"
                         break
                     except IndexError:
@@ -521,7 +998,7 @@ class Recipes:
             print(f"Edit {name} rating\n")
             try:
                 new_rating = int(input("Enter a rating (1-5):\n"))
-                self.recipes[name]['rating'] = new_rating
+                self.update(name, {'rating': new_rating})
                 break
             except ValueError:
                 print("Invalid rating entered, please use a number from 1 to 5.")
@@ -532,15 +1009,139 @@ class Recipes:
         if title == "back":
             return
 
-        # display recipe details
+        # display recipe details, from the render cache if it hasn't changed since it was last shown
+        show(self.rendered_recipe(title))
+
+        # show the ingredients for a different amount, as often as needed
+        while True:
+            answer = input("\nEnter a number to scale the ingredients by (e.g. 2 or 0.5), s to see similar recipes, or "
+                           "press enter to return to previous menu.\n")
+            if not answer:
+                break
+            if answer.lower() == 's':
+                similar = self.similar(title)
+                if not similar:
+                    print("\nNo similar recipes found")
+                else:
+                    show("\nSimilar recipes:\n", ''.join(f"- {name} ({score:.0%} alike)\n" for name, score in similar),
+                         clear=False)
+                continue
+            from quantities import MAX_FACTOR, valid_factor
+            try:
+                factor = float(answer)
+            except ValueError:
+                print("Invalid number, please try again.")
+                continue
+            if not valid_factor(factor):
+                print(f"Please enter a number more than 0 and up to {MAX_FACTOR}.")
+                continue
+            show(f"\nIngredients x {answer}\n", ingredient_lines(self.scaled_ingredients(title, factor)), clear=False)
+
+    def make_shopping_list(self):
+        """asks for recipes and how many times each one will be made, then prints all their ingredients added up"""
+        clear_console()
+        print("Shopping List\n")
+        selection = {}
+        while True:
+            # 'back' here means the list is finished
+            name = self.find_valid_name()
+            if name == "back":
+                break
+            from quantities import MAX_FACTOR, valid_factor
+            while True:
+                try:
+                    times = float(input(f"How many times will you make {name}? (press enter for 1)\n") or 1)
+                except ValueError:
+                    print("Invalid number, please try again.")
+                    continue
+                if valid_factor(times):
+                    break
+                print(f"Please enter a number more than 0 and up to {MAX_FACTOR}.")
+            selection[name] = selection.get(name, 0) + times
+            print(f"\nRecipes so far: {', '.join(selection)}\n")
+
+        if not selection:
+            return
+        from quantities import format_quantity
+        totals, unknown = self.shopping_list(selection)
         clear_console()
-        print(f"{title} by {self.recipes[title]['author']}")
-        print(f"\nRating: {self.recipes[title]['rating']} / 5")
-        print(f"Tags: {', '.join(self.recipes[title]['tags'])}")
-        print("\nIngredients")
-        for k, v in self.recipes[title]['ingredients'].items():
-            print(f"{v:<10}{k}")
-        print("\nInstructions")
-        for i in self.recipes[title]['instructions']:
-            print(f"- {i}")
-        input("\nPress enter to return to previous menu.")
+        print(f"Shopping list for {', '.join(selection)}\n")
+        for ingredient, amount, unit in totals:
+            print(f"{format_quantity(amount, unit):<10}{ingredient}")
+        if unknown:
+            print("\nAlso:")
+            for ingredient, text, name in unknown:
+                print(f"{text:<10}{ingredient} ({name})")
+        input("\nPress enter to return to main menu.")
+
+    def history_menu(self):
+        """undo, redo, and putting a recipe back the way it was earlier"""
+        while True:
+            clear_console()
+            print("Undo, redo and history")
+            if self.history.undo_steps:
+                print(f"\nLast change: {'; '.join(describe(delta) for delta in self.history.undo_steps[-1]['deltas'])}")
+            print("\nPlease choose an option:")
+            print("1. Undo")
+            print("2. Redo")
+            print("3. Restore an earlier version of a recipe")
+            print("4. Go back")
+
+            choice = input("\nEnter your choice (1-4):\n")
+            if choice in ("1", "2"):
+                try:
+                    deltas = self.undo() if choice == "1" else self.redo()
+                except ValueError as error:
+                    input(f"\n{error}\n\nPress enter to continue.")
+                    continue
+                if deltas is None:
+                    input(f"\nThere's nothing to {'undo' if choice == '1' else 'redo'}, press enter to continue.")
+                    continue
+                self.save_soon()
+                print(f"\n{'Undone' if choice == '1' else 'Redone'}: {'; '.join(describe(delta) for delta in deltas)}")
+                input("\nPress enter to continue.")
+            elif choice == "3":
+                self.restore_recipe()
+            elif choice == "4":
+                break
+            else:
+                print("\nInvalid choice")
+                continue
+
+    def restore_recipe(self):
+        """lists the times a recipe was changed and puts it back the way it was after one of them"""
+        # a recipe that has been deleted can be restored too, so the name doesn't have to be a current one
+        name = input("Enter a recipe name ('back' to go back):\n")
+        if name.lower() == "back":
+            return
+        name = self.resolve_name(name) or name
+        times = self.recipe_versions(name)
+        if not times:
+            input(f"\nThere's no history for {name}, press enter to continue.")
+            return
+
+        print(f"\nVersions of {name}, newest first:")
+        for n, when in enumerate(times, start=1):
+            print(f"{n}. {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(when))}")
+        try:
+            number = int(input(f"\nEnter the version to go back to (1-{len(times)}):\n"))
+            if not 1 <= number <= len(times):
+                raise ValueError
+        except ValueError:
+            input("\nInvalid version, press enter to continue.")
+            return
+
+        try:
+            recipe = self.recipe_at(name, times[number - 1])
+        except ValueError as error:
+            input(f"\nThe history for {name} doesn't match the recipe ({error}), press enter to continue.")
+            return
+        if recipe is None:
+            input(f"\n{name} had been deleted then, press enter to continue.")
+            return
+        show(render_recipe(name, recipe))
+        answer = input(f"\nPut {name} back like this? (y/n): ")
+        if answer in ["y", "Y", "yes", "YES", "Yes"]:
+            self.restore(name, times[number - 1])
+            if self.save_soon():
+                input(f"\n{name} restored, press enter to continue.")
@@ -0,0 +1,72 @@
+"""builds whole screens as one string and writes them in one go, instead of lots of separate prints, and keeps the text
+of recently displayed recipes so showing one again doesn't format it all again"""
+import sys
+from collections import OrderedDict
+
+CLEAR = "\033[H\033[J"
+
+
+def show(*parts: str, clear: bool = True):
+    """writes a screen (cleared first, like clear_console) with a single write and flush"""
+    sys.stdout.write((CLEAR if clear else '') + ''.join(parts))
+    sys.stdout.flush()
+
+
+def ingredient_lines(ingredients):
+    return ''.join(f"{v:<10}{k}\n" for k, v in ingredients.items())
+
+
+def instruction_lines(instructions, numbered: bool = True):
+    if numbered:
+        return ''.join(f"{n + 1}. {inst}\n" for n, inst in enumerate(instructions))
+    return ''.join(f"- {inst}\n" for inst in instructions)
+
+
+def options(*choices: str):
+    """the 'Please choose an option' part of a menu"""
+    return "\nPlease choose an option:\n" + ''.join(f"{n}. {choice}\n" for n, choice in enumerate(choices, start=1))
+
+
+def render_recipe(title: str, recipe):
+    """the text display_recipe shows for a recipe. missing details are shown as empty rather than failing, the check
+    command finds and repairs them"""
+    rating = f"{recipe['rating']} / 5" if 'rating' in recipe else "not rated"
+    return (f"{title} by {recipe.get('author', '')}\n"
+            f"\nRating: {rating}\n"
+            f"Tags: {', '.join(recipe.get('tags', []))}\n"
+            f"\nIngredients\n{ingredient_lines(recipe.get('ingredients', {}))}"
+            f"\nInstructions\n{instruction_lines(recipe.get('instructions', []), numbered=False)}")
+
+
+def render_page(names: list, page: int, page_size: int):
+    """one page of a list of recipe names, with where it is in the list underneath"""
+    pages = max(1, -(-len(names) // page_size))
+    start = page * page_size
+    lines = ''.join(f"- {name}\n" for name in names[start:start + page_size])
+    return f"{lines}\nPage {page + 1} of {pages} ({len(names)} recipes)\n"
+
+
+class RenderCache:
+    """the rendered text of the most recently displayed recipes. each entry remembers the version of the recipe it was
+    rendered from (Recipes.versions goes up every time a recipe changes), so an edited recipe is never shown out of
+    date"""
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, name: str, version: int):
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != version:
+            return None
+        self.entries.move_to_end(name)
+        return entry[1]
+
+    def put(self, name: str, version: int, text: str):
+        self.entries[name] = (version, text)
+        self.entries.move_to_end(name)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def discard(self, name: str):
+        self.entries.pop(name, None)
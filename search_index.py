@@ -0,0 +1,128 @@
+from array import array
+
+
+class SearchIndex:
+    """an inverted index of n-grams over the recipe titles, ingredient names and tags, so a search only has to look
+    at recipes that could possibly match instead of walking through the whole recipes dictionary"""
+
+    # the longest n-gram stored in the index. shorter queries are looked up directly, longer ones are split into
+    # overlapping n-grams of this length and the posting sets are intersected
+    GRAM_SIZE = 3
+
+    def __init__(self, recipes: dict):
+        # n-gram -> set of recipe names containing that n-gram in one of their searchable fields
+        self.postings: dict = {}
+        # recipe name -> the lower case strings that search_recipes has always compared against
+        self.fields: dict = {}
+        # recipe name -> position, so results come out in the same order as the recipes dictionary
+        self.order: dict = {}
+        self.next_position = 0
+        # n-gram -> posting packed as an array of positions in names, for an index loaded from a cache. each one is
+        # only turned into a set of names the first time it's needed, which is what makes loading from a cache fast
+        self.packed: dict = {}
+        self.names: list = []
+
+        for name, recipe in recipes.items():
+            self.add(name, recipe)
+
+    @staticmethod
+    def searchable_fields(name: str, recipe: dict):
+        """these are exactly the strings the original linear search built for every recipe on every query, now they
+        are only built once when a recipe is indexed"""
+        return (name.lower(),
+                ' '.join(recipe.get('ingredients', {})).lower(),
+                ' '.join(recipe.get('tags', [])).lower())
+
+    def grams(self, text: str):
+        """returns every substring of text from 1 character up to GRAM_SIZE characters long"""
+        return {text[i:i + n] for n in range(1, self.GRAM_SIZE + 1) for i in range(len(text) - n + 1)}
+
+    def add(self, name: str, recipe: dict, position: int = None):
+        """indexes a recipe. new recipes go to the end of the order, like new keys in a dictionary"""
+        if position is None:
+            position = self.next_position
+            self.next_position += 1
+        self.order[name] = position
+
+        fields = self.searchable_fields(name, recipe)
+        self.fields[name] = fields
+        for gram in set().union(*(self.grams(field) for field in fields)):
+            # only an index loaded from a cache has packed postings, checking first keeps building an index fast
+            names = self.posting(gram) if self.packed else self.postings.get(gram)
+            if names is None:
+                names = self.postings[gram] = set()
+            names.add(name)
+
+    def remove(self, name: str):
+        """removes a recipe from the index, returning its position so it can be re-indexed in the same place"""
+        fields = self.fields.pop(name, None)
+        if fields is None:
+            return None
+        for gram in set().union(*(self.grams(field) for field in fields)):
+            names = self.posting(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.postings[gram]
+        return self.order.pop(name)
+
+    def update(self, name: str, recipe: dict):
+        """re-indexes a recipe after its tags or ingredients have changed, keeping its place in the order (or adding
+        it to the end if it wasn't indexed yet)"""
+        position = self.remove(name)
+        self.add(name, recipe, position)
+
+    def search(self, query: str):
+        """returns the names of all recipes with the query in their title, ingredients or tags, in the same order
+        the recipes dictionary would give them"""
+        query = query.lower()
+
+        if len(query) <= self.GRAM_SIZE:
+            # short queries are stored in the index as they are
+            candidates = (self.posting(query) or set()) if query else self.fields.keys()
+        else:
+            # intersect the smallest posting sets first so the candidate set shrinks as fast as possible
+            posting_sets = sorted((self.posting(gram) or set() for gram in self.grams_of_size(query)), key=len)
+            candidates = set.intersection(*posting_sets)
+
+        # the n-grams could be spread over different fields, so each candidate still has to be checked, but this
+        # only compares strings that were built when the recipe was indexed
+        matches = [name for name in candidates if any(query in field for field in self.fields[name])]
+        matches.sort(key=self.order.__getitem__)
+        return matches
+
+    def grams_of_size(self, text: str):
+        """returns the overlapping n-grams of exactly GRAM_SIZE characters in text"""
+        return {text[i:i + self.GRAM_SIZE] for i in range(len(text) - self.GRAM_SIZE + 1)}
+
+    def posting(self, gram: str):
+        """the set of names with the n-gram, or None if there aren't any"""
+        names = self.postings.get(gram)
+        if names is None and gram in self.packed:
+            all_names = self.names
+            names = self.postings[gram] = {all_names[n] for n in array('I', self.packed.pop(gram))}
+        return names
+
+    def state(self, names: list):
+        """the index as plain values that marshal can write to a cache file. names is every indexed name in order, the
+        same order as the recipes dictionary, and the postings are stored as positions in it"""
+        positions = {name: n for n, name in enumerate(names)}
+        postings = dict(self.packed) if self.names == names else {}
+        for gram in set(self.postings) | set(self.packed):
+            if gram not in postings or gram in self.postings:
+                postings[gram] = array('I', sorted(positions[name] for name in self.posting(gram))).tobytes()
+        # the index keeps the packed postings too, so the next save only has to pack the ones that change
+        self.postings, self.packed, self.names = {}, dict(postings), names
+        return {'postings': postings, 'fields': [self.fields[name] for name in names]}
+
+    @classmethod
+    def from_state(cls, names: list, state: dict):
+        """an index made from a state, without indexing all the recipes again"""
+        index = cls.__new__(cls)
+        index.postings = {}
+        index.packed = state['postings']
+        index.names = names
+        index.fields = dict(zip(names, state['fields']))
+        index.order = {name: n for n, name in enumerate(names)}
+        index.next_position = len(names)
+        return index
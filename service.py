@@ -0,0 +1,196 @@
+import asyncio
+import json
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from filter_index import is_filter_query
+from storage import ConflictError
+
+
+class SaveError(Exception):
+    """a batched save failed for some reason other than a conflict, e.g. the disk is full. the writes are still in
+    memory and the next save tries them again, so the requests are answered 202 Accepted rather than as errors"""
+
+
+class RecipeService:
+    """serves one Recipes object over a small HTTP/JSON api, so other programs can use the recipes without going
+    through the menus. reads are answered straight from memory. writes are applied straight away too, but saving is
+    left until save_delay seconds after the first unsaved write, so lots of writes close together share one
+    save_recipes. a write's response is only sent once the save that includes it has finished. if that save fails
+    the write is still made, it's answered 202 Accepted with the error and saved by the next save that works.
+
+        GET    /recipes                   all recipe names (?offset=0&limit=100 for a page of them)
+        GET    /recipes?q=chickpea        search, the same as the search menu (filters work too)
+        GET    /ranked?q=potatos&k=10     best match search
+        GET    /recipes/<name>            one recipe (the name ignores capitals)
+        POST   /recipes                   {"name": ..., "recipe": {...}}
+        PATCH  /recipes/<name>            {"name": <new name>} and/or any recipe details to change
+        DELETE /recipes/<name>
+    """
+
+    def __init__(self, recipes, save_delay: float = 0.2):
+        self.recipes = recipes
+        self.save_delay = save_delay
+        # the future every write in the current batch waits for, None when there are no unsaved writes
+        self.pending_save = None
+        self.save_timer = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8000):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def schedule_save(self):
+        """returns a future that finishes when the current batch of writes has been saved"""
+        if self.pending_save is None:
+            self.pending_save = asyncio.get_running_loop().create_future()
+            self.save_timer = asyncio.get_running_loop().call_later(self.save_delay, self.save_batch)
+        return self.pending_save
+
+    async def saved(self):
+        """waits until the current batch of writes has been saved"""
+        try:
+            # the batch is shared by every write in it, so one request being cancelled mustn't cancel it
+            await asyncio.shield(self.schedule_save())
+        except ConflictError:
+            raise
+        except Exception as error:
+            raise SaveError(error) from error
+
+    def save_batch(self):
+        batch, self.pending_save = self.pending_save, None
+        try:
+            self.recipes.save_recipes()
+        except Exception as error:
+            batch.set_exception(error)
+        else:
+            batch.set_result(None)
+
+    def flush(self):
+        """saves the current batch straight away instead of waiting for the delay, used when the service is stopped so
+        writes that have been made aren't lost. raises whatever the save raised"""
+        if self.pending_save is None:
+            return
+        self.save_timer.cancel()
+        batch = self.pending_save
+        self.save_batch()
+        # the requests waiting for it have usually been cancelled by now, so nothing else will look at the result
+        batch.result()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, payload = await self.respond(method, target, body)
+                data = json.dumps(payload, default=to_json).encode()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            # a broken request or a client that went away, there's nobody left to answer
+            pass
+        except asyncio.CancelledError:
+            # the service is stopping, serve flushes any writes this request was waiting to save
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method: str, target: str, body: bytes):
+        """returns the HTTP status and the json payload for one request"""
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [unquote(part) for part in url.path.strip('/').split('/', 1)]
+        try:
+            data = json.loads(body) if body else {}
+            if method == 'GET':
+                self.recipes.refresh()
+            if parts[0] == 'ranked' and method == 'GET':
+                results = self.recipes.ranked_search(query.get('q', ''), int(query.get('k', 10)))
+                return HTTPStatus.OK, [{'name': name, 'score': score} for name, score in results]
+            if parts[0] != 'recipes':
+                return HTTPStatus.NOT_FOUND, {'error': 'Not found'}
+            if len(parts) == 1:
+                if method == 'GET':
+                    return HTTPStatus.OK, self.list_recipes(query)
+                if method == 'POST':
+                    self.recipes.add(data['name'], data['recipe'])
+                    await self.saved()
+                    return HTTPStatus.CREATED, {'name': data['name']}
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'Method not allowed'}
+
+            name = self.recipes.resolve_name(parts[1])
+            if name is None:
+                return HTTPStatus.NOT_FOUND, {'error': f"Recipe not found: {parts[1]}"}
+            if method == 'GET':
+                return HTTPStatus.OK, {'name': name, 'recipe': self.recipes.recipes[name]}
+            if method == 'PATCH':
+                new_name = data.pop('name', None)
+                # one change, so a rename with a detail that can't be changed doesn't leave half of it behind
+                self.recipes.update(name, data, new_name)
+                name = name if new_name is None else new_name
+                await self.saved()
+                return HTTPStatus.OK, {'name': name, 'recipe': self.recipes.recipes[name]}
+            if method == 'DELETE':
+                self.recipes.delete(name)
+                await self.saved()
+                return HTTPStatus.OK, {'deleted': name}
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'Method not allowed'}
+        except ConflictError as error:
+            return HTTPStatus.CONFLICT, {'error': str(error)}
+        except SaveError as error:
+            # the change has been made and other writes may already depend on it, so it's kept for the next save
+            # rather than undone
+            return HTTPStatus.ACCEPTED, {'pending': True, 'error': f"Couldn't save yet, it'll be tried again: {error}"}
+        except KeyError as error:
+            return HTTPStatus.BAD_REQUEST, {'error': f"Missing {error}"}
+        except (ValueError, TypeError, AttributeError) as error:
+            return HTTPStatus.BAD_REQUEST, {'error': str(error)}
+
+    def list_recipes(self, query: dict):
+        if 'q' in query:
+            names = self.recipes.filter(query['q']) if is_filter_query(query['q']) else self.recipes.search(query['q'])
+        else:
+            names = self.recipes.recipes
+        offset = int(query.get('offset', 0))
+        limit = int(query['limit']) if 'limit' in query else None
+        page = []
+        for n, name in enumerate(names):
+            if n < offset:
+                continue
+            if limit is not None and len(page) >= limit:
+                break
+            page.append(name)
+        return page
+
+
+def to_json(value):
+    """the compact and sqlite stores give back dictionary and list-like objects that json can't encode directly"""
+    return dict(value) if hasattr(value, 'keys') else list(value)
+
+
+async def serve(recipes, host: str = '127.0.0.1', port: int = 8000, save_delay: float = 0.2):
+    """runs the service until the program is stopped"""
+    service = RecipeService(recipes, save_delay)
+    server = await service.start(host, port)
+    print(f"Serving recipes on http://{host}:{port}/recipes (ctrl+c to stop)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        # ctrl+c cancels serve_forever, but the writes waiting for the save delay still have to be saved
+        service.flush()
@@ -0,0 +1,89 @@
+import heapq
+import math
+
+
+def features(recipe):
+    """the ingredients and tags of a recipe, which are what make two recipes alike. ingredients and tags are kept
+    apart, so a 'spicy' tag doesn't match an ingredient that happens to be called spicy"""
+    return ({'ingredient:' + ingredient.strip().lower() for ingredient in recipe.get('ingredients', {})}
+            | {'tag:' + tag.strip().lower() for tag in recipe.get('tags', [])})
+
+
+class SimilarityIndex:
+    """finds the recipes most like a given one, by the cosine similarity of their ingredient and tag vectors. each
+    ingredient or tag is weighted by how rare it is (its idf), so sharing saffron counts for a lot more than sharing
+    salt. the vectors are sparse, so instead of comparing with every recipe only the recipes that share at least one
+    feature are looked at, using an inverted index from each feature to the recipes that have it"""
+
+    # the vector lengths depend on every recipe (through the idf weights), so they're only all worked out again once
+    # the number of recipes has changed by this fraction since the last time
+    RENORMALISE_AFTER = 0.1
+
+    def __init__(self, recipes):
+        # feature -> set of recipe names
+        self.postings: dict = {}
+        # recipe name -> set of features
+        self.doc_features: dict = {}
+        # recipe name -> length of its weighted vector
+        self.norms: dict = {}
+        self.normalised_at = 0
+
+        for name, recipe in recipes.items():
+            self.add(name, recipe)
+        self.renormalise()
+
+    def idf(self, feature: str):
+        return math.log(1 + len(self.doc_features) / len(self.postings[feature]))
+
+    def norm(self, name: str):
+        return math.sqrt(sum(self.idf(feature) ** 2 for feature in self.doc_features[name]))
+
+    def renormalise(self):
+        self.norms = {name: self.norm(name) for name in self.doc_features}
+        self.normalised_at = len(self.doc_features)
+
+    def add(self, name: str, recipe):
+        recipe_features = features(recipe)
+        self.doc_features[name] = recipe_features
+        for feature in recipe_features:
+            self.postings.setdefault(feature, set()).add(name)
+        # the new recipe's own length is worked out straight away, the others are left until renormalise
+        self.norms[name] = self.norm(name)
+
+    def remove(self, name: str):
+        recipe_features = self.doc_features.pop(name, None)
+        if recipe_features is None:
+            return
+        self.norms.pop(name, None)
+        for feature in recipe_features:
+            self.postings[feature].discard(name)
+            if not self.postings[feature]:
+                del self.postings[feature]
+
+    def update(self, name: str, recipe):
+        self.remove(name)
+        self.add(name, recipe)
+
+    def similar(self, name: str, k: int = 5):
+        """returns up to k (recipe name, similarity) pairs for the recipes most like name, most similar first. the
+        similarity goes from 0 (nothing in common) to 1 (the same ingredients and tags)"""
+        if name not in self.doc_features:
+            return []
+        if abs(len(self.doc_features) - self.normalised_at) > self.RENORMALISE_AFTER * max(self.normalised_at, 1):
+            self.renormalise()
+
+        # each shared feature adds its weight squared to the dot product of the two vectors
+        dots = {}
+        for feature in self.doc_features[name]:
+            weight = self.idf(feature) ** 2
+            for other in self.postings[feature]:
+                dots[other] = dots.get(other, 0.0) + weight
+        dots.pop(name, None)
+
+        norm = self.norms[name]
+        if not norm:
+            return []
+        # lengths that haven't been renormalised yet can push a score slightly over 1
+        scores = ((other, min(1.0, dot / (norm * self.norms[other]))) for other, dot in dots.items()
+                  if self.norms[other])
+        return heapq.nlargest(k, scores, key=lambda item: item[1])
@@ -0,0 +1,201 @@
+"""a binary file format for the recipes, used by the binary store. it's smaller than json and can be memory mapped and
+read one recipe at a time, because every string that's shared between recipes is stored once in a string table and
+recipes just refer to them by number. the file is laid out as
+
+    header      magic, format version, recipe count, where the string tables start, where the index starts
+    bodies      one per recipe: a 4 byte length and then the recipe
+    tables      names, ingredients, quantities, tags and authors, each one a count, the length of its text, the offset
+                of every string in the text and then the utf-8 text itself
+    index       the offset of each recipe's body, in the same order as the names table
+
+all numbers are little endian. a body is the FIELDS present as bits, the rating (-128 if it's not a small whole number),
+the author's number, then counts followed by ingredient and quantity numbers, tag numbers and length prefixed
+instructions, and last of all a length prefixed json object for anything that didn't fit (details that aren't in
+FIELDS, or details that aren't the usual type)"""
+import json
+import struct
+
+from compact import FIELDS, NO_RATING, StringTable
+
+MAGIC = b'RECIPES\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')
+TABLES = ('names', 'ingredients', 'quantities', 'tags', 'authors')
+U32 = struct.Struct('<I')
+U32_PAIR = struct.Struct('<II')
+U64 = struct.Struct('<Q')
+BODY_START = struct.Struct('<IBbI')
+
+
+class Snapshot:
+    """reads a snapshot straight out of a memory mapped file (or any bytes). nothing is copied or decoded until it's
+    asked for, apart from the names, which are needed to look recipes up"""
+
+    def __init__(self, data):
+        self.data = data
+        magic, version, self.count, tables_offset, index_offset = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("not a recipes snapshot")
+        if version != VERSION:
+            raise ValueError(f"unknown snapshot version {version}")
+
+        # table name -> (where its offsets start, where its text starts, how many strings)
+        self.tables = {}
+        position = tables_offset
+        for table in TABLES:
+            count, length = U32_PAIR.unpack_from(data, position)
+            offsets = position + U32_PAIR.size
+            text = offsets + U32.size * (count + 1)
+            self.tables[table] = (offsets, text, count)
+            position = text + length
+        self.index_offset = index_offset
+        # decoded strings, the same handful of tags and quantities are used by almost every recipe
+        self.strings = {table: {} for table in TABLES}
+
+    def string(self, table: str, number: int):
+        cache = self.strings[table]
+        string = cache.get(number)
+        if string is None:
+            offsets, text, _ = self.tables[table]
+            start, end = U32_PAIR.unpack_from(self.data, offsets + U32.size * number)
+            string = cache[number] = str(self.data[text + start:text + end], 'utf-8')
+        return string
+
+    def all_strings(self, table: str):
+        return [self.string(table, number) for number in range(self.tables[table][2])]
+
+    def spans(self):
+        """recipe name -> (start, end) of its body (after the length), in file order"""
+        spans = {}
+        for n, name in enumerate(self.all_strings('names')):
+            start, = U64.unpack_from(self.data, self.index_offset + U64.size * n)
+            length, = U32.unpack_from(self.data, start)
+            spans[name] = (start + U32.size, start + U32.size + length)
+        # the names are only needed once, so they aren't kept in the cache
+        self.strings['names'].clear()
+        return spans
+
+    def decode(self, start: int):
+        """the recipe whose body starts at start, as a normal recipe dictionary"""
+        data = self.data
+        author, present, rating, count = BODY_START.unpack_from(data, start)
+        position = start + BODY_START.size
+        recipe = {}
+        if present & 1:
+            ingredients = {}
+            for _ in range(count):
+                ingredient, quantity = U32_PAIR.unpack_from(data, position)
+                ingredients[self.string('ingredients', ingredient)] = self.string('quantities', quantity)
+                position += U32_PAIR.size
+            recipe['ingredients'] = ingredients
+        if present & 2:
+            count, = U32.unpack_from(data, position)
+            position += U32.size
+            instructions = []
+            for _ in range(count):
+                length, = U32.unpack_from(data, position)
+                position += U32.size
+                instructions.append(str(data[position:position + length], 'utf-8'))
+                position += length
+            recipe['instructions'] = instructions
+        if present & 4:
+            count, = U32.unpack_from(data, position)
+            position += U32.size
+            recipe['tags'] = [self.string('tags', U32.unpack_from(data, position + U32.size * n)[0])
+                              for n in range(count)]
+            position += U32.size * count
+        if present & 8:
+            recipe['author'] = self.string('authors', author)
+        if present & 16 and rating != NO_RATING:
+            recipe['rating'] = rating
+        length, = U32.unpack_from(data, position)
+        if length:
+            recipe.update(json.loads(data[position + U32.size:position + U32.size + length]))
+        return recipe
+
+
+def fits(field: str, value):
+    """true if a detail has the usual type, so it can go in the binary layout instead of the json on the end"""
+    if field == 'ingredients':
+        return isinstance(value, dict) and all(isinstance(k, str) and isinstance(v, str) for k, v in value.items())
+    if field in ('instructions', 'tags'):
+        return isinstance(value, list) and all(isinstance(item, str) for item in value)
+    if field == 'author':
+        return isinstance(value, str)
+    return isinstance(value, int) and not isinstance(value, bool) and NO_RATING < value < 128
+
+
+class SnapshotWriter:
+    """encodes recipes and writes snapshot files. starting from an existing snapshot keeps all of its string numbers,
+    so the bodies of recipes that haven't changed can be copied across as they are"""
+
+    def __init__(self, previous: Snapshot = None):
+        self.tables = {table: StringTable() for table in TABLES[1:]}
+        if previous is not None:
+            for table, strings in self.tables.items():
+                for string in previous.all_strings(table):
+                    strings.id_of(string)
+
+    def encode(self, recipe):
+        """the body of a recipe, without its length"""
+        present = 0
+        extra = {}
+        for n, field in enumerate(FIELDS):
+            if field in recipe:
+                if fits(field, recipe[field]):
+                    present |= 1 << n
+                else:
+                    extra[field] = recipe[field]
+        extra.update((field, value) for field, value in recipe.items() if field not in FIELDS)
+
+        ingredients = recipe['ingredients'] if present & 1 else {}
+        parts = [BODY_START.pack(self.tables['authors'].id_of(recipe['author']) if present & 8 else 0, present,
+                                 recipe['rating'] if present & 16 else NO_RATING, len(ingredients))]
+        for ingredient, quantity in ingredients.items():
+            parts.append(U32_PAIR.pack(self.tables['ingredients'].id_of(ingredient),
+                                       self.tables['quantities'].id_of(quantity)))
+        if present & 2:
+            parts.append(U32.pack(len(recipe['instructions'])))
+            for instruction in recipe['instructions']:
+                encoded = instruction.encode('utf-8')
+                parts.append(U32.pack(len(encoded)))
+                parts.append(encoded)
+        if present & 4:
+            parts.append(U32.pack(len(recipe['tags'])))
+            parts.extend(U32.pack(self.tables['tags'].id_of(tag)) for tag in recipe['tags'])
+        encoded = json.dumps(extra).encode('utf-8') if extra else b''
+        parts.append(U32.pack(len(encoded)))
+        parts.append(encoded)
+        return b''.join(parts)
+
+    def write(self, output, bodies):
+        """writes a whole snapshot to a binary file that can seek. bodies is (name, body) pairs, in order. returns
+        recipe name -> (start, end) of each body in the new file"""
+        output.write(b'\x00' * HEADER.size)
+        position = HEADER.size
+        names = []
+        index = []
+        spans = {}
+        for name, body in bodies:
+            names.append(name)
+            index.append(position)
+            output.write(U32.pack(len(body)))
+            output.write(body)
+            spans[name] = (position + U32.size, position + U32.size + len(body))
+            position += U32.size + len(body)
+
+        tables_offset = position
+        for strings in [names] + [self.tables[table].strings for table in TABLES[1:]]:
+            encoded = [string.encode('utf-8') for string in strings]
+            offsets = [0]
+            for string in encoded:
+                offsets.append(offsets[-1] + len(string))
+            output.write(U32_PAIR.pack(len(encoded), offsets[-1]))
+            output.write(struct.pack(f'<{len(offsets)}I', *offsets))
+            output.write(b''.join(encoded))
+            position += U32_PAIR.size + U32.size * len(offsets) + offsets[-1]
+
+        output.write(struct.pack(f'<{len(index)}Q', *index))
+        output.seek(0)
+        output.write(HEADER.pack(MAGIC, VERSION, len(names), tables_offset, position))
+        return spans
@@ -0,0 +1,1060 @@
+import json
+import marshal
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # windows doesn't have fcntl, everything apart from the shared store still works without it
+    fcntl = None
+
+from compact import CompactCatalogue
+from search_index import SearchIndex
+from snapshot import Snapshot, SnapshotWriter
+
+
+# the permissions new files get, read once here because the only way to read the umask is to change it
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+@contextmanager
+def atomic_file(path: str, mode: str = 'w'):
+    """gives a temporary file next to the real one and then renames it over the top once everything is written. the
+    rename either happens completely or not at all, so a crash half way through a save can't leave a truncated file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(mode, dir=directory, prefix='.recipes-', suffix='.tmp', delete=False) as temp:
+        try:
+            yield temp
+            temp.flush()
+            os.fsync(temp.fileno())
+        except BaseException:
+            temp.close()
+            os.remove(temp.name)
+            raise
+    # temporary files can only be read by their owner, the new file keeps the old one's permissions instead (or gets
+    # the usual ones for a new file) so other people can still read a shared recipes file
+    try:
+        permissions = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        permissions = 0o666 & ~UMASK
+    os.chmod(temp.name, permissions)
+    os.replace(temp.name, path)
+
+
+def write_atomic(path: str, recipes):
+    """writes the recipes dictionary to a json file without any risk of leaving it half written"""
+    with atomic_file(path) as temp:
+        json.dump(recipes, temp)
+
+
+# goes up whenever what's in a cache file changes, so old caches are just ignored
+CACHE_VERSION = 1
+
+
+def cache_key(path: str):
+    """what a cache of the file at path has to match to still be up to date. marshal's format can change between
+    python versions, so the version is part of it too"""
+    stat = os.stat(path)
+    return [CACHE_VERSION, list(sys.version_info[:2]), stat.st_mtime_ns, stat.st_size]
+
+
+class JsonStore:
+    """the original way of storing recipes, the whole dictionary lives in one json file and every save rewrites it"""
+
+    def __init__(self, path: str = 'recipes.json', cache_path: str = None):
+        self.path = path
+        # a copy of the parsed recipes and their search index, written with marshal so it loads several times faster
+        # than parsing the json and indexing every recipe again. it's only used while recipes.json has the same
+        # modification time and size as when it was written. None means no cache
+        self.cache_path = cache_path
+        self.cached_index = None
+        # the cache key recipes.json had just before it was read, anything written to it after that isn't in memory
+        self.loaded_key = None
+        # the index handed out by make_index, it's kept up to date by Recipes so it can go in the cache on close
+        self.index = None
+        # the recipes and changed names from the last save. the cache is only written again when the store is closed,
+        # and only if nothing has changed since that save, so saving doesn't pay for it
+        self.last_save = None
+
+    def load(self):
+        if self.cache_path is not None:
+            recipes = self.load_cache()
+            if recipes is not None:
+                return recipes
+            try:
+                self.loaded_key = cache_key(self.path)
+            except OSError:
+                pass
+        # using a try except block means it will work even if there is no file or the file doesn't load
+        try:
+            # using a with statement to open the file safely, ensuring it will be closed properly, even if there is a problem
+            with open(self.path, 'r') as recipes_file:
+                return json.load(recipes_file)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return {}
+
+    def load_cache(self):
+        """the recipes from the cache, or None if there isn't one or recipes.json has changed since it was written"""
+        try:
+            key = cache_key(self.path)
+            with open(self.cache_path, 'rb') as cache_file:
+                cached_key, recipes, index = marshal.load(cache_file)
+        except (OSError, EOFError, ValueError, TypeError):
+            # no cache, or one that was half written or made by something else
+            return None
+        if cached_key != key:
+            return None
+        self.cached_index = index
+        return recipes
+
+    def write_cache(self, recipes, key):
+        if self.cache_path is None or self.index is None or key is None:
+            return
+        try:
+            with atomic_file(self.cache_path, 'wb') as cache_file:
+                marshal.dump([key, recipes, self.index.state(list(recipes))], cache_file)
+        except (OSError, ValueError):
+            # the cache is only there to start faster, so not being able to write one isn't a problem
+            pass
+
+    def make_index(self, recipes):
+        """the whole dictionary is in memory, so searches use an in-memory n-gram index"""
+        if self.cached_index is not None:
+            self.index = SearchIndex.from_state(list(recipes), self.cached_index)
+            self.cached_index = None
+        else:
+            self.index = SearchIndex(recipes)
+            # the first start after recipes.json has changed does the parsing and indexing, so the next one can skip it
+            self.write_cache(recipes, self.loaded_key)
+        return self.index
+
+    def save(self, recipes, changed):
+        """the json file can't be partly updated, so the changed names are ignored and everything is written"""
+        write_atomic(self.path, recipes)
+        if self.cache_path is not None:
+            self.last_save = (recipes, changed)
+
+    def poll(self, recipes, changed):
+        """only the shared store can be changed by other programs while this one is running"""
+        return []
+
+    def close(self):
+        """brings the cache up to date with the last save, unless there have been changes since that weren't saved"""
+        if self.last_save is not None:
+            recipes, changed = self.last_save
+            self.last_save = None
+            if not changed:
+                self.write_cache(recipes, cache_key(self.path))
+
+
+class CompactStore(JsonStore):
+    """the same recipes.json file as the json store, but the recipes are kept in memory as a CompactCatalogue, which
+    stores every ingredient, quantity, tag and author string once and uses __slots__ objects and arrays instead of
+    nested dictionaries"""
+
+    def load(self):
+        recipes = super().load()
+        catalogue = CompactCatalogue()
+        # each decoded recipe is thrown away as soon as it's converted, so both copies are never fully in memory
+        for name in list(recipes):
+            catalogue[name] = recipes.pop(name)
+        return catalogue
+
+    def save(self, recipes, changed):
+        """json can't encode the compact recipes directly, so each one is turned back into a dictionary and written
+        on its own, in the same format json.dump uses"""
+        with atomic_file(self.path) as temp:
+            temp.write('{')
+            for n, (name, recipe) in enumerate(recipes.items()):
+                temp.write((', ' if n else '') + json.dumps(name) + ': ' + json.dumps(recipe.to_dict()))
+            temp.write('}')
+
+
+class JournalStore(JsonStore):
+    """keeps recipes.json as a snapshot and appends one line per changed recipe to a journal file next to it, so a save
+    only writes the recipes that changed. when the journal gets long it is folded back into the snapshot by a
+    background thread. the snapshot is still a normal recipes.json file, so it can be used by the json store too"""
+
+    def __init__(self, path: str = 'recipes.json', compact_every: int = 1000):
+        super().__init__(path)
+        self.journal_path = path + '.journal'
+        # while a compaction is running, the journal it is folding in is renamed to this so new saves can carry on
+        self.frozen_path = path + '.journal.old'
+        self.compact_every = compact_every
+        self.records = 0
+        self.compactor = None
+
+    def load(self):
+        recipes = super().load()
+        # a frozen journal is only left behind if the program stopped during a compaction, it's older than the
+        # current journal so it has to be replayed first
+        self.replay(recipes, self.frozen_path)
+        self.records = self.replay(recipes, self.journal_path)
+        return recipes
+
+    @staticmethod
+    def replay(recipes, path: str):
+        """applies every record in a journal file to the recipes and returns how many there were"""
+        count = 0
+        good_bytes = 0
+        try:
+            with open(path, 'rb') as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+                        # a line that was only half written when the program stopped, everything before it is fine
+                        break
+                    if record['recipe'] is None:
+                        recipes.pop(record['name'], None)
+                    else:
+                        recipes[record['name']] = record['recipe']
+                    count += 1
+                    good_bytes += len(line)
+                else:
+                    return count
+        except FileNotFoundError:
+            return count
+
+        # cut the broken line off, otherwise the next record would be appended onto the end of it
+        os.truncate(path, good_bytes)
+        return count
+
+    def save(self, recipes, changed):
+        """appends the current state of every changed recipe, or None if it was deleted or renamed"""
+        if not changed:
+            return
+        lines = ''.join(json.dumps({'name': name, 'recipe': recipes.get(name)}) + '\n' for name in changed)
+        with open(self.journal_path, 'a') as journal:
+            journal.write(lines)
+            journal.flush()
+            os.fsync(journal.fileno())
+
+        self.records += len(changed)
+        if self.records >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """starts folding the journal into the snapshot in a background thread. the thread only reads files, not the
+        recipes in memory, so the menus can keep changing recipes while it runs"""
+        if self.compactor is not None and self.compactor.is_alive():
+            return
+
+        # if there is already a frozen journal it has to be folded in before the current one can take its place
+        if not os.path.exists(self.frozen_path):
+            try:
+                os.replace(self.journal_path, self.frozen_path)
+            except FileNotFoundError:
+                return
+            self.records = 0
+
+        self.compactor = threading.Thread(target=self.fold_frozen_journal, name='journal-compaction')
+        self.compactor.start()
+
+    def fold_frozen_journal(self):
+        recipes = JsonStore.load(self)
+        self.replay(recipes, self.frozen_path)
+        write_atomic(self.path, recipes)
+        # replaying the frozen journal again is harmless, so if the program stops before this line nothing is lost
+        os.remove(self.frozen_path)
+
+    def close(self):
+        """waits for a running compaction to finish"""
+        if self.compactor is not None:
+            self.compactor.join()
+
+
+class ConflictError(Exception):
+    """raised by the shared store when a save includes recipes that another program has saved since this one loaded
+    them. nothing from that save is written"""
+
+    def __init__(self, names: list):
+        super().__init__(f"Changed by someone else: {', '.join(names)}")
+        self.names = names
+
+
+class SharedStore(JournalStore):
+    """a journal store that several programs can use at the same time. every write holds an exclusive lock on
+    recipes.json.lock, every journal record has a version number for its recipe, and a save only goes ahead if none
+    of the recipes it writes have a newer version on disk than the one that was edited (compare and swap). other
+    programs' changes are picked up by reading just the new lines at the end of the journal"""
+
+    def __init__(self, path: str = 'recipes.json', compact_every: int = 1000):
+        super().__init__(path, compact_every)
+        if fcntl is None:
+            raise RuntimeError("The shared store needs file locks from the fcntl module (Linux or macOS)")
+        self.lock_path = path + '.lock'
+        # recipe versions at the time of the last compaction, since they can't go in recipes.json itself
+        self.versions_path = path + '.versions'
+        # recipe name -> newest version on disk, and the version the copy in memory came from. recipes that have
+        # never been changed since the first snapshot are version 0
+        self.latest: dict = {}
+        self.base: dict = {}
+        # the newest version on disk of recipes that couldn't be updated in memory because they have unsaved changes
+        self.remote: dict = {}
+        # names updated in memory from other programs' changes that Recipes hasn't been told about yet
+        self.applied: list = []
+        # which journal file has been read and how far, it's replaced with a new file after every compaction
+        self.journal_id = None
+        self.offset = 0
+        # which versions file the versions came from, a compaction by any program writes a new one
+        self.versions_id = None
+
+    @contextmanager
+    def locked(self, exclusive: bool):
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def file_id(path: str):
+        """tells apart different files written to the same path, None if there isn't one"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def read_versions(self):
+        self.versions_id = self.file_id(self.versions_path)
+        try:
+            with open(self.versions_path, 'r') as versions_file:
+                return json.load(versions_file)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return {}
+
+    def load(self):
+        with self.locked(False):
+            recipes = JsonStore.load(self)
+            self.latest = self.read_versions()
+            self.base = dict(self.latest)
+            self.read_journal(recipes, {})
+        self.applied.clear()
+        return recipes
+
+    def apply(self, recipes, changed, name: str, recipe, version: int):
+        """brings one recipe in memory up to date with the disk, unless it has unsaved changes"""
+        self.latest[name] = version
+        if name in changed:
+            self.remote[name] = recipe
+            return
+        if recipe is None:
+            recipes.pop(name, None)
+        else:
+            recipes[name] = recipe
+        self.base[name] = version
+        self.remote.pop(name, None)
+        self.applied.append(name)
+
+    def read_journal(self, recipes, changed):
+        """applies any journal records written since the last read. if there has been a compaction since then (the
+        versions file is a different one), the new snapshot is compared with the versions to find which recipes
+        changed and the new journal is read from the start"""
+        if self.file_id(self.versions_path) != self.versions_id:
+            self.read_new_snapshot(recipes, changed)
+            self.journal_id = None
+
+        try:
+            journal = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            # nothing has been saved since the last snapshot
+            return
+
+        with journal:
+            stat = os.fstat(journal.fileno())
+            journal_id = (stat.st_dev, stat.st_ino)
+            if journal_id != self.journal_id:
+                self.journal_id = journal_id
+                self.offset = 0
+                self.records = 0
+
+            journal.seek(self.offset)
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+                    # a half written line from a program that crashed, it's cut off by the next save
+                    break
+                name = record['name']
+                version = record.get('version', self.latest.get(name, 0) + 1)
+                self.apply(recipes, changed, name, record['recipe'], version)
+                self.offset += len(line)
+                self.records += 1
+
+    def read_new_snapshot(self, recipes, changed):
+        snapshot = JsonStore.load(self)
+        for name, version in self.read_versions().items():
+            if version != self.latest.get(name, 0):
+                self.apply(recipes, changed, name, snapshot.get(name), version)
+
+    def poll(self, recipes, changed):
+        """picks up other programs' changes and returns the names of recipes that were updated in memory"""
+        with self.locked(False):
+            self.read_journal(recipes, changed)
+        applied = self.applied
+        self.applied = []
+        return applied
+
+    def save(self, recipes, changed):
+        if not changed:
+            return
+        with self.locked(True):
+            self.read_journal(recipes, changed)
+            conflicts = [name for name in changed if self.latest.get(name, 0) != self.base.get(name, 0)]
+            if conflicts:
+                raise ConflictError(conflicts)
+
+            lines = []
+            for name in changed:
+                version = self.latest.get(name, 0) + 1
+                lines.append(json.dumps({'name': name, 'recipe': recipes.get(name), 'version': version}) + '\n')
+                self.latest[name] = self.base[name] = version
+                self.remote.pop(name, None)
+            data = ''.join(lines).encode()
+            with open(self.journal_path, 'ab') as journal:
+                # anything after the last complete record is a half written line from a crash
+                journal.truncate(self.offset)
+                journal.write(data)
+                journal.flush()
+                os.fsync(journal.fileno())
+                stat = os.fstat(journal.fileno())
+            self.journal_id = (stat.st_dev, stat.st_ino)
+            self.offset += len(data)
+            self.records += len(lines)
+
+            if self.records >= self.compact_every:
+                self.compact()
+
+    def compact(self):
+        """folds the journal into recipes.json. this has to happen while the exclusive lock is held, so unlike the
+        journal store it doesn't use a background thread"""
+        snapshot = JsonStore.load(self)
+        self.replay(snapshot, self.journal_path)
+        # the versions are written first, if the program stops before the journal is replaced the journal records
+        # just set the same versions again
+        with atomic_file(self.versions_path) as temp:
+            json.dump(self.latest, temp)
+        self.versions_id = self.file_id(self.versions_path)
+        write_atomic(self.path, snapshot)
+        with atomic_file(self.journal_path, 'wb') as temp:
+            stat = os.fstat(temp.fileno())
+        self.journal_id = (stat.st_dev, stat.st_ino)
+        self.offset = 0
+        self.records = 0
+
+    def revert(self, recipes, names):
+        """throws away the unsaved changes to these recipes and loads what is on disk now"""
+        with self.locked(False):
+            on_disk = JsonStore.load(self)
+            self.replay(on_disk, self.journal_path)
+            for name in names:
+                if name in on_disk:
+                    recipes[name] = on_disk[name]
+                else:
+                    recipes.pop(name, None)
+                self.base[name] = self.latest.get(name, 0)
+                self.remote.pop(name, None)
+
+
+# matches either a whole json string (so brackets inside strings are skipped) or a single bracket
+JSON_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+JSON_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"')
+# a value that isn't an object or a list
+JSON_SCALAR = re.compile(rb'"(?:[^"\\]|\\.)*"|-?[0-9][0-9.eE+-]*|true|false|null')
+WHITESPACE = re.compile(rb'[ \t\n\r]*')
+
+
+def iter_offsets(data, scalars: bool = False):
+    """finds where each recipe starts and ends in the bytes of a recipes.json file without decoding any of them.
+    yields (name, start, end) in the same order as the file, including any names that appear more than once. recipes
+    have to be objects (or lists), unless scalars is True, when strings, numbers, true, false and null are allowed too
+    so a checker can report them"""
+    position = WHITESPACE.match(data, 0).end()
+    if data[position:position + 1] != b'{':
+        raise ValueError("recipes file doesn't start with '{'")
+    position = WHITESPACE.match(data, position + 1).end()
+    if data[position:position + 1] == b'}':
+        return
+
+    while True:
+        key = JSON_STRING.match(data, position)
+        if key is None:
+            raise ValueError(f"expected a recipe name at byte {position}")
+        position = WHITESPACE.match(data, key.end()).end()
+        if data[position:position + 1] != b':':
+            raise ValueError(f"expected ':' at byte {position}")
+        start = WHITESPACE.match(data, position + 1).end()
+
+        scalar = JSON_SCALAR.match(data, start) if scalars else None
+        if scalar is not None:
+            end = scalar.end()
+        else:
+            # only the brackets are counted, everything inside strings is skipped over by the regex
+            if data[start:start + 1] not in (b'{', b'['):
+                raise ValueError(f"expected a recipe at byte {start}")
+            depth = 0
+            for token in JSON_TOKEN.finditer(data, start):
+                bracket = data[token.start()]
+                if bracket in b'{[':
+                    depth += 1
+                elif bracket in b'}]':
+                    depth -= 1
+                    if depth == 0:
+                        break
+            else:
+                raise ValueError("recipes file ends in the middle of a recipe")
+            end = token.end()
+
+        yield json.loads(key.group()), start, end
+
+        position = WHITESPACE.match(data, end).end()
+        separator = data[position:position + 1]
+        if separator == b'}':
+            return
+        if separator != b',':
+            raise ValueError(f"expected ',' or '}}' at byte {position}")
+        position = WHITESPACE.match(data, position + 1).end()
+
+
+def scan_offsets(data):
+    """returns a dictionary of recipe name -> (start, end) of each recipe in the bytes of a recipes.json file, in the
+    same order as the file, see iter_offsets"""
+    return {name: (start, end) for name, start, end in iter_offsets(data)}
+
+
+class LazyRecipes(MutableMapping):
+    """looks like the recipes dictionary, but each recipe stays as bytes in the memory mapped file until it's used.
+    decoded recipes are kept in a least recently used cache of limited size. recipes that have been changed since the
+    last save are 'pinned' in memory, so they can't be dropped from the cache before they are written"""
+
+    def __init__(self, store, spans: dict):
+        self.store = store
+        # recipe name -> (start, end) in the file, or None for recipes that have only been added in memory
+        self.spans = spans
+        self.cache = OrderedDict()
+        self.pinned: dict = {}
+
+    def decode(self, name: str):
+        return self.store.decode(self.spans[name])
+
+    def peek(self, name: str):
+        """returns a recipe without adding it to the cache, used when every recipe has to be looked at once"""
+        if name in self.pinned:
+            return self.pinned[name]
+        if name in self.cache:
+            return self.cache[name]
+        return self.decode(name)
+
+    def pin(self, name: str):
+        if name in self.spans:
+            self.pinned[name] = self[name]
+
+    def __getitem__(self, name: str):
+        if name in self.pinned:
+            return self.pinned[name]
+        if name in self.cache:
+            self.cache.move_to_end(name)
+            return self.cache[name]
+
+        recipe = self.decode(name)
+        self.cache[name] = recipe
+        if len(self.cache) > self.store.cache_size:
+            self.cache.popitem(last=False)
+        return recipe
+
+    def __setitem__(self, name: str, recipe: dict):
+        if name not in self.spans:
+            self.spans[name] = None
+        self.cache.pop(name, None)
+        self.pinned[name] = recipe
+
+    def __delitem__(self, name: str):
+        del self.spans[name]
+        self.cache.pop(name, None)
+        self.pinned.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self.spans
+
+    def __iter__(self):
+        return iter(list(self.spans))
+
+    def __len__(self):
+        return len(self.spans)
+
+
+class LazySearchIndex:
+    """the n-gram index needs the ingredients and tags of every recipe, so building it straight away would decode the
+    whole file. instead it's built the first time somebody searches, and changes before then are just ignored
+    (apart from pinning the changed recipe) because the index will see them when it's built"""
+
+    def __init__(self, recipes: LazyRecipes):
+        self.recipes = recipes
+        self.index = None
+
+    def update(self, name: str, recipe: dict):
+        self.recipes.pin(name)
+        if self.index is not None:
+            self.index.update(name, recipe)
+
+    def remove(self, name: str):
+        if self.index is not None:
+            self.index.remove(name)
+
+    def search(self, query: str):
+        if self.index is None:
+            # decoded recipes are thrown away straight after indexing so this doesn't fill up memory
+            self.index = SearchIndex({})
+            for name in self.recipes:
+                self.index.add(name, self.recipes.peek(name))
+        return self.index.search(query)
+
+
+class LazyJsonStore(JsonStore):
+    """reads the same recipes.json file as the json store, but memory maps it and only records where each recipe is
+    instead of decoding all of them at start up. the positions are saved in a recipes.json.offsets file, so as long
+    as recipes.json hasn't changed since, even the scan for positions can be skipped next time"""
+
+    def __init__(self, path: str = 'recipes.json', cache_size: int = 1024):
+        super().__init__(path)
+        self.offsets_path = path + '.offsets'
+        self.cache_size = cache_size
+        self.data = b''
+
+    def map_file(self):
+        """memory maps the recipes file (the mapping stays valid after the file is closed) and returns its stat"""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b''
+        try:
+            with open(self.path, 'rb') as recipes_file:
+                stat = os.fstat(recipes_file.fileno())
+                if stat.st_size > 0:
+                    self.data = mmap.mmap(recipes_file.fileno(), 0, access=mmap.ACCESS_READ)
+                return stat
+        except FileNotFoundError:
+            return None
+
+    def open_file(self):
+        """memory maps the recipes file and returns its recipe positions"""
+        stat = self.map_file()
+        if not self.data:
+            return {}
+
+        # the offsets file is only trusted if it was written for exactly this version of recipes.json
+        try:
+            with open(self.offsets_path, 'r') as offsets_file:
+                saved = json.load(offsets_file)
+            if saved['size'] == stat.st_size and saved['mtime_ns'] == stat.st_mtime_ns:
+                return {name: tuple(span) for name, span in zip(saved['names'], saved['spans'])}
+        except (FileNotFoundError, json.decoder.JSONDecodeError, KeyError):
+            pass
+
+        try:
+            spans = scan_offsets(self.data)
+        except ValueError:
+            # the same as the json store, a file that doesn't load just means starting with no recipes
+            return {}
+        self.save_offsets(spans)
+        return spans
+
+    def save_offsets(self, spans: dict):
+        stat = os.stat(self.path)
+        with open(self.offsets_path, 'w') as offsets_file:
+            json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                       'names': list(spans), 'spans': list(spans.values())}, offsets_file)
+
+    def load(self):
+        return LazyRecipes(self, self.open_file())
+
+    def decode(self, span):
+        start, end = span
+        return json.loads(self.data[start:end])
+
+    def make_index(self, recipes):
+        return LazySearchIndex(recipes)
+
+    def save(self, recipes, changed):
+        """writes a new recipes.json in the same format as json.dump. recipes that haven't been changed are copied
+        straight from the old file as bytes, so only the changed ones need encoding"""
+        spans = {}
+        with atomic_file(self.path, 'wb') as temp:
+            temp.write(b'{')
+            position = 1
+            for n, (name, span) in enumerate(recipes.spans.items()):
+                key = (', ' if n else '').encode() + json.dumps(name).encode() + b': '
+                if name in recipes.pinned or span is None:
+                    body = json.dumps(recipes.pinned[name]).encode()
+                else:
+                    body = self.data[span[0]:span[1]]
+                temp.write(key)
+                temp.write(body)
+                spans[name] = (position + len(key), position + len(key) + len(body))
+                position += len(key) + len(body)
+            temp.write(b'}')
+        self.map_file()
+        self.save_offsets(spans)
+        self.saved(recipes, spans)
+
+    def saved(self, recipes, spans: dict):
+        # the new file has everything in it, so pinned recipes can go back to being normal cached ones
+        recipes.spans = spans
+        recipes.cache.update(recipes.pinned)
+        recipes.pinned.clear()
+        while len(recipes.cache) > self.cache_size:
+            recipes.cache.popitem(last=False)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+class BinaryStore(LazyJsonStore):
+    """keeps the recipes in a binary snapshot file (see the snapshot module) instead of json. like the lazy store the
+    file is memory mapped and each recipe is only decoded when it's used, but the file already has an index of where
+    every recipe is, so nothing needs scanning, and shared strings are only stored once so the file is smaller. saves
+    copy the bytes of unchanged recipes across and only encode the changed ones"""
+
+    def __init__(self, path: str = 'recipes.rcp', cache_size: int = 1024):
+        super().__init__(path, cache_size)
+        self.snapshot = None
+
+    def open_file(self):
+        self.map_file()
+        self.snapshot = None
+        if not self.data:
+            return {}
+        try:
+            self.snapshot = Snapshot(self.data)
+            return self.snapshot.spans()
+        except (ValueError, struct.error):
+            # the same as the json store, a file that doesn't load just means starting with no recipes
+            self.snapshot = None
+            return {}
+
+    def decode(self, span):
+        return self.snapshot.decode(span[0])
+
+    def save(self, recipes, changed):
+        writer = SnapshotWriter(self.snapshot)
+        bodies = ((name, writer.encode(recipes.pinned[name]) if name in recipes.pinned or span is None
+                   else self.data[span[0]:span[1]]) for name, span in recipes.spans.items())
+        with atomic_file(self.path, 'wb') as temp:
+            spans = writer.write(temp, bodies)
+        self.map_file()
+        self.snapshot = Snapshot(self.data)
+        self.saved(recipes, spans)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    author TEXT,
+    rating INTEGER,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS ingredients (
+    recipe_id INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    ingredient TEXT NOT NULL,
+    quantity TEXT,
+    PRIMARY KEY (recipe_id, position)
+);
+CREATE INDEX IF NOT EXISTS ingredients_by_name ON ingredients(ingredient);
+CREATE TABLE IF NOT EXISTS tags (
+    recipe_id INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (recipe_id, position)
+);
+CREATE INDEX IF NOT EXISTS tags_by_name ON tags(tag);
+CREATE TABLE IF NOT EXISTS instructions (
+    recipe_id INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    instruction TEXT NOT NULL,
+    PRIMARY KEY (recipe_id, position)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS recipe_search USING fts5(title, ingredients, tags, tokenize='trigram');
+"""
+
+
+class SQLiteRecipes(MutableMapping):
+    """looks like the recipes dictionary to the Recipes class, but only the names live in the database until a recipe
+    is actually used. recipes that have been loaded are kept until the next save, because the edit methods change them
+    in place and only tell the store afterwards (through Recipes.touch). nothing is written to the database until the
+    save, added, changed and deleted recipes wait in store.pending and are looked at before the database is"""
+
+    def __init__(self, store):
+        self.store = store
+        self.loaded: dict = {}
+
+    def __getitem__(self, name: str):
+        if name in self.store.pending:
+            recipe = self.store.pending[name]
+            if recipe is None:
+                raise KeyError(name)
+            return recipe
+        if name not in self.loaded:
+            self.loaded[name] = self.store.read_recipe(name)
+        return self.loaded[name]
+
+    def __setitem__(self, name: str, recipe: dict):
+        self.store.pending[name] = recipe
+        self.loaded[name] = recipe
+
+    def __delitem__(self, name: str):
+        if name not in self:
+            raise KeyError(name)
+        self.store.pending[name] = None
+        self.loaded.pop(name, None)
+
+    def __contains__(self, name):
+        if name in self.store.pending:
+            return self.store.pending[name] is not None
+        return name in self.loaded or self.store.recipe_id(name) is not None
+
+    def __iter__(self):
+        # the names are fetched all at once so the dictionary can be changed while looping over it
+        pending = self.store.pending
+        names = [row[0] for row in self.store.connection.execute("SELECT name FROM recipes ORDER BY id")
+                 if pending.get(row[0], True) is not None]
+        return iter(names + self.store.new_names())
+
+    def __len__(self):
+        count = self.store.connection.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+        for name, recipe in self.store.pending.items():
+            in_database = self.store.recipe_id(name) is not None
+            count += (recipe is not None) - in_database
+        return count
+
+
+class SQLiteStore:
+    """keeps the recipes in normalised sqlite tables with indexes on names, ingredients and tags, and a trigram full
+    text index for substring searches. changes are kept in memory until save_recipes, which writes them all in one
+    short transaction, so other programs using the same database are only locked out while a save is being written.
+    details the tables don't have room for (unknown ones, or the usual ones with an unusual type such as a rating of
+    "4") are kept as json in the extra column, so copying recipes.json into a database and back gives the same
+    recipes"""
+
+    def __init__(self, path: str = 'recipes.db'):
+        self.path = path
+        # the catalogue manager (see the tenants module) uses a store from whichever thread is running a query, but
+        # only from one thread at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        # databases made before the extra column was added get it now
+        if 'extra' not in [row[1] for row in self.connection.execute("PRAGMA table_info(recipes)")]:
+            self.connection.execute("ALTER TABLE recipes ADD COLUMN extra TEXT")
+            self.connection.commit()
+        # recipe name -> the recipe, or None if it's been deleted, for every change since the last save
+        self.pending: dict = {}
+
+    def load(self):
+        return SQLiteRecipes(self)
+
+    def make_index(self, recipes):
+        # the database is its own search index
+        return self
+
+    def recipe_id(self, name: str):
+        row = self.connection.execute("SELECT id FROM recipes WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def new_names(self):
+        """the names of unsaved recipes that aren't in the database yet, in the order they were added"""
+        return [name for name, recipe in self.pending.items() if recipe is not None and self.recipe_id(name) is None]
+
+    def read_recipe(self, name: str):
+        row = self.connection.execute("SELECT id, author, rating, extra FROM recipes WHERE name = ?",
+                                      (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        recipe_id, author, rating, extra = row
+        recipe = {
+            'ingredients': dict(self.connection.execute(
+                "SELECT ingredient, quantity FROM ingredients WHERE recipe_id = ? ORDER BY position", (recipe_id,))),
+            'instructions': [inst for (inst,) in self.connection.execute(
+                "SELECT instruction FROM instructions WHERE recipe_id = ? ORDER BY position", (recipe_id,))],
+            'tags': [tag for (tag,) in self.connection.execute(
+                "SELECT tag FROM tags WHERE recipe_id = ? ORDER BY position", (recipe_id,))],
+        }
+        # recipes.json files don't always have an author or a rating, so they're only added if there is one
+        if author is not None:
+            recipe['author'] = author
+        if rating is not None:
+            recipe['rating'] = rating
+        if extra is not None:
+            extra = json.loads(extra)
+            for field in extra.get('absent', []):
+                del recipe[field]
+            recipe.update(extra.get('details', {}))
+        return recipe
+
+    @staticmethod
+    def split_recipe(recipe: dict):
+        """returns (the details that go in the tables, the extra column). anything that isn't one of the usual details
+        with the usual type goes in the extra column as it is, along with the lists that are missing altogether so
+        they aren't read back as empty ones"""
+        # both import this module, so they can't be imported at the top
+        from recipes_class import RECIPE_FIELDS
+        from validate import check_detail
+        stored, details = {}, {}
+        for field, value in recipe.items():
+            if field in RECIPE_FIELDS and check_detail(field, value)[0] is None:
+                stored[field] = value
+            else:
+                details[field] = value
+        absent = [field for field in ('ingredients', 'instructions', 'tags') if field not in recipe]
+        extra = {'details': details, 'absent': absent} if details or absent else None
+        return stored, None if extra is None else json.dumps(extra)
+
+    def write_recipe(self, name: str, recipe: dict):
+        """inserts a new recipe at the end, or rewrites an existing one without changing its place in the order"""
+        stored, extra = self.split_recipe(recipe)
+        row = (stored.get('author'), stored.get('rating'), extra)
+        recipe_id = self.recipe_id(name)
+        if recipe_id is None:
+            recipe_id = self.connection.execute(
+                "INSERT INTO recipes (name, author, rating, extra) VALUES (?, ?, ?, ?)", (name, *row)).lastrowid
+        else:
+            self.connection.execute("UPDATE recipes SET author = ?, rating = ?, extra = ? WHERE id = ?",
+                                    (*row, recipe_id))
+            for table in ('ingredients', 'tags', 'instructions'):
+                self.connection.execute(f"DELETE FROM {table} WHERE recipe_id = ?", (recipe_id,))
+            self.connection.execute("DELETE FROM recipe_search WHERE rowid = ?", (recipe_id,))
+
+        self.connection.executemany(
+            "INSERT INTO ingredients (recipe_id, position, ingredient, quantity) VALUES (?, ?, ?, ?)",
+            [(recipe_id, n, k, v) for n, (k, v) in enumerate(stored.get('ingredients', {}).items())])
+        self.connection.executemany(
+            "INSERT INTO tags (recipe_id, position, tag) VALUES (?, ?, ?)",
+            [(recipe_id, n, tag) for n, tag in enumerate(stored.get('tags', []))])
+        self.connection.executemany(
+            "INSERT INTO instructions (recipe_id, position, instruction) VALUES (?, ?, ?)",
+            [(recipe_id, n, inst) for n, inst in enumerate(stored.get('instructions', []))])
+        self.connection.execute("INSERT INTO recipe_search (rowid, title, ingredients, tags) VALUES (?, ?, ?, ?)",
+                                (recipe_id, *SearchIndex.searchable_fields(name, stored)))
+
+    def delete_recipe(self, name: str):
+        """returns False if there was no recipe with that name"""
+        recipe_id = self.recipe_id(name)
+        if recipe_id is None:
+            return False
+        self.connection.execute("DELETE FROM recipe_search WHERE rowid = ?", (recipe_id,))
+        self.connection.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
+        return True
+
+    # Recipes.touch and search_recipes call these as if this was a SearchIndex
+
+    def update(self, name: str, recipe: dict):
+        # the edit methods change recipes in place, so this is how the store hears about it
+        self.pending[name] = recipe
+
+    def remove(self, name: str):
+        self.pending[name] = None
+
+    def search(self, query: str):
+        """the same case-insensitive substring search as SearchIndex, queries of 3 or more characters use the
+        trigram index and shorter ones have to check every row. unsaved recipes are checked one by one"""
+        query = query.lower()
+        if len(query) >= 3:
+            rows = self.connection.execute(
+                "SELECT r.id, r.name, s.title, s.ingredients, s.tags FROM recipe_search s "
+                "JOIN recipes r ON r.id = s.rowid WHERE recipe_search MATCH ? ORDER BY r.id",
+                ('"' + query.replace('"', '""') + '"',))
+        else:
+            rows = self.connection.execute(
+                "SELECT r.id, r.name, s.title, s.ingredients, s.tags FROM recipe_search s "
+                "JOIN recipes r ON r.id = s.rowid ORDER BY r.id")
+        # the trigram tokenizer folds case slightly differently to str.lower, so the stored lower case fields are
+        # checked again to give exactly the same results as the json stores
+        found = [(recipe_id, name) for recipe_id, name, *fields in rows
+                 if name not in self.pending and any(query in field for field in fields)]
+        if not self.pending:
+            return [name for _, name in found]
+
+        # changed recipes keep their place in the order and new ones go on the end, like they will when they're saved
+        end = float('inf')
+        for name, recipe in self.pending.items():
+            if recipe is not None and any(query in field for field in SearchIndex.searchable_fields(name, recipe)):
+                recipe_id = self.recipe_id(name)
+                found.append((end if recipe_id is None else recipe_id, name))
+        return [name for _, name in sorted(found, key=lambda item: item[0])]
+
+    def poll(self, recipes, changed):
+        """nothing is held open between saves, so other programs' saves are seen as soon as their recipes are next
+        read. like the json store, whichever program saves a recipe last wins"""
+        return []
+
+    def save(self, recipes, changed):
+        """writes every unsaved change in one transaction"""
+        with self.connection:
+            for name, recipe in self.pending.items():
+                if recipe is None:
+                    self.delete_recipe(name)
+                else:
+                    self.write_recipe(name, recipe)
+        self.pending.clear()
+        recipes.loaded.clear()
+
+    def close(self):
+        # anything that wasn't saved is lost, just like unsaved changes in the json file are lost on exit
+        self.pending.clear()
+        self.connection.close()
+
+
+def make_store(kind: str = 'json', path: str = None):
+    """returns the store for a storage mode name, used to pick the mode from outside the program"""
+    if kind == 'json':
+        path = path or 'recipes.json'
+        return JsonStore(path, cache_path=path + '.cache')
+    if kind == 'journal':
+        return JournalStore(path or 'recipes.json')
+    if kind == 'lazy':
+        return LazyJsonStore(path or 'recipes.json')
+    if kind == 'compact':
+        return CompactStore(path or 'recipes.json')
+    if kind == 'shared':
+        return SharedStore(path or 'recipes.json')
+    if kind == 'sqlite':
+        return SQLiteStore(path or 'recipes.db')
+    if kind == 'binary':
+        return BinaryStore(path or 'recipes.rcp')
+    raise ValueError(f"Unknown storage mode: {kind}")
+
+
+def store_for_path(path: str):
+    """guesses the storage mode from the file extension, for commands that take a file name"""
+    if path.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SQLiteStore(path)
+    if path.endswith('.rcp'):
+        return BinaryStore(path)
+    return JsonStore(path)
+
+
+def migrate(source, target):
+    """copies every recipe from one store into another in a single save, keeping the same order. recipes that are
+    already in the target with the same name are replaced"""
+    recipes = target.load()
+    changed = {}
+    for name, recipe in source.load().items():
+        recipes[name] = recipe
+        changed[name] = None
+    target.save(recipes, changed)
+    return len(changed)
@@ -0,0 +1,271 @@
+"""keeps a separate catalogue for every user, each one its own Recipes object and recipes file in a directory (e.g.
+users/ross.json), plus an optional public catalogue everyone can read but nobody can change. catalogues are only loaded
+when they're used, and once more than max_open are loaded the ones used least recently are saved and closed. queries
+across several catalogues run on a thread pool, one catalogue per task. e.g.
+
+    manager = CatalogueManager('users', public='recipes.json', size_limit=5_000_000)
+    with manager.catalogue('ross') as recipes:
+        recipes.add('Toast', {'ingredients': {'bread': '2 slices'}})
+        recipes.save_recipes()
+    manager.search_all('toast')     # {'ross': ['Toast'], 'public': [...]}
+    manager.close()
+"""
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from history import invert
+from recipes_class import Recipes, copy_recipe
+from storage import make_store
+
+# the file extension each storage mode uses for a catalogue
+EXTENSIONS = {'json': '.json', 'journal': '.json', 'lazy': '.json', 'compact': '.json', 'binary': '.rcp',
+              'sqlite': '.db'}
+# user names become file names, so they're kept to letters, numbers and a few separators
+USER_NAME = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.-]{0,63}')
+PUBLIC = 'public'
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaError(ValueError):
+    """raised for a change that would take a catalogue over its size limit"""
+
+
+def recipe_size(name: str, recipe):
+    """roughly how many bytes a recipe takes up, as the length of its json in recipes.json"""
+    return len(json.dumps(name)) + len(json.dumps(copy_recipe(recipe))) + 4
+
+
+class TenantRecipes(Recipes):
+    """one user's recipes. changes that would make them bigger than limit bytes (measured as json, see recipe_size)
+    raise QuotaError and aren't made, and a read only catalogue can't be changed at all"""
+
+    def __init__(self, store, limit: int = None, read_only: bool = False, **kwargs):
+        super().__init__(store, **kwargs)
+        self.limit = limit
+        self.read_only = read_only
+        # how big the recipes are, None until a change first needs to check it against the limit. working it out means
+        # going through every recipe, which would undo the point of the lazy and binary stores if it was done on loading
+        self._size = None
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = sum(recipe_size(name, recipe) for name, recipe in self.recipes.items())
+        return self._size
+
+    def size_of(self, name: str):
+        return recipe_size(name, self.recipes[name]) if name in self.recipes else 0
+
+    def apply_delta(self, delta: list):
+        if self.read_only:
+            raise ValueError("This catalogue is read only.")
+        names = (delta[1], delta[2]) if delta[0] == 'rename' else (delta[1],)
+        before = sum(self.size_of(name) for name in names)
+        super().apply_delta(delta)
+        growth = sum(self.size_of(name) for name in names) - before
+        if self._size is not None:
+            self._size += growth
+        # size is worked out after the change if it hasn't been yet, so it already includes the growth
+        if self.limit is not None and growth > 0 and self.size > self.limit:
+            # put it back the way it was, which always makes it smaller again
+            if delta[0] == 'add':
+                delta = ['add', delta[1], copy_recipe(self.recipes[delta[1]])]
+            super().apply_delta(invert(delta))
+            self._size -= growth
+            raise QuotaError(f"That would take the recipes over their limit of {self.limit} bytes.")
+
+    def undo_deltas(self, deltas: list):
+        # putting changes back is never refused, it only takes the recipes back to a size they've already been
+        limit, self.limit = self.limit, None
+        try:
+            return super().undo_deltas(deltas)
+        finally:
+            self.limit = limit
+
+
+class Shard:
+    """a user's catalogue and what the manager needs to know about it. recipes is None until it's loaded"""
+
+    def __init__(self, user: str):
+        self.user = user
+        self.recipes = None
+        # held while the catalogue is being used, so one user's catalogue is only used by one thread at a time
+        self.lock = threading.Lock()
+        # how many callers are using it or waiting to, a catalogue in use is never closed
+        self.users = 0
+        self.last_used = 0.0
+
+
+class CatalogueManager:
+    def __init__(self, directory: str = 'users', storage: str = 'json', max_open: int = 16,
+                 size_limit: int = None, public: str = None, workers: int = 4):
+        if storage == 'shared':
+            raise ValueError("The shared storage mode is for several programs using one recipes file, it can't be "
+                             "used for users' catalogues.")
+        if storage not in EXTENSIONS:
+            raise ValueError(f"Unknown storage mode for catalogues: {storage}")
+        self.directory = directory
+        self.storage = storage
+        self.max_open = max_open
+        # the most bytes each user's recipes can take up when written as json (see recipe_size), None for no limit.
+        # it's the size of their file rather than how much memory they use, which depends on the storage mode
+        self.size_limit = size_limit
+        self.workers = workers
+        os.makedirs(directory, exist_ok=True)
+
+        # user -> Shard, least recently used first
+        self.shards: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+        # the public catalogue is loaded straight away and never closed, it's read by everyone
+        self.public = None
+        if public is not None:
+            self.public = TenantRecipes(make_store(storage, public), read_only=True)
+
+    def path_for(self, user: str):
+        if not USER_NAME.fullmatch(user) or user == PUBLIC:
+            raise ValueError(f"Invalid user name: {user!r}")
+        return os.path.join(self.directory, user + EXTENSIONS[self.storage])
+
+    def users(self):
+        """every user with a catalogue file, whether it's loaded or not"""
+        # the journal store doesn't write the recipes file itself until its journal is first compacted
+        endings = (EXTENSIONS[self.storage], EXTENSIONS[self.storage] + '.journal')
+        users = set()
+        for entry in os.listdir(self.directory):
+            for ending in endings:
+                if entry.endswith(ending) and USER_NAME.fullmatch(entry[:-len(ending)]):
+                    users.add(entry[:-len(ending)])
+        return sorted(users)
+
+    def load(self, user: str):
+        path = self.path_for(user)
+        return TenantRecipes(make_store(self.storage, path), limit=self.size_limit, history_path=path + '.history')
+
+    @contextmanager
+    def catalogue(self, user: str):
+        """gives the user's recipes, loading them if they aren't already. nothing else uses them until the with block
+        ends, and anything changed should be saved in it (anything that isn't is saved when they're closed)"""
+        self.path_for(user)
+        with self.lock:
+            shard = self.shards.get(user)
+            if shard is None:
+                shard = self.shards[user] = Shard(user)
+            self.shards.move_to_end(user)
+            shard.users += 1
+        try:
+            with shard.lock:
+                if shard.recipes is None:
+                    shard.recipes = self.load(user)
+                shard.last_used = time.monotonic()
+                yield shard.recipes
+        finally:
+            with self.lock:
+                shard.users -= 1
+            try:
+                self.evict()
+            except Exception:
+                # a catalogue that couldn't be saved stays loaded and is tried again next time, and an error from the
+                # with block shouldn't be hidden by it
+                logger.exception("Couldn't close a catalogue")
+
+    def close_shard(self, shard: Shard):
+        """saves and closes a catalogue. the caller holds the manager's lock and the shard's"""
+        if shard.recipes is not None:
+            shard.recipes.save_recipes()
+            shard.recipes.store.close()
+            shard.recipes = None
+        del self.shards[shard.user]
+
+    def evict(self, idle: float = None):
+        """closes the least recently used catalogues until no more than max_open are loaded, and with idle, any that
+        haven't been used for that many seconds too. catalogues that are in use are left alone"""
+        now = time.monotonic()
+        with self.lock:
+            loaded = sum(1 for shard in self.shards.values() if shard.recipes is not None)
+            for shard in list(self.shards.values()):
+                too_many = loaded > self.max_open
+                too_old = idle is not None and now - shard.last_used >= idle
+                if not (too_many or too_old):
+                    continue
+                # another thread might be about to use it, in which case it stays
+                if shard.users or not shard.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if shard.recipes is not None:
+                        loaded -= 1
+                    self.close_shard(shard)
+                finally:
+                    shard.lock.release()
+
+    def loaded(self):
+        """the users whose catalogues are loaded, least recently used first"""
+        with self.lock:
+            return [user for user, shard in self.shards.items() if shard.recipes is not None]
+
+    def aggregate(self, function, users: list = None, include_public: bool = False):
+        """runs function(user, recipes) for every user's catalogue (or just users) on the thread pool, and returns
+        {user: result}. with include_public, the public catalogue is included as 'public'"""
+        users = self.users() if users is None else users
+
+        def run(user):
+            with self.catalogue(user) as recipes:
+                return function(user, recipes)
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            results = dict(zip(users, pool.map(run, users)))
+        if include_public and self.public is not None:
+            results[PUBLIC] = function(PUBLIC, self.public)
+        return results
+
+    def search_all(self, query: str, users: list = None, include_public: bool = True):
+        """{user: names of their recipes matching the query}, like search, for every user with a match"""
+        results = self.aggregate(lambda user, recipes: recipes.search(query), users, include_public)
+        return {user: names for user, names in results.items() if names}
+
+    def best_matches(self, query: str, k: int = 10, users: list = None, include_public: bool = True):
+        """the k best (user, name, score) matches for the query across every catalogue, best first, like
+        ranked_search"""
+        results = self.aggregate(lambda user, recipes: recipes.ranked_search(query, k), users, include_public)
+        matches = ((user, name, score) for user, found in results.items() for name, score in found)
+        return heapq.nlargest(k, matches, key=lambda match: match[2])
+
+    def summary(self, users: list = None, include_public: bool = True):
+        """how many recipes each user has, their average rating and the most used tags across every catalogue"""
+        def count(user, recipes):
+            ratings = [recipe['rating'] for recipe in recipes.recipes.values() if 'rating' in recipe]
+            tags = Counter(tag for recipe in recipes.recipes.values() for tag in recipe.get('tags', []))
+            return len(recipes.recipes), sum(ratings) / len(ratings) if ratings else None, tags
+
+        results = self.aggregate(count, users, include_public)
+        tags = sum((counted[2] for counted in results.values()), Counter())
+        return {'recipes': {user: counted[0] for user, counted in results.items()},
+                'average_rating': {user: counted[1] for user, counted in results.items()},
+                'top_tags': tags.most_common(10)}
+
+    def copy_public(self, user: str, name: str, new_name: str = None):
+        """copies a recipe from the public catalogue into the user's, and saves it"""
+        if self.public is None:
+            raise KeyError(name)
+        recipe = copy_recipe(self.public.recipes[name])
+        with self.catalogue(user) as recipes:
+            recipes.add(new_name or name, recipe)
+            recipes.save_recipes()
+
+    def close(self):
+        """saves and closes every catalogue"""
+        with self.lock:
+            for shard in list(self.shards.values()):
+                with shard.lock:
+                    self.close_shard(shard)
+        if self.public is not None:
+            self.public.store.close()
@@ -0,0 +1,68 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmark import generate_catalogue, main, measure
+from recipes_class import Recipes
+from storage import JsonStore
+
+
+class BenchmarkTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_catalogue(self):
+        catalogue = generate_catalogue(500)
+        self.assertEqual(len(catalogue), 500)
+        self.assertEqual(catalogue, generate_catalogue(500))
+        self.assertNotEqual(catalogue, generate_catalogue(500, seed=1))
+        # the recipes are the same shape as the menus make, so they pass the same checks
+        path = os.path.join(self.directory, 'recipes.json')
+        with open(path, 'w') as recipes_file:
+            json.dump({}, recipes_file)
+        recipes = Recipes(JsonStore(path))
+        for name, recipe in catalogue.items():
+            recipes.add(name, recipe)
+        self.assertEqual(len({name.lower() for name in catalogue}), 500)
+
+    def test_measure(self):
+        calls = []
+        result = measure(lambda: calls.append(1) or [0] * 10000, repeat=3)
+        # the run with tracemalloc on isn't timed
+        self.assertEqual(len(calls), 4)
+        self.assertLessEqual(result['best_s'], result['mean_s'])
+        self.assertGreater(result['retained_bytes'], 10000 * 8 - 1)
+        self.assertGreaterEqual(result['peak_bytes'], result['retained_bytes'])
+
+    def test_run_and_compare(self):
+        before = os.path.join(self.directory, 'before.json')
+        after = os.path.join(self.directory, 'after.json')
+        arguments = ['--sizes', '50', '--storage', 'json', 'compact', '--repeat', '1', '--operations', '3']
+        with contextlib.redirect_stdout(io.StringIO()):
+            main(arguments + ['--output', before])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main(arguments + ['--output', after, '--compare', before])
+
+        with open(after) as results_file:
+            results = json.load(results_file)
+        self.assertEqual([(result['size'], result['storage']) for result in results['results']],
+                         [(50, 'json'), (50, 'compact')])
+        for operation in ('load', 'search', 'find_valid_name', 'edit_cycle', 'save_recipes', 'cold_start',
+                          'warm_start'):
+            self.assertGreater(results['results'][0][operation]['mean_s'], 0)
+        self.assertEqual(results['catalogue_memory'][0]['size'], 50)
+        self.assertIn('python', results['environment'])
+        # one ratio line for each operation of each catalogue
+        self.assertEqual(output.getvalue().count('x\n'), 14)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from bulk import export_recipes, free_name, import_recipes
+from recipes_class import Recipes
+from storage import JsonStore
+
+AWKWARD = {
+    'Porridge': {'ingredients': {'oats': '100g', 'milk': '250ml'}, 'instructions': ['Boil the milk', 'Stir in oats'],
+                 'tags': ['breakfast', 'vegan'], 'author': 'Ross', 'rating': 4},
+    # every detail here is something the simple csv format can't hold, or would read back differently
+    'Brackets': {'ingredients': {'salt: coarse': 'a pinch; or two', 'flour': '200g'},
+                 'instructions': ['[Step] mix', '{then} bake\nfor an hour', ' rest '],
+                 'tags': ['a, b', '[c]'], 'author': '"Ross"', 'rating': 5},
+    'Author in brackets': {'ingredients': {}, 'instructions': ['{just this}'], 'tags': [], 'author': '[Ross]'},
+    'Empty': {'ingredients': {}, 'instructions': [], 'tags': [], 'author': ''},
+}
+
+
+class BulkTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def recipes(self, name: str, contents: dict):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as recipes_file:
+            json.dump(contents, recipes_file)
+        return Recipes(JsonStore(path))
+
+    def round_trip(self, file_format: str):
+        path = os.path.join(self.directory, 'dump.' + file_format)
+        with open(path, 'w', newline='', encoding='utf-8') as dump_file:
+            dump_file.writelines(export_recipes(AWKWARD, file_format))
+        recipes = self.recipes('empty.json', {})
+        report = import_recipes(recipes, path, workers=1, chunk_size=2)
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(report['added'], len(AWKWARD))
+        return recipes.recipes
+
+    def test_round_trips(self):
+        for file_format in ('json', 'jsonl', 'csv'):
+            with self.subTest(file_format=file_format):
+                self.assertEqual({name: dict(recipe) for name, recipe in self.round_trip(file_format).items()},
+                                 AWKWARD)
+
+    def test_name_clashes(self):
+        recipes = self.recipes('recipes.json', {'Toast': AWKWARD['Empty']})
+        path = os.path.join(self.directory, 'dump.jsonl')
+        with open(path, 'w') as dump_file:
+            for n in range(5):
+                dump_file.write(json.dumps({'name': 'toast' if n % 2 else 'Toast', 'recipe': {'author': str(n)}}) + '\n')
+        report = import_recipes(recipes, path, workers=1)
+        self.assertEqual(report['renamed'], 5)
+        self.assertEqual(sorted(recipes.recipes), ['Toast', 'Toast (2)', 'Toast (4)', 'Toast (6)', 'toast (3)',
+                                                   'toast (5)'])
+        self.assertEqual(recipes.recipes['Toast (6)']['author'], '4')
+
+    def test_free_name_counter(self):
+        recipes = self.recipes('recipes.json', {'Toast': AWKWARD['Empty'], 'Toast (3)': AWKWARD['Empty']})
+        counters = {}
+        self.assertEqual(free_name(recipes, 'Toast', counters), 'Toast (2)')
+        self.assertEqual(counters, {'toast': 3})
+        # (2) isn't added here, but the counter still starts after it
+        self.assertEqual(free_name(recipes, 'Toast', counters), 'Toast (4)')
+        self.assertEqual(free_name(recipes, 'Toast'), 'Toast (2)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmark import generate_catalogue
+from compact import CompactCatalogue
+from recipes_class import Recipes
+from storage import CompactStore
+
+# recipes the arrays can't hold directly, or that are missing details
+ODD = {
+    'No rating': {'ingredients': {'bread': '2 slices'}, 'instructions': [], 'tags': ['bread'], 'author': ''},
+    'Big rating': {'ingredients': {}, 'instructions': ['wait'], 'tags': [], 'author': 'Ross', 'rating': 500},
+    'Half rating': {'ingredients': {}, 'instructions': [], 'tags': [], 'author': 'Ross', 'rating': 3.5},
+    'Bare': {},
+    'Extra': {'tags': ['dinner', 'dinner'], 'author': 'Ross', 'serves': 4},
+}
+
+
+class CompactTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        self.catalogue = dict(generate_catalogue(100), **ODD)
+        with open(self.path, 'w') as recipes_file:
+            json.dump(self.catalogue, recipes_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        compact = CompactCatalogue(self.catalogue)
+        self.assertEqual(list(compact), list(self.catalogue))
+        self.assertEqual({name: recipe.to_dict() for name, recipe in compact.items()}, self.catalogue)
+        for name, recipe in self.catalogue.items():
+            self.assertEqual(list(compact[name]), list(recipe))
+        # every different string is only kept once
+        self.assertEqual(len(compact.tags.strings), len({tag for recipe in self.catalogue.values()
+                                                         for tag in recipe.get('tags', [])}))
+
+    def test_store_round_trip(self):
+        recipes = Recipes(CompactStore(self.path))
+        self.assertIsInstance(recipes.recipes, CompactCatalogue)
+        recipes.save_recipes()
+        with open(self.path) as recipes_file:
+            self.assertEqual(json.load(recipes_file), self.catalogue)
+
+        # changes made through the views are the same as changes to the dictionaries
+        name = next(iter(self.catalogue))
+        recipes.update(name, {'rating': 1, 'tags': ['dinner']})
+        recipes.set_ingredient(name, 'salt', '1 pinch')
+        recipes.set_ingredient(name, next(iter(self.catalogue[name]['ingredients'])))
+        recipes.rename('Extra', 'Extra 2')
+        recipes.delete('Half rating')
+        recipes.add('Jam', {'rating': 4})
+        recipes.save_recipes()
+        expected = {name: recipe.to_dict() for name, recipe in recipes.recipes.items()}
+        self.assertEqual(expected['Extra 2'], ODD['Extra'])
+        self.assertNotIn('Half rating', expected)
+        self.assertEqual(expected[name]['ingredients']['salt'], '1 pinch')
+        with open(self.path) as recipes_file:
+            self.assertEqual(json.load(recipes_file), expected)
+        again = Recipes(CompactStore(self.path))
+        self.assertEqual({name: recipe.to_dict() for name, recipe in again.recipes.items()}, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import operator
+import os
+import shlex
+import shutil
+import tempfile
+import unittest
+
+from benchmark import generate_catalogue
+from filter_index import is_filter_query
+from recipes_class import Recipes
+from storage import JsonStore
+
+QUERIES = ['tag:dinner', 'TAG:Dinner', '-tag:dinner', 'rating>=4', 'rating<2', 'rating=3', 'rating>5',
+           'ingredient:"chia seeds"', 'author:"author 1"', 'tag:vegan -ingredient:butter rating>=3',
+           'tag:"batch cook" ingredient:rice', 'curry tag:dinner', 'tag:nothing', '-tag:nothing', 'potatoes rating<=2',
+           'tag:vegan tag:spicy -author:"Author 2"']
+COMPARISONS = {'>=': operator.ge, '<=': operator.le, '>': operator.gt, '<': operator.lt, '=': operator.eq}
+
+
+def matches(name: str, recipe: dict, query: str):
+    """checks one recipe against a filter query the slow way, looking inside it"""
+    for word in shlex.split(query):
+        negate = word.startswith('-')
+        field, _, value = word.lstrip('-').partition(':')
+        value = value.lower()
+        if field.lower() == 'tag':
+            found = value in [tag.lower() for tag in recipe['tags']]
+        elif field.lower() == 'ingredient':
+            found = value in [ingredient.lower() for ingredient in recipe['ingredients']]
+        elif field.lower() == 'author':
+            found = value == recipe['author'].lower()
+        elif word.startswith('rating'):
+            comparison = word[6:8] if word[7] == '=' else word[6]
+            found = 'rating' in recipe and COMPARISONS[comparison](recipe['rating'], int(word[6 + len(comparison):]))
+        else:
+            word = word.lower()
+            found = (word in name.lower() or word in ' '.join(recipe['ingredients']).lower()
+                     or word in ' '.join(recipe['tags']).lower())
+        if found == negate:
+            return False
+    return True
+
+
+class FilterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        with open(self.path, 'w') as recipes_file:
+            json.dump(generate_catalogue(300), recipes_file)
+        self.recipes = Recipes(JsonStore(self.path))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertMatchesScan(self):
+        for query in QUERIES:
+            with self.subTest(query=query):
+                expected = [name for name, recipe in self.recipes.recipes.items() if matches(name, recipe, query)]
+                self.assertEqual(self.recipes.filter(query), expected)
+
+    def test_filters_match_a_scan(self):
+        self.assertMatchesScan()
+        # some queries should actually find something, or the comparison above doesn't say much
+        self.assertTrue(self.recipes.filter('tag:vegan -ingredient:butter rating>=3'))
+        self.assertTrue(self.recipes.filter('ingredient:"chia seeds"'))
+
+    def test_kept_up_to_date(self):
+        self.recipes.filter('tag:dinner')
+        names = list(self.recipes.recipes)
+        self.recipes.update(names[0], {'tags': ['dinner', 'vegan'], 'rating': 5, 'ingredients': {'rice': '1 cup'}})
+        self.recipes.update(names[1], {'author': 'Author 1'})
+        self.recipes.rename(names[2], 'Vegan Curry')
+        self.recipes.delete(names[3])
+        self.recipes.add('Toast', {'tags': ['Dinner'], 'author': 'Ross'})
+        self.recipes.set_ingredient(names[4], 'butter', '50g')
+        self.assertIn('Toast', self.recipes.filter('tag:dinner author:ross'))
+        self.assertMatchesScan()
+        # a recipe keeps its place when it's changed, so results stay in recipe order
+        self.assertEqual(self.recipes.filter('tag:dinner tag:vegan rating=5 ingredient:rice')[0], names[0])
+
+    def test_queries(self):
+        self.assertTrue(is_filter_query('curry rating>=4'))
+        self.assertTrue(is_filter_query('-ingredient:butter'))
+        self.assertFalse(is_filter_query('chickpea curry'))
+        self.assertFalse(is_filter_query('rating'))
+        with self.assertRaises(ValueError):
+            self.recipes.filter('tag:"batch cook')
+
+
+if __name__ == '__main__':
+    unittest.main()
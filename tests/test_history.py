@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from history import apply_to_recipe
+from recipes_class import Recipes
+from storage import JsonStore, SharedStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        shutil.copy(os.path.join(ROOT, 'recipes.json'), self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_undo_and_redo(self):
+        recipes = Recipes(JsonStore(self.path))
+        old_rating = recipes.recipes['Roast Potatoes'].get('rating')
+        recipes.update('Roast Potatoes', {'rating': 2})
+        recipes.insert_item('Roast Potatoes', 'tags', 0, 'side')
+        recipes.undo()
+        recipes.undo()
+        self.assertEqual(recipes.recipes['Roast Potatoes'].get('rating'), old_rating)
+        self.assertNotIn('side', recipes.recipes['Roast Potatoes']['tags'])
+        recipes.redo()
+        self.assertEqual(recipes.recipes['Roast Potatoes']['rating'], 2)
+
+    def test_set_checks_the_old_value(self):
+        recipe = {'rating': 3, 'tags': ['a']}
+        with self.assertRaises(ValueError):
+            apply_to_recipe(recipe, ['set', 'Toast', 'rating', 5, 1])
+        with self.assertRaises(ValueError):
+            apply_to_recipe(recipe, ['insert', 'Toast', 'tags', 3, 'b'])
+        self.assertEqual(recipe, {'rating': 3, 'tags': ['a']})
+
+    def test_undo_doesnt_overwrite_another_programs_change(self):
+        first = Recipes(SharedStore(self.path))
+        second = Recipes(SharedStore(self.path))
+        first.update('Roast Potatoes', {'rating': 5})
+        first.save_recipes()
+
+        second.refresh()
+        second.update('Roast Potatoes', {'rating': 1})
+        second.save_recipes()
+
+        first.refresh()
+        with self.assertRaises(ValueError):
+            first.undo()
+        first.save_recipes()
+        self.assertEqual(first.recipes['Roast Potatoes']['rating'], 1)
+        self.assertEqual(Recipes(SharedStore(self.path)).recipes['Roast Potatoes']['rating'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
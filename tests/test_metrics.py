@@ -0,0 +1,39 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from metrics import Metrics
+from recipes_class import Recipes
+from storage import JsonStore, SQLiteStore, migrate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_dump_after_the_store_is_closed(self):
+        path = os.path.join(self.directory, 'recipes.db')
+        migrate(JsonStore(os.path.join(ROOT, 'recipes.json')), SQLiteStore(path))
+
+        class WatchedRecipes(Recipes):
+            pass
+
+        metrics = Metrics(os.path.join(self.directory, 'metrics.json'))
+        metrics.instrument(WatchedRecipes)
+        recipes = WatchedRecipes(SQLiteStore(path))
+        count = len(recipes.recipes)
+        recipes.store.close()
+        metrics.dump()
+        with open(metrics.path) as metrics_file:
+            self.assertEqual(json.load(metrics_file)['gauges']['recipes.count'], count)
+
+
+if __name__ == '__main__':
+    unittest.main()
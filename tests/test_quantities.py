@@ -0,0 +1,43 @@
+import unittest
+
+from quantities import format_amount, format_quantity, parse_quantity, scale_ingredients
+
+
+class QuantitiesTest(unittest.TestCase):
+    def test_amounts_and_units(self):
+        self.assertEqual(parse_quantity('100g')[:2], (100, 'g'))
+        self.assertEqual(parse_quantity('1 1/2 tsp')[:2], (7.5, 'ml'))
+        self.assertEqual(parse_quantity('3 cloves')[:2], (3, 'clove'))
+        self.assertEqual(parse_quantity('2 large')[:2], (2, ''))
+        self.assertEqual(parse_quantity('½ cup')[:2], (125, 'ml'))
+
+    def test_text_that_isnt_an_amount_and_unit(self):
+        for text in ('2-3 cloves', '1 (400g) can', '2 - 3 cloves', '1/0 cup', 'a pinch', '1,5 l'):
+            with self.subTest(text=text):
+                self.assertIsNone(parse_quantity(text).amount)
+
+    def test_scaling_leaves_unknown_quantities_alone(self):
+        scaled = scale_ingredients({'garlic': '2-3 cloves', 'tomatoes': '1 (400g) can', 'flour': '100g'}, 2)
+        self.assertEqual(scaled, {'garlic': '2-3 cloves', 'tomatoes': '1 (400g) can', 'flour': '200g'})
+
+    def test_bad_factors_are_refused(self):
+        for factor in (float('inf'), float('nan'), 1e300, 0, -2):
+            with self.subTest(factor=factor):
+                with self.assertRaises(ValueError):
+                    scale_ingredients({'flour': '100g'}, factor)
+
+    def test_huge_amounts_are_formatted(self):
+        self.assertEqual(format_amount(float('inf')), 'inf')
+        self.assertEqual(format_amount(1.5e300), '1.5e+300')
+        self.assertEqual(format_amount(12345678), '1.23e+07')
+        self.assertIsNone(parse_quantity('9' * 400 + 'g').amount)
+
+    def test_sizes_and_plurals(self):
+        self.assertEqual(scale_ingredients({'eggs': '3 large'}, 2), {'eggs': '6 large'})
+        self.assertEqual(parse_quantity('1 glass')[:2], (1, 'glass'))
+        self.assertEqual(parse_quantity('2 glasses')[:2], (2, 'glass'))
+        self.assertEqual(format_quantity(2, 'glass'), '2 glasses')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from benchmark import generate_catalogue
+from ranked_search import RankedIndex, edit_distance
+
+RECIPES = {
+    'Roast Potatoes': {'ingredients': {'potatoes': '1kg', 'rosemary': '1 stalk'}, 'tags': ['dinner'],
+                       'instructions': ['Roast them for 45 minutes.']},
+    'Potato Salad': {'ingredients': {'potatoes': '500g', 'mayonnaise': '3 tbsp'}, 'tags': ['lunch'],
+                     'instructions': ['Boil the potatoes and mix with the mayonnaise.']},
+    'Chickpea Curry': {'ingredients': {'chickpeas': '1 can', 'coconut milk': '1 can'}, 'tags': ['dinner', 'vegan'],
+                       'instructions': ['Simmer for 20 minutes, then serve with roast potatoes on the side.']},
+    'Porridge': {'ingredients': {'oats': '100g', 'milk': '250ml'}, 'tags': ['breakfast'],
+                 'instructions': ['Stir the oats into the milk.']},
+}
+
+
+class RankedSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.index = RankedIndex(RECIPES)
+
+    def names(self, query: str, k: int = 10):
+        return [name for name, score in self.index.search(query, k)]
+
+    def test_title_counts_for_more_than_instructions(self):
+        self.assertEqual(self.names('roast potatoes'), ['Roast Potatoes', 'Chickpea Curry', 'Potato Salad'])
+        results = self.index.search('chickpea')
+        self.assertEqual([name for name, score in results], ['Chickpea Curry'])
+        self.assertGreater(results[0][1], 0)
+        self.assertEqual(self.names('nothing like it'), [])
+
+    def test_typos(self):
+        self.assertEqual(self.names('chikpea'), ['Chickpea Curry'])
+        self.assertEqual(self.names('porrige'), ['Porridge'])
+        # a typo still counts for less than the real word
+        exact = dict(self.index.search('rosemary'))['Roast Potatoes']
+        typo = dict(self.index.search('rosemery'))['Roast Potatoes']
+        self.assertLess(typo, exact)
+        # short words have to be spelled right
+        self.assertEqual(self.names('oat'), [])
+        self.assertEqual(self.names('oats'), ['Porridge'])
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance('potato', 'potato', 2), 0)
+        self.assertEqual(edit_distance('potato', 'potatos', 2), 1)
+        self.assertEqual(edit_distance('chickpea', 'chikpae', 2), 3)
+        self.assertEqual(edit_distance('a', 'abcdef', 2), 3)
+
+    def test_best_k_best_first(self):
+        catalogue = generate_catalogue(300)
+        index = RankedIndex(catalogue)
+        everything = index.search('spicy chickpea curry potatoes', k=len(catalogue))
+        scores = [score for name, score in everything]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(index.search('spicy chickpea curry potatoes', k=5), everything[:5])
+
+    def test_kept_up_to_date(self):
+        self.index.update('Porridge', dict(RECIPES['Porridge'], tags=['breakfast', 'chickpea']))
+        self.assertEqual(set(self.names('chickpea')), {'Chickpea Curry', 'Porridge'})
+        self.index.remove('Chickpea Curry')
+        self.index.remove('Porridge')
+        self.assertEqual(self.names('chickpea'), [])
+        self.assertEqual(self.names('chikpea'), [])
+        self.index.add('Chickpea Curry', RECIPES['Chickpea Curry'])
+        self.assertEqual(self.names('chickpea'), ['Chickpea Curry'])
+        # taking every recipe out leaves nothing behind
+        for name in list(self.index.doc_words):
+            self.index.remove(name)
+        self.assertEqual((self.index.postings, self.index.trigrams), ({}, {}))
+        self.assertAlmostEqual(self.index.total_length, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from recipes_class import Recipes
+from storage import JsonStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RecipesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        shutil.copy(os.path.join(ROOT, 'recipes.json'), self.path)
+        self.recipes = Recipes(JsonStore(self.path))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_update_rejects_wrong_types(self):
+        before = self.recipes.recipes['Roast Potatoes']['tags'][:]
+        for patch in ({'tags': 5}, {'tags': 'dinner'}, {'ingredients': ['a', 'b']}, {'author': None},
+                      {'instructions': [1, 2]}, {'rating': '4'}):
+            with self.subTest(patch=patch):
+                with self.assertRaises(ValueError):
+                    self.recipes.update('Roast Potatoes', patch)
+        # nothing was changed, recorded or indexed
+        self.assertEqual(self.recipes.recipes['Roast Potatoes']['tags'], before)
+        self.assertEqual(self.recipes.changed, {})
+        self.assertEqual(len(self.recipes.history.undo_steps), 0)
+        self.assertNotIn('Roast Potatoes', self.recipes.filter('tag:d'))
+
+    def test_add_rejects_wrong_types(self):
+        with self.assertRaises(ValueError):
+            self.recipes.add('Toast', {'tags': 'breakfast'})
+        with self.assertRaises(ValueError):
+            self.recipes.add('Toast', ['bread'])
+        self.assertNotIn('Toast', self.recipes.recipes)
+
+    def test_good_patch_is_applied(self):
+        self.recipes.update('Roast Potatoes', {'tags': ['dinner'], 'author': 'Ross', 'rating': 4})
+        self.assertEqual(self.recipes.recipes['Roast Potatoes']['tags'], ['dinner'])
+        self.assertIn('Roast Potatoes', self.recipes.filter('tag:dinner'))
+
+    def test_edit_session_rollback(self):
+        self.recipes.add('Toast', {'tags': ['breakfast']})
+        before = copy.deepcopy(self.recipes.recipes['Roast Potatoes'])
+        steps = len(self.recipes.history.undo_steps)
+        # build the filter index first, so rolling back has to update it
+        self.recipes.filter('tag:picnic')
+
+        session = self.recipes.begin_edit('Roast Potatoes')
+        self.recipes.rename('Roast Potatoes', 'Crispy Potatoes')
+        self.recipes.update('Crispy Potatoes', {'tags': ['picnic'], 'rating': 1})
+        self.recipes.set_ingredient('Crispy Potatoes', 'paprika', '1 tsp')
+        self.recipes.recipes['Crispy Potatoes']['instructions'].append('Eat them')
+        self.recipes.rollback_edit(session, 'Crispy Potatoes')
+
+        self.assertEqual(self.recipes.recipes['Roast Potatoes'], before)
+        self.assertNotIn('Crispy Potatoes', self.recipes.recipes)
+        self.assertIsNone(self.recipes.resolve_name('crispy potatoes'))
+        self.assertEqual(self.recipes.search('potatoes'), ['Roast Potatoes'])
+        self.assertEqual(self.recipes.search('paprika'), [])
+        self.assertEqual(self.recipes.filter('tag:picnic'), [])
+        self.assertIn('Roast Potatoes', self.recipes.filter('rating>=5'))
+        # only the change from before the session is still waiting to be saved and can be undone
+        self.assertEqual(list(self.recipes.changed), ['Toast'])
+        self.assertEqual(len(self.recipes.history.undo_steps), steps)
+
+        self.recipes.save_recipes()
+        self.assertEqual(Recipes(JsonStore(self.path)).recipes['Roast Potatoes'], before)
+        self.recipes.undo()
+        self.assertNotIn('Toast', self.recipes.recipes)
+        self.assertEqual(self.recipes.recipes['Roast Potatoes'], before)
+
+    def test_edit_session_without_changes(self):
+        session = self.recipes.begin_edit('Roast Potatoes')
+        self.recipes.rollback_edit(session, 'Roast Potatoes')
+        self.assertEqual(self.recipes.changed, {})
+        self.assertEqual(len(self.recipes.history.undo_steps), 0)
+
+
+    def test_names_ignore_capitals(self):
+        self.assertEqual(self.recipes.resolve_name('roast POTATOES'), 'Roast Potatoes')
+        self.assertIsNone(self.recipes.resolve_name('roast potato'))
+        self.recipes.add('Toast', {})
+        self.recipes.rename('Roast Potatoes', 'Crispy Potatoes')
+        self.assertEqual(self.recipes.resolve_name('TOAST'), 'Toast')
+        self.assertEqual(self.recipes.resolve_name('crispy potatoes'), 'Crispy Potatoes')
+        self.assertIsNone(self.recipes.resolve_name('roast potatoes'))
+        self.recipes.delete('Toast')
+        self.assertIsNone(self.recipes.resolve_name('toast'))
+        self.recipes.undo()
+        self.recipes.undo()
+        self.assertEqual(self.recipes.resolve_name('toast'), 'Toast')
+        self.assertEqual(self.recipes.resolve_name('roast potatoes'), 'Roast Potatoes')
+        self.assertEqual(self.recipes.names, {name.lower(): name for name in self.recipes.recipes})
+
+    def test_names_that_only_differ_by_capitals(self):
+        self.recipes.add('Toast', {})
+        self.recipes.add('TOAST', {})
+        # the later one wins, the same as the old loop over every name
+        self.assertEqual(self.recipes.resolve_name('toast'), 'TOAST')
+        self.recipes.delete('TOAST')
+        self.assertEqual(self.recipes.resolve_name('toast'), 'Toast')
+        self.recipes.rename('Toast', 'Jam')
+        self.assertIsNone(self.recipes.resolve_name('toast'))
+
+    def test_find_valid_name(self):
+        with mock.patch('builtins.input', side_effect=['nothing like it', 'ROAST potatoes']):
+            with mock.patch('builtins.print'):
+                self.assertEqual(self.recipes.find_valid_name(), 'Roast Potatoes')
+        with mock.patch('builtins.input', side_effect=['Back']):
+            self.assertEqual(self.recipes.find_valid_name(), 'Back')
+
+
+if __name__ == '__main__':
+    unittest.main()
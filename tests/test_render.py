@@ -0,0 +1,91 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from recipes_class import Recipes
+from render import CLEAR, RenderCache, render_page, render_recipe, show
+from storage import JsonStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RenderTest(unittest.TestCase):
+    def test_render_recipe(self):
+        text = render_recipe('Toast', {'ingredients': {'bread': '2 slices'}, 'instructions': ['Toast it', 'Eat it'],
+                                       'tags': ['breakfast', 'quick'], 'author': 'Ross', 'rating': 4})
+        self.assertEqual(text, "Toast by Ross\n\nRating: 4 / 5\nTags: breakfast, quick\n\nIngredients\n"
+                               "2 slices  bread\n\nInstructions\n- Toast it\n- Eat it\n")
+        self.assertIn("Rating: not rated", render_recipe('Bare', {}))
+
+    def test_render_page(self):
+        names = [f"Recipe {n}" for n in range(45)]
+        self.assertEqual(render_page(names, 0, 20).count('- Recipe'), 20)
+        last = render_page(names, 2, 20)
+        self.assertEqual(last, ''.join(f"- Recipe {n}\n" for n in range(40, 45)) + "\nPage 3 of 3 (45 recipes)\n")
+        self.assertEqual(render_page([], 0, 20), "\nPage 1 of 1 (0 recipes)\n")
+
+    def test_show_is_one_write(self):
+        output = mock.Mock()
+        with mock.patch('sys.stdout', output):
+            show('a', 'b', 'c')
+            show('d', clear=False)
+        self.assertEqual(output.write.call_args_list, [mock.call(CLEAR + 'abc'), mock.call('d')])
+
+    def test_cache(self):
+        cache = RenderCache(size=2)
+        cache.put('Toast', 1, 'toast text')
+        cache.put('Jam', 1, 'jam text')
+        self.assertEqual(cache.get('Toast', 1), 'toast text')
+        # the recipe has changed since it was rendered
+        self.assertIsNone(cache.get('Toast', 2))
+        # Jam was used least recently, so it's the one dropped
+        cache.put('Porridge', 1, 'porridge text')
+        self.assertIsNone(cache.get('Jam', 1))
+        self.assertEqual(cache.get('Toast', 1), 'toast text')
+        cache.discard('Toast')
+        self.assertIsNone(cache.get('Toast', 1))
+
+
+class RenderedRecipesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        shutil.copy(os.path.join(ROOT, 'recipes.json'), self.path)
+        self.recipes = Recipes(JsonStore(self.path))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rendered_recipe_is_cached_until_it_changes(self):
+        with mock.patch('recipes_class.render_recipe', wraps=render_recipe) as render:
+            first = self.recipes.rendered_recipe('Roast Potatoes')
+            self.assertEqual(self.recipes.rendered_recipe('Roast Potatoes'), first)
+            self.assertEqual(render.call_count, 1)
+            self.recipes.update('Roast Potatoes', {'rating': 1})
+            self.assertIn('Rating: 1 / 5', self.recipes.rendered_recipe('Roast Potatoes'))
+            self.assertEqual(render.call_count, 2)
+            # undoing changes the recipe again, so it isn't shown with the old version's text
+            self.recipes.undo()
+            self.assertEqual(self.recipes.rendered_recipe('Roast Potatoes'), first)
+            self.assertEqual(render.call_count, 3)
+
+    def test_view_recipes_pages(self):
+        for n in range(23):
+            self.recipes.add(f"Recipe {n}", {})
+        self.recipes.page_size = 10
+        output = io.StringIO()
+        with mock.patch('builtins.input', side_effect=['n', 'n', 'n', 'p', 'x', '2']):
+            with contextlib.redirect_stdout(output):
+                self.recipes.view_recipes()
+        pages = [line for line in output.getvalue().splitlines() if line.startswith('Page ')]
+        # going past the last page stays on it, and a bad choice shows the same page again
+        self.assertEqual(pages, [f"Page {n} of 3 (25 recipes)" for n in (1, 2, 3, 3, 2, 2)])
+        self.assertIn('Invalid choice', output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmark import generate_catalogue
+from recipes_class import Recipes
+from storage import make_store
+
+QUERIES = ['', 'a', 'PO', 'pot', 'potato', 'roast pot', 'chickpea', 'chia seeds', 'snack', 'high protein', ' ', '1',
+           'zzz', 'toast', 'ast', 'stew 1', 'e b', 'Quick']
+
+
+def linear_search(recipes: dict, query: str):
+    """the search the menus used to do, looking through every recipe"""
+    query = query.lower()
+    return [name for name, recipe in recipes.items()
+            if query in name.lower() or query in ' '.join(recipe['ingredients']).lower()
+            or query in ' '.join(recipe['tags']).lower()]
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        with open(self.path, 'w') as recipes_file:
+            json.dump(generate_catalogue(300), recipes_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertMatchesScan(self, recipes):
+        for query in QUERIES:
+            with self.subTest(query=query):
+                self.assertEqual(recipes.search(query), linear_search(recipes.recipes, query))
+
+    def change(self, recipes, suffix: str):
+        names = list(recipes.recipes)
+        recipes.rename(names[0], 'Roast Toast' + suffix)
+        recipes.rename(names[1], 'Quick Potato Stew 1' + suffix)
+        recipes.delete(names[2])
+        recipes.delete(names[3])
+        recipes.add('Toast' + suffix, {'ingredients': {'bread': '2 slices', 'potato': '1'}, 'tags': ['snack']})
+        recipes.update(names[4], {'tags': ['chickpea'], 'ingredients': {}})
+        recipes.set_ingredient(names[5], 'chia seeds', '40g')
+        recipes.undo()
+
+    def test_search_matches_a_linear_scan(self):
+        recipes = Recipes(make_store('json', self.path))
+        self.assertMatchesScan(recipes)
+        self.change(recipes, '')
+        self.assertMatchesScan(recipes)
+        recipes.save_recipes()
+        recipes.store.close()
+
+        # a warm start loads the index from the cache instead of building it
+        self.assertTrue(os.path.exists(self.path + '.cache'))
+        warm = Recipes(make_store('json', self.path))
+        self.assertTrue(warm.index.packed)
+        self.assertEqual(list(warm.recipes), list(recipes.recipes))
+        self.assertMatchesScan(warm)
+        self.change(warm, ' again')
+        self.assertMatchesScan(warm)
+
+
+if __name__ == '__main__':
+    unittest.main()
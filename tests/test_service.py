@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from recipes_class import Recipes
+from service import RecipeService
+from storage import JsonStore
+from tenants import TenantRecipes, recipe_size
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class BrokenStore(JsonStore):
+    def save(self, recipes, changed):
+        raise OSError("No space left on device")
+
+
+async def request(port: int, method: str, path: str, payload=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode() if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                 + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(data)
+
+
+class ServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        shutil.copy(os.path.join(ROOT, 'recipes.json'), self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def serve(self, recipes, *requests):
+        """sends the requests one after another and returns their (status, payload)s"""
+        async def run():
+            service = RecipeService(recipes, save_delay=0)
+            server = await service.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return [await request(port, *arguments) for arguments in requests]
+
+        return asyncio.run(run())
+
+    def test_failed_save_is_kept_for_later(self):
+        recipes = Recipes(BrokenStore(self.path))
+        [(status, payload)] = self.serve(recipes, ('POST', '/recipes', {'name': 'Toast', 'recipe': {}}))
+        self.assertEqual(status, 202)
+        self.assertTrue(payload['pending'])
+        self.assertIn('No space left on device', payload['error'])
+        # the write is still there and waiting for the next save
+        self.assertIn('Toast', recipes.recipes)
+        self.assertIn('Toast', recipes.changed)
+
+    def test_patch_is_all_or_nothing(self):
+        recipes = TenantRecipes(JsonStore(self.path))
+        recipes.limit = sum(recipe_size(name, recipe) for name, recipe in recipes.recipes.items()) + 100
+        before = dict(recipes.recipes['Roast Potatoes'])
+        [(status, payload), (renamed, _)] = self.serve(
+            recipes,
+            # the rename on its own would fit, the instructions take it over the limit
+            ('PATCH', '/recipes/roast%20potatoes', {'name': 'Potatoes', 'instructions': ['Roast them'] * 50}),
+            ('PATCH', '/recipes/roast%20potatoes', {'name': 'Potatoes', 'rating': 5}))
+        self.assertEqual(status, 400)
+        self.assertIn('limit', payload['error'])
+        self.assertEqual(renamed, 200)
+        self.assertNotIn('Roast Potatoes', recipes.recipes)
+        self.assertEqual(dict(recipes.recipes['Potatoes']), dict(before, rating=5))
+        # the rename and the rating were one change
+        recipes.undo()
+        self.assertEqual(dict(recipes.recipes['Roast Potatoes']), before)
+        self.assertNotIn('Potatoes', recipes.recipes)
+
+    def test_flush_saves_waiting_writes(self):
+        async def run():
+            service = RecipeService(Recipes(JsonStore(self.path)), save_delay=60)
+            write = asyncio.create_task(service.respond('POST', '/recipes', json.dumps(
+                {'name': 'Toast', 'recipe': {}}).encode()))
+            await asyncio.sleep(0)
+            # stopping the service cancels the request that's waiting for the save
+            write.cancel()
+            service.flush()
+
+        asyncio.run(run())
+        self.assertIn('Toast', Recipes(JsonStore(self.path)).recipes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from recipes_class import Recipes
+from storage import ConflictError, SharedStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# another program changing the same recipes, it saves once per rating so the journal is compacted on the third save
+OTHER_PROGRAM = """
+import sys
+sys.path.insert(0, {root!r})
+from recipes_class import Recipes
+from storage import SharedStore
+recipes = Recipes(SharedStore({path!r}, compact_every=3))
+for rating in (1, 2, 3):
+    recipes.update('Roast Potatoes', {{'rating': rating}})
+    recipes.save_recipes()
+"""
+
+
+class SharedStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        shutil.copy(os.path.join(ROOT, 'recipes.json'), self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_other_program(self):
+        subprocess.run([sys.executable, '-c', OTHER_PROGRAM.format(root=ROOT, path=self.path)], check=True)
+
+    def test_conflict_after_another_program_compacts(self):
+        recipes = Recipes(SharedStore(self.path, compact_every=3))
+        self.run_other_program()
+        self.assertTrue(os.path.exists(self.path + '.versions'))
+
+        recipes.update('Roast Potatoes', {'rating': 5})
+        with self.assertRaises(ConflictError):
+            recipes.save_recipes()
+        # the other program's change is kept, on disk and in memory
+        self.assertEqual(recipes.recipes['Roast Potatoes']['rating'], 3)
+        with open(self.path + '.versions') as versions_file:
+            self.assertEqual(json.load(versions_file)['Roast Potatoes'], 3)
+        self.assertEqual(Recipes(SharedStore(self.path)).recipes['Roast Potatoes']['rating'], 3)
+
+    def test_refresh_picks_up_compacted_changes(self):
+        recipes = Recipes(SharedStore(self.path, compact_every=3))
+        self.run_other_program()
+        recipes.refresh()
+        self.assertEqual(recipes.recipes['Roast Potatoes']['rating'], 3)
+
+        # saving after catching up isn't a conflict
+        recipes.update('Roast Potatoes', {'rating': 4})
+        recipes.save_recipes()
+        self.assertEqual(Recipes(SharedStore(self.path)).recipes['Roast Potatoes']['rating'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
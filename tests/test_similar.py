@@ -0,0 +1,92 @@
+import json
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmark import generate_catalogue
+from recipes_class import Recipes
+from similar import SimilarityIndex, features
+from storage import JsonStore
+
+RICE = {
+    'Saffron Rice': {'ingredients': {'rice': '200g', 'saffron': '1 pinch', 'salt': '1 tsp'}, 'tags': ['side']},
+    'Paella': {'ingredients': {'prawns': '200g', 'saffron': '1 pinch'}, 'tags': ['dinner']},
+    'Chips': {'ingredients': {'potatoes': '1kg', 'salt': '1 tsp'}, 'tags': ['dinner']},
+    'Salted Caramel': {'ingredients': {'sugar': '200g', 'salt': '1 tsp'}, 'tags': ['dessert']},
+    'Popcorn': {'ingredients': {'corn': '100g', 'SALT ': '1 tsp'}, 'tags': ['Snack']},
+    'Fruit Salad': {'ingredients': {'apples': '2', 'oranges': '2'}, 'tags': ['dessert']},
+    'Saffron Rice 2': {'ingredients': {'Rice': '100g', 'saffron': '2 pinches', 'salt': '1 pinch'}, 'tags': ['side']},
+}
+
+
+def brute_force(recipes: dict, name: str):
+    """the cosine similarity of name with every other recipe, worked out the long way"""
+    counts = {}
+    for recipe in recipes.values():
+        for feature in features(recipe):
+            counts[feature] = counts.get(feature, 0) + 1
+    weights = {feature: math.log(1 + len(recipes) / count) for feature, count in counts.items()}
+
+    def norm(features_of):
+        return math.sqrt(sum(weights[feature] ** 2 for feature in features_of))
+
+    mine = features(recipes[name])
+    scores = {}
+    for other, recipe in recipes.items():
+        shared = mine & features(recipe)
+        if other != name and shared:
+            scores[other] = sum(weights[feature] ** 2 for feature in shared) / (norm(mine) * norm(features(recipe)))
+    return scores
+
+
+class SimilarTest(unittest.TestCase):
+    def test_rare_ingredients_count_for_more(self):
+        index = SimilarityIndex(RICE)
+        found = index.similar('Saffron Rice', k=10)
+        names = [name for name, score in found]
+        # capitals and spaces don't matter, so the second saffron rice has exactly the same ingredients and tags
+        self.assertEqual(names[0], 'Saffron Rice 2')
+        self.assertAlmostEqual(found[0][1], 1.0)
+        # paella and chips are alike apart from one sharing saffron and the other salt, which lots of recipes have
+        self.assertLess(names.index('Paella'), names.index('Chips'))
+        self.assertNotIn('Fruit Salad', names)
+        self.assertEqual([score for name, score in found], sorted((score for name, score in found), reverse=True))
+        self.assertEqual(index.similar('Not a recipe'), [])
+        self.assertEqual(len(index.similar('Saffron Rice', k=2)), 2)
+
+    def test_matches_brute_force(self):
+        catalogue = generate_catalogue(300)
+        index = SimilarityIndex(catalogue)
+        for name in list(catalogue)[:20]:
+            with self.subTest(name=name):
+                expected = brute_force(catalogue, name)
+                found = index.similar(name, k=10)
+                self.assertEqual(len(found), min(10, len(expected)))
+                for other, score in found:
+                    self.assertAlmostEqual(score, expected[other])
+                # nothing left out scores higher than the last one found
+                left_out = [score for other, score in expected.items() if other not in dict(found)]
+                self.assertLessEqual(max(left_out, default=0), found[-1][1] + 1e-9)
+
+    def test_kept_up_to_date(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'recipes.json')
+        with open(path, 'w') as recipes_file:
+            json.dump(RICE, recipes_file)
+        recipes = Recipes(JsonStore(path))
+        self.assertEqual(recipes.similar('Fruit Salad'), [('Salted Caramel', recipes.similar('Fruit Salad')[0][1])])
+        recipes.update('Fruit Salad', {'ingredients': {'rice': '1', 'saffron': '1 pinch', 'prawns': '1'}})
+        self.assertEqual(recipes.similar('Fruit Salad')[0][0], 'Paella')
+        recipes.rename('Paella', 'Seafood Paella')
+        recipes.delete('Saffron Rice 2')
+        names = [name for name, score in recipes.similar('Saffron Rice', k=10)]
+        self.assertIn('Seafood Paella', names)
+        self.assertNotIn('Paella', names)
+        self.assertNotIn('Saffron Rice 2', names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmark import generate_catalogue
+from recipes_class import Recipes
+from snapshot import Snapshot, SnapshotWriter
+from storage import BinaryStore, JsonStore, migrate
+
+# details the binary layout can't hold, which go in the json on the end of the body instead
+ODD = {
+    'No rating': {'ingredients': {'bread': '2 slices'}, 'instructions': [], 'tags': ['bread'], 'author': ''},
+    'Big rating': {'ingredients': {}, 'instructions': ['wait'], 'tags': [], 'author': 'Ross', 'rating': 500},
+    'Half rating': {'ingredients': {}, 'instructions': [], 'tags': [], 'author': None, 'rating': 3.5},
+    'Bare': {},
+    'Extra': {'tags': ['dinner', 'dinner'], 'author': 'Ross', 'serves': 4, 'ingredients': {'eggs': 2}},
+    'Crème brûlée ☕': {'ingredients': {'crème': '½ pint'}, 'instructions': ['Brûlée it 🔥', ''], 'tags': ['€']},
+}
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.catalogue = dict(generate_catalogue(100), **ODD)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        writer = SnapshotWriter()
+        output = io.BytesIO()
+        spans = writer.write(output, ((name, writer.encode(recipe)) for name, recipe in self.catalogue.items()))
+        snapshot = Snapshot(output.getvalue())
+        self.assertEqual(snapshot.spans(), spans)
+        self.assertEqual(list(spans), list(self.catalogue))
+        for name, recipe in self.catalogue.items():
+            with self.subTest(name=name):
+                self.assertEqual(snapshot.decode(spans[name][0]), recipe)
+
+    def test_store_round_trip(self):
+        json_path = os.path.join(self.directory, 'recipes.json')
+        path = os.path.join(self.directory, 'recipes.rcp')
+        with open(json_path, 'w') as recipes_file:
+            json.dump(self.catalogue, recipes_file)
+        migrate(JsonStore(json_path), BinaryStore(path))
+
+        recipes = Recipes(BinaryStore(path))
+        self.addCleanup(recipes.store.close)
+        self.assertEqual(dict(recipes.recipes.items()), self.catalogue)
+        name = next(iter(self.catalogue))
+        recipes.update(name, {'tags': ['a new tag'], 'rating': 1})
+        recipes.rename('Extra', 'Extra 2')
+        recipes.delete('Bare')
+        recipes.add('Jam', {'ingredients': {'strawberries': '1kg', 'sugar': '1kg'}})
+        recipes.save_recipes()
+        expected = dict(recipes.recipes.items())
+        self.assertEqual(expected[name]['tags'], ['a new tag'])
+        self.assertEqual(expected['Extra 2'], ODD['Extra'])
+
+        again = Recipes(BinaryStore(path))
+        self.addCleanup(again.store.close)
+        self.assertEqual(list(again.recipes), list(expected))
+        self.assertEqual(dict(again.recipes.items()), expected)
+
+    def test_broken_file(self):
+        path = os.path.join(self.directory, 'recipes.rcp')
+        for data in (b'', b'RECIPES\x00', b'not a snapshot at all, just some text'):
+            with self.subTest(data=data):
+                with open(path, 'wb') as snapshot_file:
+                    snapshot_file.write(data)
+                store = BinaryStore(path)
+                self.assertEqual(dict(store.load()), {})
+                store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from recipes_class import Recipes
+from storage import JsonStore, SQLiteStore, migrate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SQLiteStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.directory, 'recipes.json')
+        self.path = os.path.join(self.directory, 'recipes.db')
+        shutil.copy(os.path.join(ROOT, 'recipes.json'), self.json_path)
+        migrate(JsonStore(self.json_path), SQLiteStore(self.path))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_json_to_database_and_back(self):
+        odd = {
+            'Toast': {'ingredients': {'bread': '2 slices'}, 'instructions': ['toast it'], 'extra': {'serves': 1}},
+            'Jam': {'tags': 'breakfast', 'rating': '4', 'author': None},
+            'Tea': {'ingredients': {'tea': None}, 'instructions': [], 'tags': [], 'author': '', 'rating': 5},
+        }
+        with open(self.json_path, 'w') as recipes_file:
+            json.dump(odd, recipes_file)
+        path = os.path.join(self.directory, 'odd.db')
+        back = os.path.join(self.directory, 'back.json')
+        migrate(JsonStore(self.json_path), SQLiteStore(path))
+        migrate(SQLiteStore(path), JsonStore(back))
+        with open(back) as recipes_file:
+            self.assertEqual(json.load(recipes_file), odd)
+
+    def test_unsaved_changes_dont_lock_the_database(self):
+        first = Recipes(SQLiteStore(self.path))
+        second = Recipes(SQLiteStore(self.path))
+        first.update('Roast Potatoes', {'rating': 2})
+        # this used to wait for first to save and then fail with 'database is locked'
+        second.add('Toast', {'ingredients': {'bread': '2 slices'}})
+        second.save_recipes()
+        first.save_recipes()
+
+        saved = Recipes(SQLiteStore(self.path))
+        self.assertEqual(saved.recipes['Roast Potatoes']['rating'], 2)
+        self.assertIn('Toast', saved.recipes)
+
+    def test_unsaved_changes_are_searched(self):
+        recipes = Recipes(SQLiteStore(self.path))
+        expected = Recipes(JsonStore(self.json_path))
+        for changed in (recipes, expected):
+            changed.add('Potato Toast', {'ingredients': {'bread': '2 slices'}})
+            changed.rename('Roast Potatoes', 'Roasties')
+            changed.update('Potato Toast', {'tags': ['potato']})
+        for query in ('potato', 'to', 'roast', 'bread'):
+            self.assertEqual(recipes.search(query), expected.search(query))
+        self.assertEqual(list(recipes.recipes), list(expected.recipes))
+        self.assertEqual(len(recipes.recipes), len(expected.recipes))
+
+        recipes.store.close()
+        # nothing was saved
+        self.assertIn('Roast Potatoes', Recipes(SQLiteStore(self.path)).recipes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmark import generate_catalogue
+from recipes_class import Recipes
+from storage import UMASK, JournalStore, LazyJsonStore, atomic_file, make_store
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class JsonCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        shutil.copy(os.path.join(ROOT, 'recipes.json'), self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cache_is_written_on_close_not_on_save(self):
+        recipes = Recipes(make_store('json', self.path))
+        cache_time = os.stat(self.path + '.cache').st_mtime_ns
+        recipes.add('Toast', {'ingredients': {'bread': '2 slices'}, 'tags': ['breakfast']})
+        recipes.save_recipes()
+        self.assertEqual(os.stat(self.path + '.cache').st_mtime_ns, cache_time)
+        recipes.store.close()
+
+        store = make_store('json', self.path)
+        self.assertIsNotNone(store.load_cache())
+        warm = Recipes(make_store('json', self.path))
+        self.assertIn('Toast', warm.recipes)
+        self.assertEqual(warm.search('toast'), ['Toast'])
+
+    def test_unsaved_changes_dont_go_in_the_cache(self):
+        recipes = Recipes(make_store('json', self.path))
+        recipes.add('Toast', {})
+        recipes.save_recipes()
+        recipes.add('Jam', {})
+        recipes.store.close()
+        warm = Recipes(make_store('json', self.path))
+        self.assertNotIn('Jam', warm.recipes)
+        self.assertEqual(warm.search('jam'), [])
+
+
+class JournalStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        shutil.copy(os.path.join(ROOT, 'recipes.json'), self.path)
+        with open(self.path) as recipes_file:
+            self.original = json.load(recipes_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def changed_recipes(self, store):
+        recipes = Recipes(store)
+        recipes.add('Toast', {'ingredients': {'bread': '2 slices'}})
+        recipes.save_recipes()
+        recipes.rename('Roast Potatoes', 'Potatoes')
+        recipes.update('Potatoes', {'rating': 5})
+        recipes.delete('Protein Cake Pieces')
+        recipes.save_recipes()
+        return recipes
+
+    def test_replay(self):
+        recipes = self.changed_recipes(JournalStore(self.path))
+        recipes.store.close()
+        # the snapshot isn't touched until the journal is compacted
+        with open(self.path) as recipes_file:
+            self.assertEqual(json.load(recipes_file), self.original)
+        with open(self.path + '.journal') as journal:
+            self.assertEqual(len(journal.readlines()), 4)
+        again = Recipes(JournalStore(self.path))
+        self.assertEqual(again.recipes, recipes.recipes)
+        self.assertEqual(again.store.records, 4)
+
+    def test_torn_tail(self):
+        recipes = self.changed_recipes(JournalStore(self.path))
+        recipes.store.close()
+        with open(self.path + '.journal', 'ab') as journal:
+            journal.write(b'{"name": "Jam", "recipe": {"ingre')
+        again = Recipes(JournalStore(self.path))
+        self.assertEqual(again.recipes, recipes.recipes)
+        # the half written record is cut off, so the next one starts on a line of its own
+        again.add('Jam', {})
+        again.save_recipes()
+        again.store.close()
+        with open(self.path + '.journal') as journal:
+            self.assertEqual(len(journal.readlines()), 5)
+        self.assertIn('Jam', Recipes(JournalStore(self.path)).recipes)
+
+    def test_compaction(self):
+        recipes = self.changed_recipes(JournalStore(self.path, compact_every=2))
+        recipes.store.close()
+        self.assertFalse(os.path.exists(self.path + '.journal.old'))
+        with open(self.path) as recipes_file:
+            self.assertEqual(json.load(recipes_file), recipes.recipes)
+
+    def test_frozen_journal_is_replayed_first(self):
+        # a compaction that was stopped half way leaves the older journal behind
+        recipes = self.changed_recipes(JournalStore(self.path))
+        recipes.store.close()
+        os.replace(self.path + '.journal', self.path + '.journal.old')
+        recipes = Recipes(JournalStore(self.path))
+        recipes.update('Toast', {'author': 'Ross'})
+        recipes.save_recipes()
+        recipes.store.close()
+        again = Recipes(JournalStore(self.path))
+        self.assertEqual(again.recipes['Toast']['author'], 'Ross')
+        self.assertEqual(again.recipes, recipes.recipes)
+
+
+class LazyStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        self.catalogue = generate_catalogue(50)
+        with open(self.path, 'w') as recipes_file:
+            json.dump(self.catalogue, recipes_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open(self):
+        recipes = Recipes(LazyJsonStore(self.path, cache_size=4))
+        self.addCleanup(recipes.store.close)
+        return recipes
+
+    def test_recipes_are_decoded_when_used(self):
+        recipes = self.open()
+        self.assertEqual(len(recipes.recipes.cache), 0)
+        self.assertEqual(list(recipes.recipes), list(self.catalogue))
+        for name, recipe in self.catalogue.items():
+            self.assertEqual(recipes.recipes[name], recipe)
+            self.assertLessEqual(len(recipes.recipes.cache), 4)
+        self.assertEqual(recipes.search('chickpea'), Recipes(make_store('json', self.path)).search('chickpea'))
+
+    def test_offsets_cache(self):
+        self.open()
+        self.assertTrue(os.path.exists(self.path + '.offsets'))
+        with mock.patch('storage.scan_offsets') as scan:
+            recipes = self.open()
+        scan.assert_not_called()
+        self.assertEqual(dict(recipes.recipes.items()), self.catalogue)
+
+        # a recipes file changed by something else doesn't match its offsets any more, so it's scanned again
+        self.catalogue['Toast'] = {'ingredients': {}, 'instructions': [], 'tags': [], 'author': ''}
+        with open(self.path, 'w') as recipes_file:
+            json.dump(self.catalogue, recipes_file)
+        self.assertEqual(dict(self.open().recipes.items()), self.catalogue)
+
+    def test_changes_survive_the_cache(self):
+        recipes = self.open()
+        names = list(self.catalogue)
+        recipes.update(names[0], {'rating': 1})
+        recipes.rename(names[1], 'Toast')
+        recipes.delete(names[2])
+        recipes.add('Jam', {})
+        # reading lots of other recipes pushes everything out of the cache, but changed ones are pinned
+        for name in names[3:]:
+            recipes.recipes[name]
+        recipes.save_recipes()
+        expected = dict(recipes.recipes.items())
+        self.assertEqual(expected[names[0]]['rating'], 1)
+        self.assertEqual(expected['Toast'], self.catalogue[names[1]])
+        self.assertNotIn(names[2], expected)
+
+        with open(self.path) as recipes_file:
+            self.assertEqual(json.load(recipes_file), expected)
+        with mock.patch('storage.scan_offsets') as scan:
+            self.assertEqual(dict(self.open().recipes.items()), expected)
+        scan.assert_not_called()
+
+
+class AtomicFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_new_file_gets_the_usual_permissions(self):
+        with atomic_file(self.path) as temp:
+            temp.write('{}')
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o666 & ~UMASK)
+
+    def test_permissions_are_kept(self):
+        for permissions in (0o644, 0o664, 0o600):
+            with self.subTest(permissions=oct(permissions)):
+                with open(self.path, 'w') as recipes_file:
+                    recipes_file.write('{}')
+                os.chmod(self.path, permissions)
+                recipes = Recipes(make_store('json', self.path))
+                recipes.add('Toast', {})
+                recipes.save_recipes()
+                recipes.store.close()
+                self.assertEqual(os.stat(self.path).st_mode & 0o777, permissions)
+
+
+if __name__ == '__main__':
+    unittest.main()
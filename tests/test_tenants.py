@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from tenants import CatalogueManager, QuotaError, recipe_size
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOAST = {'ingredients': {'bread': '2 slices'}, 'instructions': ['toast it'], 'tags': ['breakfast'], 'author': 'Ross'}
+
+
+class TenantsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.users = os.path.join(self.directory, 'users')
+        self.public = os.path.join(self.directory, 'recipes.json')
+        shutil.copy(os.path.join(ROOT, 'recipes.json'), self.public)
+        # cleanups run last first, so this happens after the managers are closed
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def manager(self, **kwargs):
+        manager = CatalogueManager(self.users, public=self.public, **kwargs)
+        self.addCleanup(manager.close)
+        return manager
+
+    def test_users_are_kept_apart(self):
+        manager = self.manager()
+        with manager.catalogue('ann') as recipes:
+            recipes.add('Ann toast', TOAST)
+            recipes.save_recipes()
+        with manager.catalogue('bob') as recipes:
+            self.assertEqual(recipes.recipes, {})
+            recipes.add('Bob toast', TOAST)
+            recipes.save_recipes()
+        self.assertEqual(manager.users(), ['ann', 'bob'])
+        found = manager.search_all('toast')
+        self.assertEqual(found['ann'], ['Ann toast'])
+        self.assertEqual(found['bob'], ['Bob toast'])
+        manager.close()
+        with open(os.path.join(self.users, 'ann.json')) as recipes_file:
+            self.assertEqual(list(json.load(recipes_file)), ['Ann toast'])
+
+        # the public catalogue can be read and copied from, but not changed
+        name = next(iter(manager.public.recipes))
+        with self.assertRaises(ValueError):
+            manager.public.delete(name)
+        manager.copy_public('ann', name)
+        with manager.catalogue('ann') as recipes:
+            self.assertIn(name, recipes.recipes)
+
+    def test_bad_names_and_modes(self):
+        manager = self.manager()
+        for user in ('../ann', 'public', '', 'a/b'):
+            with self.subTest(user=user):
+                with self.assertRaises(ValueError):
+                    manager.path_for(user)
+        with self.assertRaises(ValueError):
+            CatalogueManager(self.users, 'shared')
+
+    def test_quota(self):
+        limit = recipe_size('Toast', TOAST) * 2 + 10
+        manager = self.manager(size_limit=limit)
+        with manager.catalogue('ann') as recipes:
+            # nothing is measured until a change needs it
+            self.assertIsNone(recipes._size)
+            recipes.add('Toast', TOAST)
+            recipes.add('Toast 2', TOAST)
+            size = recipes.size
+            with self.assertRaises(QuotaError):
+                recipes.add('Toast 3', TOAST)
+            with self.assertRaises(QuotaError):
+                recipes.update('Toast', {'instructions': ['toast it'] * 20})
+            self.assertEqual(sorted(recipes.recipes), ['Toast', 'Toast 2'])
+            self.assertEqual(recipes.recipes['Toast'], TOAST)
+            self.assertEqual(recipes.size, size)
+
+            # making room lets it in again, and undoing is never refused
+            recipes.delete('Toast 2')
+            recipes.add('Toast 3', TOAST)
+            recipes.undo()
+            recipes.undo()
+            self.assertEqual(sorted(recipes.recipes), ['Toast', 'Toast 2'])
+            self.assertEqual(recipes.size, size)
+            self.assertEqual(recipes.size, sum(recipe_size(name, recipe) for name, recipe in recipes.recipes.items()))
+
+    def test_quota_on_a_loaded_catalogue(self):
+        os.makedirs(self.users)
+        with open(os.path.join(self.users, 'ann.json'), 'w') as recipes_file:
+            json.dump({'Toast': TOAST}, recipes_file)
+        manager = self.manager(size_limit=recipe_size('Toast', TOAST) + 10)
+        with manager.catalogue('ann') as recipes:
+            with self.assertRaises(QuotaError):
+                recipes.add('Toast 2', TOAST)
+            self.assertEqual(list(recipes.recipes), ['Toast'])
+            self.assertEqual(recipes.size, recipe_size('Toast', TOAST))
+
+    def test_eviction(self):
+        manager = self.manager(max_open=2)
+        for user in ('ann', 'bob', 'cat'):
+            with manager.catalogue(user) as recipes:
+                recipes.add(user + ' toast', TOAST)
+        # ann was used least recently, so she was saved and closed
+        self.assertEqual(manager.loaded(), ['bob', 'cat'])
+        with open(os.path.join(self.users, 'ann.json')) as recipes_file:
+            self.assertEqual(list(json.load(recipes_file)), ['ann toast'])
+        with manager.catalogue('ann') as recipes:
+            self.assertEqual(list(recipes.recipes), ['ann toast'])
+        self.assertEqual(manager.loaded(), ['cat', 'ann'])
+        manager.evict(idle=0)
+        self.assertEqual(manager.loaded(), [])
+
+    def test_eviction_errors_dont_hide_others(self):
+        manager = self.manager(max_open=0)
+        with mock.patch.object(manager, 'close_shard', side_effect=OSError("disk full")):
+            with self.assertLogs('tenants', 'ERROR'):
+                with self.assertRaises(KeyError):
+                    with manager.catalogue('ann'):
+                        raise KeyError('the real problem')
+        # it stayed loaded and is closed next time
+        self.assertEqual(manager.loaded(), ['ann'])
+        manager.evict()
+        self.assertEqual(manager.loaded(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from recipes_class import Recipes
+from storage import JsonStore
+from validate import check_file
+
+BROKEN = {
+    'Toast': {'ingredients': {'bread': '2 slices'}, 'instructions': ['toast it'], 'tags': ['breakfast'], 'author': 'Ross',
+              'rating': 4},
+    'toast': {'ingredients': {}, 'instructions': [], 'tags': 'breakfast, quick', 'author': '', 'rating': 9},
+    'Nothing yet': {'ingredients': {}, 'instructions': [], 'tags': [], 'author': ''},
+    'Bare': {},
+    'Not a recipe': 'just some text',
+    'Odd': {'ingredients': {}, 'instructions': [], 'tags': [], 'author': 'Ross', 'serves': 2},
+}
+
+
+class ValidateTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recipes.json')
+        with open(self.path, 'w') as recipes_file:
+            json.dump(BROKEN, recipes_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_check(self):
+        with open(self.path, 'rb') as recipes_file:
+            before = recipes_file.read()
+        report = check_file(self.path)
+        self.assertEqual(report['recipes'], 6)
+        # toast (duplicate, type and rating), Bare (missing details) and Not a recipe
+        self.assertEqual(report['with_problems'], 3)
+        self.assertEqual(report['problems']['invalid'], 1)
+        self.assertEqual(report['problems']['empty'], 2)
+        self.assertEqual(report['problems']['unknown'], 1)
+        self.assertFalse(report['written'])
+        with open(self.path, 'rb') as recipes_file:
+            self.assertEqual(recipes_file.read(), before)
+
+    def test_fix(self):
+        report = check_file(self.path, fix=True)
+        self.assertTrue(report['written'])
+        self.assertEqual(report['removed'], 1)
+        with open(self.path) as recipes_file:
+            fixed = json.load(recipes_file)
+        self.assertEqual(list(fixed), ['Toast', 'toast (2)', 'Nothing yet', 'Bare', 'Odd'])
+        self.assertEqual(fixed['toast (2)']['tags'], ['breakfast', 'quick'])
+        self.assertEqual(fixed['toast (2)']['rating'], 5)
+        self.assertEqual(fixed['Nothing yet'], BROKEN['Nothing yet'])
+        self.assertEqual(fixed['Bare'], {'ingredients': {}, 'instructions': [], 'tags': [], 'author': ''})
+        self.assertEqual(fixed['Odd'], BROKEN['Odd'])
+
+        # a second fix has nothing left to do
+        again = check_file(self.path, fix=True)
+        self.assertEqual(again['with_problems'], 0)
+        self.assertFalse(again['written'])
+
+    def test_recipe_added_without_details_is_kept(self):
+        path = os.path.join(self.directory, 'new.json')
+        recipes = Recipes(JsonStore(path))
+        recipes.add('Toast', {})
+        recipes.save_recipes()
+        report = check_file(path, fix=True)
+        self.assertEqual(report['with_problems'], 0)
+        self.assertIn('Toast', Recipes(JsonStore(path)).recipes)
+
+
+if __name__ == '__main__':
+    unittest.main()
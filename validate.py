@@ -0,0 +1,222 @@
+"""checks a recipes.json file for the problems that stop the menus working, and repairs them. the file is read in one
+pass over a memory map, decoding one recipe at a time, so the only thing kept for the whole file is the set of names
+(to find duplicates). with more than one worker the recipes are checked in chunks in a process pool while the next
+chunks are being read. the problems it finds, and what --fix does about them, are
+
+    invalid     an entry that isn't a recipe, e.g. text or broken json          removed
+    name        a recipe with an empty name                                     renamed 'Untitled recipe'
+    duplicate   a name that's already been used, ignoring capitals              renamed 'name (2)', the first one keeps it
+    missing     no ingredients, instructions, tags or author                    filled in as empty
+    type        a detail of the wrong type, e.g. tags written as one string     converted, or emptied if it can't be
+    rating      a rating that isn't a whole number from 1 to 5                  rounded into 1 to 5, or removed
+    unknown     a detail that isn't one of the usual ones                       left alone, it's only reported
+    empty       a recipe with nothing in any of its details                     left alone, it's only reported
+
+recipes without a rating are fine, they're shown as not rated. e.g.
+
+    python recipe_manager.py check recipes.json
+    python recipe_manager.py check recipes.json --fix --workers 4
+"""
+import json
+import math
+import mmap
+import os
+from collections import deque
+
+from bulk import map_chunks
+from recipes_class import RECIPE_FIELDS, valid_rating
+from storage import atomic_file, iter_offsets
+
+# what a missing detail is filled in as, rating is left out because it's allowed to be missing
+EMPTY = {'ingredients': dict, 'instructions': list, 'tags': list, 'author': str}
+# kinds of problem that are only warnings, there's nothing to repair so they don't count as problems on their own
+WARNINGS = ('unknown', 'empty')
+
+
+class Unchanged(Exception):
+    """raised inside atomic_file to throw the repaired copy away when nothing needed repairing"""
+
+
+def check_detail(field: str, value):
+    """returns (problem, repaired value) for one detail, problem is None if it's fine. a repaired value of None means
+    the detail should be removed"""
+    if field == 'ingredients':
+        if isinstance(value, dict):
+            if all(isinstance(quantity, str) for quantity in value.values()):
+                return None, value
+            return "quantities that aren't text", {ingredient: '' if quantity is None else str(quantity)
+                                                   for ingredient, quantity in value.items()}
+        if isinstance(value, list):
+            return "a list instead of ingredient: quantity", {str(ingredient): '' for ingredient in value}
+    elif field in ('instructions', 'tags'):
+        if isinstance(value, list):
+            if all(isinstance(item, str) for item in value):
+                return None, value
+            return f"{field} that aren't text", [str(item) for item in value if item is not None]
+        if isinstance(value, str):
+            items = value.splitlines() if field == 'instructions' else value.split(',')
+            return "text instead of a list", [item.strip() for item in items if item.strip()]
+    elif field == 'author':
+        if isinstance(value, str):
+            return None, value
+        if value is not None and not isinstance(value, (dict, list)):
+            return "not text", str(value)
+    elif field == 'rating':
+        if valid_rating(value):
+            return None, value
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return f"{value!r} isn't a number", None
+        if isinstance(value, bool) or not math.isfinite(number):
+            return f"{value!r} isn't a number", None
+        rating = min(5, max(1, round(number)))
+        return f"{value!r} is now {rating}", rating
+    return f"a {type(value).__name__}", EMPTY[field]()
+
+
+def check_recipe(recipe):
+    """returns (problems, repaired) for one decoded recipe. problems is a list of (kind, detail) and repaired is the
+    recipe with them fixed, the same recipe if nothing needed fixing, or None if it should be removed"""
+    if not isinstance(recipe, dict):
+        return [('invalid', f"a {type(recipe).__name__} instead of a recipe")], None
+
+    # a recipe that's just been added without any details yet looks like this, so it's kept
+    problems = [] if any(recipe.values()) else [('empty', "no details")]
+    repaired = {}
+    for field, value in recipe.items():
+        if field not in RECIPE_FIELDS:
+            problems.append(('unknown', field))
+            repaired[field] = value
+            continue
+        problem, value = check_detail(field, value)
+        if problem is not None:
+            problems.append(('rating', problem) if field == 'rating' else ('type', f"{field}: {problem}"))
+        if value is not None:
+            repaired[field] = value
+    for field, empty in EMPTY.items():
+        if field not in recipe:
+            problems.append(('missing', field))
+            repaired[field] = empty()
+    if all(kind in WARNINGS for kind, _ in problems):
+        repaired = recipe
+    return problems, repaired
+
+
+def check_chunk(chunk: list):
+    """runs in a worker process. chunk is the raw bytes of some recipes, and for each one it returns (problems, text)
+    where text is the repaired recipe as json, None to keep the original bytes or '' to remove it"""
+    results = []
+    for raw in chunk:
+        try:
+            recipe = json.loads(raw)
+        except ValueError as error:
+            results.append(([('invalid', f"not valid json ({error})")], ''))
+            continue
+        problems, repaired = check_recipe(recipe)
+        if repaired is None:
+            results.append((problems, ''))
+        elif repaired is recipe:
+            results.append((problems, None))
+        else:
+            results.append((problems, json.dumps(repaired)))
+    return results
+
+
+def free_name(seen: set, name: str):
+    n = 2
+    while f"{name} ({n})".lower() in seen:
+        n += 1
+    return f"{name} ({n})"
+
+
+def check_file(path: str, fix: bool = False, output: str = None, workers: int = 1, chunk_size: int = 1000,
+               examples: int = 20):
+    """checks every recipe in a recipes.json file and returns a report dictionary with how many recipes were checked,
+    how many have problems that can be repaired, how many times each kind of problem was found and the problems of
+    the first few recipes with any, as (name, [(kind, detail), ...]). unknown details and empty recipes are counted
+    but aren't something to repair, so they don't count as a problem on their own. with fix, a
+    repaired copy is written to output (the same file by default), and only if something needed repairing. raises
+    ValueError if the file isn't a json object of recipes at all, which can't be repaired here"""
+    report = {'recipes': 0, 'with_problems': 0, 'problems': {}, 'examples': [], 'removed': 0, 'renamed': 0,
+              'repaired': 0, 'written': False}
+
+    with open(path, 'rb') as catalogue_file:
+        if os.fstat(catalogue_file.fileno()).st_size == 0:
+            return report
+        with mmap.mmap(catalogue_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # the names and positions of the chunks the workers are checking, in the same order as the results
+            waiting = deque()
+
+            def chunks():
+                chunk = []
+                for name, start, end in iter_offsets(data, scalars=True):
+                    chunk.append((name, start, end))
+                    if len(chunk) >= chunk_size:
+                        waiting.append(chunk)
+                        yield [data[start:end] for _, start, end in chunk]
+                        chunk = []
+                if chunk:
+                    waiting.append(chunk)
+                    yield [data[start:end] for _, start, end in chunk]
+
+            def check(repaired_file):
+                seen = set()
+                written = 0
+                for results in map_chunks(check_chunk, chunks(), workers):
+                    for (name, start, end), (problems, text) in zip(waiting.popleft(), results):
+                        report['recipes'] += 1
+                        new_name = name
+                        if text != '':
+                            if not name.strip():
+                                problems.append(('name', "empty name"))
+                                new_name = 'Untitled recipe'
+                            if new_name.lower() in seen:
+                                new_name = free_name(seen, new_name)
+                                problems.append(('duplicate', f"renamed {new_name}"))
+                            seen.add(new_name.lower())
+                        for kind, _ in problems:
+                            report['problems'][kind] = report['problems'].get(kind, 0) + 1
+                        if problems and len(report['examples']) < examples:
+                            report['examples'].append((name, problems))
+                        if any(kind not in WARNINGS for kind, _ in problems):
+                            report['with_problems'] += 1
+                        if text == '':
+                            report['removed'] += 1
+                            continue
+                        if new_name != name:
+                            report['renamed'] += 1
+                        if text is not None:
+                            report['repaired'] += 1
+                        if repaired_file is not None:
+                            # recipes that don't need repairing are copied across as they are
+                            repaired_file.write((b', ' if written else b'{') + json.dumps(new_name).encode() + b': ')
+                            repaired_file.write(data[start:end] if text is None else text.encode())
+                            written += 1
+                if repaired_file is not None:
+                    repaired_file.write(b'}' if written else b'{}')
+
+            if not fix:
+                check(None)
+                return report
+            try:
+                with atomic_file(output or path, 'wb') as repaired_file:
+                    check(repaired_file)
+                    if not (report['removed'] or report['renamed'] or report['repaired']) and output is None:
+                        raise Unchanged
+                report['written'] = True
+            except Unchanged:
+                pass
+    return report
+
+
+def format_report(report: dict, path: str):
+    """the compact text the check command prints"""
+    lines = [f"{path}: {report['recipes']} recipes checked, {report['with_problems']} with problems"]
+    if report['problems']:
+        lines.append(', '.join(f"{count} {kind}" for kind, count in sorted(report['problems'].items())))
+    for name, problems in report['examples']:
+        lines.append(f"  {name!r}: {'; '.join(f'{kind} {detail}' for kind, detail in problems)}")
+    if report['written']:
+        lines.append(f"Repaired {report['repaired']}, renamed {report['renamed']} and removed {report['removed']}")
+    return '\n'.join(lines)